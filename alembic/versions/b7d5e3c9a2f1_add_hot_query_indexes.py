@@ -0,0 +1,57 @@
+"""Add hot query indexes.
+
+Revision ID: b7d5e3c9a2f1
+Revises: 8e4b2d6a1f90
+Create Date: 2026-10-17 16:41:09.732158
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d5e3c9a2f1"
+down_revision: Union[str, None] = "8e4b2d6a1f90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NOT_FAILED_CONDITION = "status != 'FAILED'"
+
+
+def upgrade() -> None:
+    # The table is large and written on every payment, so the index is built
+    # concurrently on postgres instead of locking the table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "outgoing_payment_connection_id_created_at_not_failed_idx",
+            "outgoing_payment",
+            ["nwc_connection_id", "created_at"],
+            unique=False,
+            postgresql_where=sa.text(NOT_FAILED_CONDITION),
+            sqlite_where=sa.text(NOT_FAILED_CONDITION),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "outgoing_payment_connection_id_status_created_at_idx",
+            table_name="outgoing_payment",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "outgoing_payment_connection_id_status_created_at_idx",
+            "outgoing_payment",
+            ["nwc_connection_id", "status", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "outgoing_payment_connection_id_created_at_not_failed_idx",
+            table_name="outgoing_payment",
+            postgresql_concurrently=True,
+        )
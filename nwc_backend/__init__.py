@@ -1,8 +1,9 @@
 # pyre-strict
 
 import os
+from typing import Any
 
-from quart import Quart, Response, request, send_from_directory
+from quart import Quart, Response, abort, request, send_from_directory
 
 import nwc_backend.alembic_importer  # noqa: F401
 from nwc_backend.api_handlers import (
@@ -11,7 +12,15 @@ from nwc_backend.api_handlers import (
 )
 from nwc_backend.db import db, setup_rds_iam_auth
 from nwc_backend.frontend_api import bp as frontend_api_bp
-from nwc_backend.nostr.nostr_client_initializer import init_nostr_client
+from nwc_backend.nostr.nostr_client_initializer import (
+    init_nostr_client,
+    shutdown_nostr_client,
+)
+from nwc_backend.vasp_client import (
+    VaspUmaClient,
+    close_vasp_client,
+    init_vasp_client,
+)
 from nwc_backend.wrappers import UmaAuthRequest
 
 
@@ -25,10 +34,15 @@ def create_app() -> Quart:
 
     db.init_app(app)
     if app.config.get("DATABASE_MODE") == "rds":
-        setup_rds_iam_auth(db.engine)
+        rds_iam_token_refresher = setup_rds_iam_auth(db.engine)
+        app.before_serving(rds_iam_token_refresher.start)
+        app.after_serving(rds_iam_token_refresher.stop)
 
+    app.before_serving(init_vasp_client)
+    app.after_serving(close_vasp_client)
     if not app.config.get("QUART_ENV") == "testing":
         app.before_serving(init_nostr_client)
+        app.after_serving(shutdown_nostr_client)
 
     # Register all API routes first
     @app.route(f"{base_path}-/alive")
@@ -39,6 +53,17 @@ def create_app() -> Quart:
     def ready() -> str:
         return "ok"
 
+    @app.route(f"{base_path}-/stats")
+    def stats() -> dict[str, Any]:
+        # The stats are unauthenticated, so they are only served when enabled, e.g.
+        # where the path isn't reachable from outside.
+        if not app.config.get("STATS_ENDPOINT_ENABLED"):
+            abort(404)
+        return {
+            "db_pool": db.get_pool_stats(),
+            "vasp_latency": VaspUmaClient.instance().get_latency_stats(),
+        }
+
     # Register other API routes
     app.add_url_rule(
         f"{base_path}oauth/auth",  # Remove urljoin, use f-strings
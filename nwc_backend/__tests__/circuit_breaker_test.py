@@ -0,0 +1,116 @@
+# pyre-strict
+
+from nwc_backend.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerCall,
+    CircuitState,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _create_circuit_breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_rate_threshold=0.5,
+        min_calls=4,
+        window=10,
+        open_duration=5,
+        clock=clock,
+    )
+
+
+def _allow_call(breaker: CircuitBreaker) -> CircuitBreakerCall:
+    call = breaker.allow_call()
+    assert call
+    return call
+
+
+def _record_calls(breaker: CircuitBreaker, failed: bool, count: int) -> None:
+    for _ in range(count):
+        call = _allow_call(breaker)
+        if failed:
+            breaker.record_failure(call)
+        else:
+            breaker.record_success(call)
+
+
+def test_opens_when_failure_rate_reached() -> None:
+    breaker = _create_circuit_breaker(FakeClock())
+
+    _record_calls(breaker, failed=True, count=3)
+    # Not enough calls yet to judge the failure rate.
+    assert breaker.state == CircuitState.CLOSED
+
+    _record_calls(breaker, failed=False, count=1)
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_call()
+
+
+def test_stays_closed_below_failure_rate() -> None:
+    breaker = _create_circuit_breaker(FakeClock())
+
+    for _ in range(10):
+        _record_calls(breaker, failed=False, count=2)
+        _record_calls(breaker, failed=True, count=1)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_old_calls_leave_the_window() -> None:
+    clock = FakeClock()
+    breaker = _create_circuit_breaker(clock)
+
+    _record_calls(breaker, failed=True, count=3)
+    clock.now = 11
+    _record_calls(breaker, failed=True, count=1)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_half_open_probe() -> None:
+    clock = FakeClock()
+    breaker = _create_circuit_breaker(clock)
+    _record_calls(breaker, failed=True, count=4)
+    assert breaker.state == CircuitState.OPEN
+
+    clock.now = 5
+    assert breaker.state == CircuitState.HALF_OPEN
+    probe = _allow_call(breaker)
+    # Only a single probe at a time.
+    assert not breaker.allow_call()
+    breaker.record_failure(probe)
+    assert breaker.state == CircuitState.OPEN
+
+    clock.now = 10
+    breaker.record_cancelled(_allow_call(breaker))
+    breaker.record_success(_allow_call(breaker))
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_call()
+
+
+def test_half_open_probe_not_resolved_by_earlier_calls() -> None:
+    clock = FakeClock()
+    breaker = _create_circuit_breaker(clock)
+    slow_call = _allow_call(breaker)
+    _record_calls(breaker, failed=True, count=4)
+
+    clock.now = 5
+    probe = _allow_call(breaker)
+    breaker.record_success(slow_call)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert not breaker.allow_call()
+
+    breaker.record_success(probe)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_disabled() -> None:
+    breaker = CircuitBreaker(
+        failure_rate_threshold=0, min_calls=1, window=10, open_duration=5
+    )
+    _record_calls(breaker, failed=True, count=10)
+    assert breaker.allow_call()
@@ -0,0 +1,259 @@
+# pyre-strict
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from secrets import token_hex
+from unittest.mock import AsyncMock, Mock, patch
+
+from nostr_sdk import EventId, Output, SendEventOutput
+from quart.app import QuartClient
+from sqlalchemy.ext.asyncio.engine import AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql import func, select
+from sqlalchemy.util import greenlet_spawn
+
+from nwc_backend.db import db, get_engine_options, setup_rds_iam_auth
+from nwc_backend.event_handlers.__tests__.nip47_event_handler_test import Harness
+from nwc_backend.event_handlers.nip47_event_handler import handle_nip47_event
+from nwc_backend.models.__tests__.model_examples import (
+    create_nwc_connection,
+    create_user,
+)
+from nwc_backend.models.nip47_request import Nip47Request
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.permissions_grouping import PermissionsGroup
+from nwc_backend.models.user import User
+from nwc_backend.rds_iam_token_refresher import (
+    RDS_IAM_TOKEN_MAX_AGE,
+    RDS_IAM_TOKEN_TTL,
+    RdsIamTokenRefresher,
+)
+
+NUM_TASKS = 50
+
+
+async def test_session_per_task(test_client: QuartClient) -> None:
+    async def use_session() -> AsyncSession:
+        session = db.session()
+        user = await create_user()
+        # Yield to the other tasks between operations of the same session.
+        await asyncio.sleep(0)
+        assert db.session() is session
+        assert user in session
+        assert (await db.session.get(User, user.id)) is user
+        return session
+
+    async with test_client.app.app_context():
+        main_session = db.session()
+        sessions = await asyncio.gather(*[use_session() for _ in range(NUM_TASKS)])
+
+        assert len({id(session) for session in sessions}) == NUM_TASKS
+        assert main_session not in sessions
+        assert db.session() is main_session
+        assert await db.session.scalar(select(func.count(User.id))) == NUM_TASKS
+        # Objects loaded by the other tasks are not leaked into this task's session.
+        assert not any(isinstance(instance, User) for instance in main_session)
+
+    assert not db.session.registry.registry
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_concurrent_requests_in_one_app_context(
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+
+    async def get_info(access_token: str, request: Nip47Request) -> Mock:
+        await asyncio.sleep(0.001)
+        assert request in db.session()
+        return Mock(to_dict=Mock(return_value={}))
+
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.READ_BALANCE],
+            keys=harness.client_app_keys,
+        )
+        request_events = [
+            harness.create_request_event(method=Nip47RequestMethod.GET_INFO, params={})
+            for _ in range(NUM_TASKS)
+        ]
+
+        with patch(
+            "nwc_backend.event_handlers.nip47_event_handler.get_info",
+            new=AsyncMock(side_effect=get_info),
+        ):
+            await asyncio.gather(
+                *[handle_nip47_event(event) for event in request_events]
+            )
+
+        assert mock_nostr_send.call_count == NUM_TASKS
+        event_ids = await db.session.scalars(select(Nip47Request.event_id))
+        assert sorted(event_ids) == sorted(
+            event.id().to_hex() for event in request_events
+        )
+
+
+def test_get_engine_options(tmp_path: Path) -> None:
+    assert get_engine_options({"DATABASE_URI": "sqlite+aiosqlite:///:memory:"}) == {}
+
+    config = {
+        "DATABASE_URI": "postgresql+asyncpg://nwc@db.internal:5432/nwc",
+        "DATABASE_MODE": "rds",
+        "DATABASE_POOL_SIZE": 3,
+        "DATABASE_MAX_OVERFLOW": 2,
+        "DATABASE_POOL_TIMEOUT": 5,
+        "DATABASE_POOL_PRE_PING": True,
+        "DATABASE_STATEMENT_CACHE_SIZE": 0,
+    }
+    options = get_engine_options(config)
+    assert options == {
+        "pool_size": 3,
+        "max_overflow": 2,
+        "pool_timeout": 5,
+        "pool_pre_ping": True,
+        "pool_recycle": RDS_IAM_TOKEN_TTL,
+        "connect_args": {"prepared_statement_cache_size": 0},
+    }
+
+    # asyncpg may not be installed, so the options are applied to sqlite with the
+    # queue pool postgres uses.
+    options.pop("connect_args")
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///" + str(tmp_path / "nwc.sqlite"),
+        poolclass=AsyncAdaptedQueuePool,
+        **options,
+    )
+    with patch.object(db, "_engine", engine):
+        stats = db.get_pool_stats()
+    assert stats["pool"] == "AsyncAdaptedQueuePool"
+    assert (stats["size"], stats["checked_out"], stats["timeout"]) == (3, 0, 5)
+    assert engine.pool._recycle == RDS_IAM_TOKEN_TTL  # noqa: SLF001
+
+    config["DATABASE_POOL_RECYCLE"] = 300
+    assert get_engine_options(config)["pool_recycle"] == 300
+
+
+async def test_stats(test_client: QuartClient) -> None:
+    response = await test_client.get("/-/stats")
+    assert response.status_code == 404
+
+    test_client.app.config["STATS_ENDPOINT_ENABLED"] = True
+    response = await test_client.get("/-/stats")
+    assert response.status_code == 200
+    stats = await response.get_json()
+    assert stats["db_pool"]["pool"] == "StaticPool"
+    assert isinstance(stats["vasp_latency"], dict)
+
+
+class StubRdsClient:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.call_threads: list[int] = []
+
+    def generate_db_auth_token(self, host: str, port: int, user: str) -> str:
+        self.call_threads.append(threading.get_ident())
+        # botocore may fetch credentials over the network.
+        time.sleep(0.005)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Could not reach the instance metadata service.")
+        return f"{user}@{host}:{port}/{len(self.call_threads)}"
+
+
+# Runs the do_connect listeners, like the pool does when opening a connection.
+def _connect_params(engine: AsyncEngine) -> dict[str, Any]:
+    dialect = engine.sync_engine.dialect
+    cparams: dict[str, Any] = {}
+    for listener in dialect.dispatch.do_connect:  # pyre-ignore[16]
+        listener(dialect, None, [], cparams)
+    return cparams
+
+
+async def test_rds_iam_auth__no_blocking_call_on_connect(tmp_path: Path) -> None:
+    rds = StubRdsClient()
+    engine = create_async_engine("sqlite+aiosqlite:///" + str(tmp_path / "db"))
+    token_refresher = setup_rds_iam_auth(engine, rds=rds)
+    # Sqlite urls have no host or user.
+    token_refresher.host, token_refresher.user = "db.internal", "nwc"
+
+    await token_refresher.start()
+    try:
+        for _ in range(5):
+            assert _connect_params(engine)["password"] == "nwc@db.internal:5432/1"
+        assert len(rds.call_threads) == 1
+        assert threading.get_ident() not in rds.call_threads
+    finally:
+        await token_refresher.stop()
+
+
+async def test_rds_iam_auth__missing_token_awaited_on_connect(tmp_path: Path) -> None:
+    rds = StubRdsClient(failures=1)
+    engine = create_async_engine("sqlite+aiosqlite:///" + str(tmp_path / "db"))
+    token_refresher = setup_rds_iam_auth(engine, rds=rds)
+    token_refresher.host, token_refresher.user = "db.internal", "nwc"
+
+    # The first refresh fails, so connections wait for a refresh in a worker thread,
+    # shared by the connections opened at the same time.
+    await token_refresher.start()
+    try:
+        params = await asyncio.gather(
+            *(greenlet_spawn(_connect_params, engine) for _ in range(5))
+        )
+        assert {cparams["password"] for cparams in params} == {"nwc@db.internal:5432/2"}
+        assert len(rds.call_threads) == 2
+        assert threading.get_ident() not in rds.call_threads
+    finally:
+        await token_refresher.stop()
+
+
+async def test_rds_iam_auth__refreshed_in_background() -> None:
+    rds = StubRdsClient(failures=1)
+    token_refresher = RdsIamTokenRefresher(
+        rds,  # pyre-ignore[6]
+        host="db.internal",
+        port=5432,
+        user="nwc",
+        refresh_interval=0.02,
+        refresh_jitter=0.01,
+        retry_interval=0.01,
+    )
+
+    # The first refresh fails, so the next one is retried sooner.
+    await token_refresher.start()
+    async with asyncio.timeout(1):
+        while len(rds.call_threads) < 4:
+            await asyncio.sleep(0.005)
+    await token_refresher.stop()
+    num_calls = len(rds.call_threads)
+    assert threading.get_ident() not in rds.call_threads
+    # The last refresh may have been stopped before it saved its token.
+    assert token_refresher.get_token() in {
+        f"nwc@db.internal:5432/{num_calls - 1}",
+        f"nwc@db.internal:5432/{num_calls}",
+    }
+
+    await asyncio.sleep(0.05)
+    assert len(rds.call_threads) == num_calls
+
+
+def test_rds_iam_auth__token_without_refresher() -> None:
+    clock = Mock(return_value=0.0)
+    rds = StubRdsClient()
+    token_refresher = RdsIamTokenRefresher(
+        rds, host="db.internal", port=5432, user="nwc", clock=clock  # pyre-ignore[6]
+    )
+
+    assert token_refresher.get_token() == "nwc@db.internal:5432/1"
+    clock.return_value = RDS_IAM_TOKEN_MAX_AGE
+    assert token_refresher.get_token() == "nwc@db.internal:5432/1"
+    clock.return_value = RDS_IAM_TOKEN_MAX_AGE + 1
+    assert token_refresher.get_token() == "nwc@db.internal:5432/2"
@@ -0,0 +1,20 @@
+# pyre-strict
+
+from nwc_backend.latency_histogram import LatencyHistogram
+
+
+def test_percentiles() -> None:
+    histogram = LatencyHistogram(buckets=(0.1, 1, 10))
+    assert histogram.percentile(50) == 0
+
+    for latency in [0.05] * 50 + [0.5] * 40 + [5] * 9 + [60]:
+        histogram.record(latency)
+
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(90) == 1
+    assert histogram.percentile(99) == 10
+    assert histogram.percentile(100) == float("inf")
+
+    stats = histogram.to_dict()
+    assert stats["count"] == 100
+    assert stats["buckets"] == {"0.1": 50, "1": 40, "10": 9, "inf": 1}
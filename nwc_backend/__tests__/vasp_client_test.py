@@ -0,0 +1,352 @@
+# pyre-strict
+
+import asyncio
+import json
+import time
+from secrets import token_hex
+from typing import Any
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohttp
+import pytest
+from nostr_sdk import ErrorCode
+from quart.app import QuartClient
+from uma_auth.models.locked_currency_side import LockedCurrencySide
+
+from nwc_backend.exceptions import (
+    VaspErrorResponseException,
+    VaspTimeoutException,
+    VaspUnavailableException,
+)
+from nwc_backend.models.__tests__.model_examples import create_currency
+from nwc_backend.models.receiving_address import ReceivingAddress, ReceivingAddressType
+from nwc_backend.vasp_client import VaspUmaClient
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_http_session_is_reused_across_requests(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value=json.dumps({"balance": 1_000}))
+    mock_response.ok = True
+    mock_get.return_value.__aenter__.return_value = mock_response
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient.instance()
+        session = await vasp_client._get_http_session()  # noqa: SLF001
+        assert not session.closed
+
+        await vasp_client.get_balance(access_token=token_hex(), currency_code=None)
+        await vasp_client.get_balance(access_token=token_hex(), currency_code=None)
+
+        assert mock_get.call_count == 2
+        assert await vasp_client._get_http_session() is session  # noqa: SLF001
+
+
+async def test_http_session_closed_on_shutdown(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient.instance()
+        session = await vasp_client._get_http_session()  # noqa: SLF001
+
+    await vasp_client.close_http_session()
+    assert session.closed
+
+    await vasp_client.open_http_session()
+    assert await vasp_client._get_http_session() is not session  # noqa: SLF001
+
+
+def _mock_get_response(mock_get: Mock, response: dict[str, Any]) -> None:
+    async def text() -> str:
+        await asyncio.sleep(0.01)
+        return json.dumps(response)
+
+    mock_response = AsyncMock()
+    mock_response.text = text
+    mock_response.ok = True
+    mock_get.return_value.__aenter__.return_value = mock_response
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_get_info__cached_per_token(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    _mock_get_response(
+        mock_get,
+        {
+            "pubkey": token_hex(),
+            "network": "mainnet",
+            "methods": ["get_info"],
+            "lud16": "$alice@uma.me",
+        },
+    )
+    test_client.app.config["VASP_GET_INFO_CACHE_TTL"] = 10
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        info = await vasp_client.get_info(access_token=access_token)
+        assert await vasp_client.get_info(access_token=access_token) is info
+        assert mock_get.call_count == 1
+
+        await vasp_client.get_info(access_token=token_hex())
+        assert mock_get.call_count == 2
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_get_balance__concurrent_requests_coalesced(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    _mock_get_response(mock_get, {"balance": 1_000})
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        balances = await asyncio.gather(
+            *[
+                vasp_client.get_balance(access_token=access_token, currency_code=None)
+                for _ in range(5)
+            ],
+            vasp_client.get_balance(access_token=access_token, currency_code="USD"),
+        )
+
+        assert [balance.balance for balance in balances] == [1_000] * 6
+        assert mock_get.call_count == 2
+        # The cache is disabled by default, so the next request fetches again.
+        await vasp_client.get_balance(access_token=access_token, currency_code=None)
+        assert mock_get.call_count == 3
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_get_balance__invalidated(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    _mock_get_response(mock_get, {"balance": 1_000})
+    test_client.app.config["VASP_GET_BALANCE_CACHE_TTL"] = 10
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        await vasp_client.get_balance(access_token=access_token, currency_code=None)
+        await vasp_client.get_balance(access_token=access_token, currency_code="USD")
+        await vasp_client.get_balance(access_token=access_token, currency_code=None)
+        await vasp_client.get_balance(access_token=access_token, currency_code="USD")
+        assert mock_get.call_count == 2
+
+        vasp_client.invalidate_balance(access_token)
+        await vasp_client.get_balance(access_token=access_token, currency_code=None)
+        await vasp_client.get_balance(access_token=access_token, currency_code="USD")
+        assert mock_get.call_count == 4
+
+        # A balance fetched while the balance is invalidated isn't cached.
+        vasp_client.invalidate_balance(access_token)
+        balance_request = asyncio.create_task(
+            vasp_client.get_balance(access_token=access_token, currency_code=None)
+        )
+        await asyncio.sleep(0)
+        vasp_client.invalidate_balance(access_token)
+        await balance_request
+        await vasp_client.get_balance(access_token=access_token, currency_code=None)
+        assert mock_get.call_count == 6
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_concurrent_identical_gets_coalesced(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    payment_hash = token_hex()
+    _mock_get_response(
+        mock_get,
+        {
+            "type": "incoming",
+            "invoice": token_hex(),
+            "payment_hash": payment_hash,
+            "amount": 1_000,
+            "created_at": 1692055140,
+        },
+    )
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        transactions = await asyncio.gather(
+            *[
+                vasp_client.lookup_invoice(
+                    access_token=access_token, payment_hash=payment_hash
+                )
+                for _ in range(5)
+            ],
+            vasp_client.lookup_invoice(
+                access_token=token_hex(), payment_hash=payment_hash
+            ),
+            vasp_client.lookup_invoice(
+                access_token=access_token, payment_hash=token_hex()
+            ),
+        )
+
+        assert all(
+            transaction.payment_hash == payment_hash for transaction in transactions
+        )
+        assert mock_get.call_count == 3
+        assert len(vasp_client._get_requests) == 0  # noqa: SLF001
+
+        # Requests made after the shared one completes aren't coalesced with it.
+        await vasp_client.lookup_invoice(
+            access_token=access_token, payment_hash=payment_hash
+        )
+        assert mock_get.call_count == 4
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_concurrent_identical_quotes_not_coalesced(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    now = int(time.time())
+    _mock_get_response(
+        mock_get,
+        {
+            "sending_currency": create_currency("SAT").to_dict(),
+            "receiving_currency": create_currency("USD").to_dict(),
+            "payment_hash": token_hex(),
+            "expires_at": now + 300,
+            "multiplier": 15351.4798,
+            "fees": 10,
+            "total_sending_amount": 1_000_000,
+            "total_receiving_amount": 65,
+            "created_at": now,
+        },
+    )
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        # Each quote is executed once, so identical quote requests get their own.
+        await asyncio.gather(
+            *[
+                vasp_client.fetch_quote(
+                    access_token=access_token,
+                    sending_currency_code="SAT",
+                    receiving_currency_code="USD",
+                    locked_currency_amount=1_000_000,
+                    locked_currency_side=LockedCurrencySide.SENDING,
+                    receiver_address=ReceivingAddress(
+                        address="$alice@uma.me", type=ReceivingAddressType.LUD16
+                    ),
+                )
+                for _ in range(2)
+            ]
+        )
+
+        assert mock_get.call_count == 2
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_concurrent_identical_gets_share_errors(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value="Not found")
+    mock_response.ok = False
+    mock_response.status = 404
+    mock_get.return_value.__aenter__.return_value = mock_response
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        access_token = token_hex()
+        payment_hash = token_hex()
+        results = await asyncio.gather(
+            *[
+                vasp_client.lookup_invoice(
+                    access_token=access_token, payment_hash=payment_hash
+                )
+                for _ in range(3)
+            ],
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, VaspErrorResponseException) for result in results)
+        assert mock_get.call_count == 1
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_request_timeout(mock_get: Mock, test_client: QuartClient) -> None:
+    async def text() -> str:
+        await asyncio.sleep(1)
+        return json.dumps({"balance": 1_000})
+
+    mock_response = AsyncMock()
+    mock_response.text = text
+    mock_response.ok = True
+    mock_get.return_value.__aenter__.return_value = mock_response
+    test_client.app.config["VASP_HTTP_TIMEOUT"] = 0.01
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        with pytest.raises(VaspTimeoutException) as ex:
+            await vasp_client.get_balance(access_token=token_hex(), currency_code=None)
+        assert ex.value.error_code == ErrorCode.INTERNAL
+        assert ex.value.error_message == "The wallet did not respond in time."
+
+        stats = vasp_client.get_latency_stats()
+        assert stats["GET /balance"]["count"] == 1
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_circuit_breaker_fails_fast(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value="Service unavailable")
+    mock_response.ok = False
+    mock_response.status = 503
+    mock_get.return_value.__aenter__.return_value = mock_response
+    test_client.app.config["VASP_CIRCUIT_BREAKER_FAILURE_RATE"] = 0.5
+    test_client.app.config["VASP_CIRCUIT_BREAKER_MIN_CALLS"] = 3
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        for _ in range(3):
+            with pytest.raises(VaspErrorResponseException):
+                await vasp_client.lookup_invoice(
+                    access_token=token_hex(), payment_hash=token_hex()
+                )
+        assert mock_get.call_count == 3
+
+        with pytest.raises(VaspUnavailableException) as ex:
+            await vasp_client.get_info(access_token=token_hex())
+        assert ex.value.error_code == ErrorCode.RATE_LIMITED
+        assert mock_get.call_count == 3
+
+        stats = vasp_client.get_latency_stats()
+        assert stats["GET /invoices/{payment_hash}"]["count"] == 3
+        await vasp_client.close_http_session()
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_circuit_breaker_ignores_client_errors(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value="Not found")
+    mock_response.ok = False
+    mock_response.status = 404
+    mock_get.return_value.__aenter__.return_value = mock_response
+    test_client.app.config["VASP_CIRCUIT_BREAKER_FAILURE_RATE"] = 0.5
+    test_client.app.config["VASP_CIRCUIT_BREAKER_MIN_CALLS"] = 3
+
+    async with test_client.app.app_context():
+        vasp_client = VaspUmaClient()
+        for _ in range(5):
+            with pytest.raises(VaspErrorResponseException):
+                await vasp_client.lookup_invoice(
+                    access_token=token_hex(), payment_hash=token_hex()
+                )
+        assert mock_get.call_count == 5
+        await vasp_client.close_http_session()
@@ -1,6 +1,7 @@
 # pyre-strict
 # ruff: noqa: F401
 
+from nwc_backend.models.nip47_rate_limit_bucket import Nip47RateLimitBucket
 from nwc_backend.models.nip47_request import Nip47Request
 from nwc_backend.models.nwc_connection import NWCConnection
 from nwc_backend.models.outgoing_payment import OutgoingPayment
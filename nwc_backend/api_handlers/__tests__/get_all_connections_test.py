@@ -0,0 +1,86 @@
+import json
+from typing import Any
+
+import pytest
+from quart.app import QuartClient
+from sqlalchemy import event
+
+from nwc_backend.db import db
+from nwc_backend.models.__tests__.model_examples import (
+    create_nip47_request,
+    create_nwc_connection,
+    create_spending_cycle,
+    create_spending_limit,
+    jwt_for_user,
+)
+from nwc_backend.models.nwc_connection import NWCConnection
+from nwc_backend.models.user import User
+
+
+async def _create_connections(user: User, num_connections: int) -> None:
+    for i in range(num_connections):
+        connection = await create_nwc_connection()
+        connection.user = user
+        await db.session.commit()
+        await create_nip47_request(nwc_connection=connection)
+        if i % 2 == 0:
+            spending_limit = await create_spending_limit(nwc_connection=connection)
+            spending_cycle = await create_spending_cycle(spending_limit)
+            spending_cycle.total_spent = 10 * i
+            await db.session.commit()
+
+
+async def _get_all_connections(
+    test_client: QuartClient, token: str
+) -> tuple[list[dict[str, Any]], int]:
+    statements = []
+
+    def count_statement(*args: Any, **kwargs: Any) -> None:
+        statements.append(args)
+
+    async with test_client.app.app_context():
+        engine = db.engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = await test_client.get(
+            "/api/connections", headers={"Authorization": f"Bearer {token}"}
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert response.status_code == 200
+    return json.loads(await response.get_data()), len(statements)
+
+
+@pytest.mark.asyncio
+async def test_get_all_connections__constant_number_of_queries(
+    test_client: QuartClient,
+) -> None:
+    async with test_client.app.app_context():
+        user = (await create_nwc_connection()).user
+        token = jwt_for_user(user)
+        await _create_connections(user, 1)
+
+    connections, num_queries = await _get_all_connections(test_client, token)
+    assert len(connections) == 2
+
+    async with test_client.app.app_context():
+        user = await db.session.get(User, user.id)
+        await _create_connections(user, 8)
+
+    connections, num_queries_with_more_connections = await _get_all_connections(
+        test_client, token
+    )
+    assert len(connections) == 10
+    assert num_queries_with_more_connections == num_queries
+
+    async with test_client.app.app_context():
+        for connection_dict in connections:
+            connection = await db.session.get(
+                NWCConnection, connection_dict["connection_id"]
+            )
+            assert connection_dict == await connection.to_dict()
+    assert sorted(
+        connection["spending_limit"]["amount_used"]
+        for connection in connections
+        if connection["spending_limit"]
+    ) == [0, 0, 20, 40, 60]
@@ -6,18 +6,16 @@ from typing import Any, Optional
 from uuid import uuid4
 
 from nostr_sdk import Keys
-from quart import Response, current_app, request
+from quart import Response, request
 from sqlalchemy.sql import func, select
 
 from nwc_backend.db import db
 from nwc_backend.exceptions import InvalidApiParamsException
 from nwc_backend.models.client_app import ClientApp
 from nwc_backend.models.nwc_connection import NWCConnection
-from nwc_backend.models.outgoing_payment import OutgoingPayment, PaymentStatus
-from nwc_backend.models.permissions_grouping import (
-    PERMISSIONS_GROUP_TO_METHODS,
-    PermissionsGroup,
-)
+from nwc_backend.models.outgoing_payment import OutgoingPayment
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.permissions_grouping import get_granted_methods
 from nwc_backend.models.spending_cycle import SpendingCycle
 from nwc_backend.models.spending_limit import SpendingLimit
 from nwc_backend.models.spending_limit_frequency import SpendingLimitFrequency
@@ -157,17 +155,9 @@ async def _initialize_connection_data(
 
     # the frontend will always send grouped permissions so we can directly save
     nwc_connection.granted_permissions_groups = permissions
-    all_granted_granular_permissions = set()
-    for permission in permissions:
-        all_granted_granular_permissions.update(
-            PERMISSIONS_GROUP_TO_METHODS[PermissionsGroup(permission)]
-        )
-    all_granted_granular_permissions.update(
-        PERMISSIONS_GROUP_TO_METHODS[PermissionsGroup.ALWAYS_GRANTED]
-    )
-    vasp_supported_commands = current_app.config["VASP_SUPPORTED_COMMANDS"]
+    granted_methods = get_granted_methods(permissions)
     all_granted_granular_permissions_list = [
-        p for p in all_granted_granular_permissions if p in vasp_supported_commands
+        method.value for method in Nip47RequestMethod if method in granted_methods
     ]
 
     # save the long lived token in the db and create the app connection
@@ -195,9 +185,7 @@ async def get_all_connections() -> Response:
     result = await db.session.execute(
         select(NWCConnection).filter(NWCConnection.user_id == auth_state.user.id)
     )
-    response = []
-    for connection in result.scalars():
-        response.append(await connection.to_dict())
+    response = await NWCConnection.to_dicts(result.scalars().all())
     return Response(json.dumps(response), status=200)
 
 
@@ -216,7 +204,7 @@ async def get_all_outgoing_payments(connection_id: str) -> Response:
     results = await db.session.execute(
         select(OutgoingPayment)
         .where(OutgoingPayment.nwc_connection_id == connection_id)
-        .where(OutgoingPayment.status != PaymentStatus.FAILED)
+        .where(OutgoingPayment.is_not_failed())
         .order_by(OutgoingPayment.created_at.desc())
         .offset(offset)
         .limit(limit)
@@ -226,7 +214,7 @@ async def get_all_outgoing_payments(connection_id: str) -> Response:
     count = await db.session.scalar(
         select(func.count(OutgoingPayment.id))
         .where(OutgoingPayment.nwc_connection_id == connection_id)
-        .where(OutgoingPayment.status != PaymentStatus.FAILED)
+        .where(OutgoingPayment.is_not_failed())
     )
     response["count"] = count - offset
     return Response(json.dumps(response), status=200)
@@ -250,6 +238,7 @@ async def update_connection(connection_id: str) -> Response:
     if status and status == "Inactive":
         connection.connection_expires_at = int(datetime.now(timezone.utc).timestamp())
         await db.session.commit()
+        NWCConnection.invalidate_cache(connection.nostr_pubkey)
         return Response(json.dumps({"success": "Connection deleted"}), status=200)
 
     if not expiration:
@@ -319,6 +308,7 @@ async def update_connection(connection_id: str) -> Response:
             connection.spending_limit_id = None
 
     await db.session.commit()
+    NWCConnection.invalidate_cache(connection.nostr_pubkey)
     connection = await db.session.get(NWCConnection, connection_id)
     response = await connection.to_dict()
     return Response(json.dumps(response), status=200)
@@ -0,0 +1,118 @@
+# pyre-strict
+
+from collections import deque
+from enum import Enum
+from time import monotonic
+from typing import Callable, Optional
+
+
+class CircuitState(Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreakerCall:
+    def __init__(self, is_probe: bool) -> None:
+        self.is_probe = is_probe
+
+
+# Opens once `failure_rate_threshold` of at least `min_calls` calls in the last
+# `window` seconds failed. After `open_duration` it lets a single probe call through.
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_rate_threshold: float,
+        min_calls: int,
+        window: float,
+        open_duration: float,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.open_duration = open_duration
+        self._clock = clock
+        self._state: CircuitState = CircuitState.CLOSED
+        self._opened_at = 0.0
+        # The half-open probe, so calls started while the circuit was closed don't
+        # resolve it when they complete.
+        self._probe: Optional[CircuitBreakerCall] = None
+        # (time, failed) of the calls made in the last `window` seconds.
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_rate_threshold > 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and self._clock() - self._opened_at >= self.open_duration
+        ):
+            self._state = CircuitState.HALF_OPEN
+        return self._state
+
+    def allow_call(self) -> Optional[CircuitBreakerCall]:
+        if not self.enabled:
+            return CircuitBreakerCall(is_probe=False)
+
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return CircuitBreakerCall(is_probe=False)
+        if state == CircuitState.OPEN or self._probe:
+            return None
+        # Half open: let a single probe call through.
+        self._probe = CircuitBreakerCall(is_probe=True)
+        return self._probe
+
+    def record_success(self, call: CircuitBreakerCall) -> None:
+        if self._resolve_probe(call):
+            self._close()
+            return
+        self._record(failed=False)
+
+    def record_failure(self, call: CircuitBreakerCall) -> None:
+        if self._resolve_probe(call):
+            self._open()
+            return
+        self._record(failed=True)
+
+    def record_cancelled(self, call: CircuitBreakerCall) -> None:
+        self._resolve_probe(call)
+
+    def _resolve_probe(self, call: CircuitBreakerCall) -> bool:
+        if call is not self._probe:
+            return False
+        self._probe = None
+        return True
+
+    def _record(self, failed: bool) -> None:
+        if not self.enabled or self._state != CircuitState.CLOSED:
+            return
+
+        now = self._clock()
+        self._calls.append((now, failed))
+        self._failures += failed
+        while self._calls and self._calls[0][0] <= now - self.window:
+            _, expired_failed = self._calls.popleft()
+            self._failures -= expired_failed
+
+        if (
+            len(self._calls) >= self.min_calls
+            and self._failures / len(self._calls) >= self.failure_rate_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self._calls.clear()
+        self._failures = 0
+
+    def _close(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._calls.clear()
+        self._failures = 0
@@ -10,9 +10,56 @@ DATABASE_URI: str = "sqlite+aiosqlite:///" + os.path.join(
 )
 SECRET_KEY: str = secrets.token_hex(32)
 
+# Connection pool of the database engine, per worker. The defaults are SQLAlchemy's,
+# except DATABASE_POOL_RECYCLE which defaults to the 600 second RDS IAM token window
+# when DATABASE_MODE is "rds". Pool usage is reported on the /-/stats path, which
+# is unauthenticated and only served when STATS_ENDPOINT_ENABLED is set.
+# STATS_ENDPOINT_ENABLED = False
+# DATABASE_POOL_SIZE = 5
+# DATABASE_MAX_OVERFLOW = 10
+# DATABASE_POOL_TIMEOUT = 30  # seconds to wait for a connection from the pool
+# DATABASE_POOL_RECYCLE = 600  # seconds
+# DATABASE_POOL_PRE_PING = True
+# DATABASE_STATEMENT_CACHE_SIZE = 100  # asyncpg prepared statements per connection
+
 # You can use this to specify a custom CA file for internal connections to your VASP server.
 # INTERNAL_CA_FILE = "/etc/certs/ca.crt"
 
+# Connection pool settings for the shared HTTP session used to call the VASP.
+# VASP_HTTP_CONNECTION_LIMIT = 100
+# VASP_HTTP_CONNECTION_LIMIT_PER_HOST = 0  # 0 means no per-host limit
+# VASP_HTTP_KEEPALIVE_TIMEOUT = 15.0  # seconds
+# VASP_HTTP_DNS_CACHE_TTL = 10  # seconds
+
+# Timeouts of VASP requests in seconds. Payments get a longer timeout than reads,
+# since a payment which times out is marked failed while the VASP may still settle
+# it.
+# VASP_HTTP_TIMEOUT = 10
+# VASP_HTTP_PAYMENT_TIMEOUT = 300
+
+# Fail VASP requests fast for VASP_CIRCUIT_BREAKER_OPEN_DURATION seconds once the
+# share of failed requests in the last VASP_CIRCUIT_BREAKER_WINDOW seconds reaches
+# VASP_CIRCUIT_BREAKER_FAILURE_RATE, with at least VASP_CIRCUIT_BREAKER_MIN_CALLS
+# requests. Unset or 0 disables the circuit breaker.
+# VASP_CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+# VASP_CIRCUIT_BREAKER_MIN_CALLS = 20
+# VASP_CIRCUIT_BREAKER_WINDOW = 30
+# VASP_CIRCUIT_BREAKER_OPEN_DURATION = 10
+
+# How long get_info and get_balance responses are cached per access token, in
+# seconds. 0 disables the cache. Balances are invalidated after every payment.
+# VASP_GET_INFO_CACHE_TTL = 60
+# VASP_GET_BALANCE_CACHE_TTL = 5
+# VASP_RESPONSE_CACHE_SIZE = 10000
+
+# How long exchange rates of budget estimates are reused for later estimates of the
+# same currencies, in seconds. 0 disables it. Budget held for payments estimated
+# from a reused rate is multiplied by BUDGET_RATE_CACHE_BUFFER_MULTIPLIER on top of
+# BUDGET_BUFFER_MULTIPLIER.
+# BUDGET_RATE_CACHE_TTL = 30
+# BUDGET_RATE_CACHE_BUFFER_MULTIPLIER = 1.02
+# BUDGET_RATE_CACHE_SIZE = 1000
+
 UMA_VASP_JWT_PUBKEY = "-----BEGIN PUBLIC KEY-----\nMFkwEwYHKoZIzj0CAQYIKoZIzj0DAQcDQgAEEVs/o5+uQbTjL3chynL4wXgUg2R9\nq9UU8I5mEovUf86QZ7kOBIjJwqnzD1omageEHWwHdBO6B+dFabmdT9POxg==\n-----END PUBLIC KEY-----"
 UMA_VASP_JWT_AUD: Optional[str] = None
 UMA_VASP_JWT_ISS: Optional[str] = None
@@ -30,6 +77,80 @@ NWC_APP_ROOT_URL = "http://localhost:8080"
 NOSTR_PRIVKEY: str = secrets.token_hex(32)
 RELAY = "wss://relay.getalby.com/v1"
 
+# Number of concurrent workers handling nip47 requests. Requests from the same client
+# app are still handled in order. Set to 0 to handle requests inline one at a time.
+# NIP47_EVENT_WORKERS = 8
+# NIP47_EVENT_QUEUE_SIZE = 1000
+# Seconds queued requests get to finish on shutdown before they are cancelled.
+# NIP47_EVENT_QUEUE_DRAIN_TIMEOUT = 20
+
+# Admission control of nip47 requests. Requests over the max number of requests in
+# flight, in total or per client app, are rejected right away with RATE_LIMITED, as
+# are queued requests which waited more than NIP47_MAX_QUEUE_AGE seconds. Requests
+# which would expire before they could be served are dropped. Unset or 0 disables
+# each limit.
+# NIP47_MAX_IN_FLIGHT = 2000
+# NIP47_MAX_IN_FLIGHT_PER_AUTHOR = 20
+# NIP47_MAX_QUEUE_AGE = 30
+
+# Token bucket rate limits of the nip47 requests of each connection, with separate
+# limits for payments and for reads. Each bucket holds up to *_BURST requests, which
+# defaults to *_PER_MINUTE. Unset or 0 disables the limit. The buckets are kept per
+# worker, unless NIP47_RATE_LIMIT_SHARED keeps them in the database for all workers.
+# NIP47_RATE_LIMIT_PAYMENTS_PER_MINUTE = 30
+# NIP47_RATE_LIMIT_PAYMENTS_BURST = 10
+# NIP47_RATE_LIMIT_READS_PER_MINUTE = 120
+# NIP47_RATE_LIMIT_READS_BURST = 60
+# NIP47_RATE_LIMIT_SHARED = False
+
+# Number of workers publishing responses to the relay in the background. Set to 0 to
+# publish responses inline and wait for the relay before finishing each request.
+# NOSTR_PUBLISHER_WORKERS = 4
+# NOSTR_PUBLISHER_QUEUE_SIZE = 1000
+
+# Write the responses of non-payment requests to the db in batches, flushed every
+# interval or once the batch is full. Set the interval to 0 to save each one directly.
+# NIP47_RESPONSE_FLUSH_INTERVAL_MS = 50
+# NIP47_RESPONSE_FLUSH_BATCH_SIZE = 100
+
+# How often the last used time of connections is written to the db, in seconds. The
+# requests of a connection in between are coalesced into one update. Set to 0 to
+# update the connection on every request.
+# NWC_CONNECTION_LAST_USED_FLUSH_INTERVAL = 10
+
+# Recently seen event ids, used to drop duplicate deliveries before decrypting them.
+# NIP47_RECENT_EVENT_IDS_SIZE = 10000
+# NIP47_RECENT_EVENT_IDS_TTL = 600  # seconds
+
+# When running several workers, split nip47 requests between them by author pubkey
+# instead of having every worker handle every request. Set the count to the number of
+# workers. Each worker claims a free shard through a lock file in NIP47_SHARD_LOCK_DIR,
+# unless NIP47_SHARD_INDEX is set explicitly (e.g. one shard per container). While
+# every shard is taken, e.g. during a reload, a new worker waits for one to free up.
+# NIP47_SHARD_COUNT = 4
+# NIP47_SHARD_INDEX = 0
+# NIP47_SHARD_LOCK_DIR = "/tmp"
+
+# Number of threads used to encrypt, decrypt, sign and verify events off the event
+# loop. Set to 0 to run them inline.
+# NOSTR_CRYPTO_THREADS = 4
+
+# Max number of client pubkeys whose nip04/nip44 conversation keys are cached, and
+# how long the keys are kept in seconds.
+# NOSTR_CONVERSATION_KEY_CACHE_SIZE = 10000
+# NOSTR_CONVERSATION_KEY_CACHE_TTL = 3600
+
+# Max number of transactions fetched per list_transactions request, and whether to
+# save only a summary of list_transactions responses instead of the full result.
+# NIP47_LIST_TRANSACTIONS_MAX_LIMIT = 100
+# NIP47_LIST_TRANSACTIONS_SAVE_SUMMARY = True
+
+# In-process cache of connections looked up by nostr pubkey, disabled with a TTL of 0.
+# Changes made by other workers, such as revoking a connection, only apply to
+# non-payment requests once the cached connection expires.
+# NWC_CONNECTION_CACHE_TTL = 0  # seconds
+# NWC_CONNECTION_CACHE_SIZE = 10000
+
 VASP_SUPPORTED_COMMANDS = [
     "pay_invoice",
     "make_invoice",
@@ -4,20 +4,26 @@ import asyncio
 import ssl
 import uuid
 from datetime import datetime, timezone
-from time import monotonic
-from typing import Any, Callable, Optional, Type, Union
+from typing import Any, Callable, Mapping, Optional, Type, Union
 
 import sqlalchemy
 from botocore.client import BaseClient
 from quart import Quart, Response, g
 from sqlalchemy import JSON, Uuid, event, types
 from sqlalchemy.dialects.postgresql.asyncpg import AsyncAdapt_asyncpg_connection
-from sqlalchemy.engine import Dialect, Result
+from sqlalchemy.engine import Dialect
 from sqlalchemy.ext.asyncio.engine import AsyncEngine, create_async_engine
-from sqlalchemy.ext.asyncio.scoping import AsyncSession, async_scoped_session
+from sqlalchemy.ext.asyncio.scoping import async_scoped_session
+from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from uma_auth.models.currency import Currency
 
+from nwc_backend.rds_iam_token_refresher import (
+    RDS_IAM_TOKEN_TTL,
+    RdsIamTokenRefresher,
+)
+
 
 class DateTime(types.TypeDecorator):
     impl = types.TIMESTAMP
@@ -77,71 +83,115 @@ class DBCurrency(types.TypeDecorator):
         return Currency.from_json(value) if value else None
 
 
-class LockingAsyncSession(AsyncSession):
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        self.lock = asyncio.Lock()
-        super().__init__(*args, **kwargs)
-
-    async def commit(self, *args: Any, **kwargs: Any) -> None:
-        async with self.lock:
-            await super().commit(*args, **kwargs)
-
-    async def execute(self, *args: Any, **kwargs: Any) -> Result:
-        async with self.lock:
-            return await super().execute(*args, **kwargs)
-
-    async def get(self, *args: Any, **kwargs: Any) -> Optional[object]:
-        async with self.lock:
-            return await super().get(*args, **kwargs)
+# Each task gets its own session, so concurrent tasks of an app context don't
+# interleave operations on one session.
+def _session_scope() -> tuple[object, Optional["asyncio.Task[object]"]]:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return (g._get_current_object(), task)
+
+
+# Unset options are left to the dialect's default pool, which the in-memory
+# sqlite of the tests relies on.
+def get_engine_options(config: Mapping[str, Any]) -> dict[str, Any]:
+    options: dict[str, Any] = {}
+    for config_key, option in [
+        ("DATABASE_POOL_SIZE", "pool_size"),
+        ("DATABASE_MAX_OVERFLOW", "max_overflow"),
+        ("DATABASE_POOL_TIMEOUT", "pool_timeout"),
+        ("DATABASE_POOL_RECYCLE", "pool_recycle"),
+        ("DATABASE_POOL_PRE_PING", "pool_pre_ping"),
+    ]:
+        if config.get(config_key) is not None:
+            options[option] = config[config_key]
+
+    # Recycle connections at the same pace as the IAM tokens, so no connection
+    # outlives the token it was opened with by much.
+    if config.get("DATABASE_MODE") == "rds":
+        options.setdefault("pool_recycle", RDS_IAM_TOKEN_TTL)
+
+    statement_cache_size = config.get("DATABASE_STATEMENT_CACHE_SIZE")
+    if statement_cache_size is not None and config["DATABASE_URI"].startswith(
+        "postgresql+asyncpg"
+    ):
+        options["connect_args"] = {
+            "prepared_statement_cache_size": statement_cache_size
+        }
+    return options
 
 
 class AsyncSQLAlchemy:
     _engine = None
 
     session = async_scoped_session(
-        sessionmaker(class_=LockingAsyncSession, future=True, expire_on_commit=False),
-        scopefunc=lambda: g._get_current_object(),
+        sessionmaker(class_=AsyncSession, future=True, expire_on_commit=False),
+        scopefunc=_session_scope,
     )
 
     def __init__(self) -> None:
         setattr(self, "Column", sqlalchemy.Column)  # noqa: B010
 
     def init_app(self, app: Quart) -> None:
-        self._engine = create_async_engine(app.config["DATABASE_URI"])
+        self._engine = create_async_engine(
+            app.config["DATABASE_URI"], **get_engine_options(app.config)
+        )
         self.session.session_factory.configure(bind=self._engine)
 
         @app.teardown_appcontext
         async def shutdown_session(
-            response_or_exc: Union[Response, BaseException]
+            response_or_exc: Union[Response, BaseException],
         ) -> Union[Response, BaseException]:
-            await db.session.remove()
+            await db.remove_app_context_sessions()
             return response_or_exc
 
+    async def remove_app_context_sessions(self) -> None:
+        app_context_globals = g._get_current_object()
+        registry = self.session.registry.registry
+        for scope in [scope for scope in registry if scope[0] is app_context_globals]:
+            await registry.pop(scope).close()
+
     @property
     def engine(self) -> AsyncEngine:
         assert self._engine
         return self._engine
 
+    def get_pool_stats(self) -> dict[str, Any]:
+        pool = self.engine.pool
+        stats: dict[str, Any] = {"pool": type(pool).__name__, "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                timeout=pool.timeout(),
+            )
+        return stats
+
 
 db = AsyncSQLAlchemy()
 Column: Type[sqlalchemy.Column] = db.Column
 
 
-def setup_rds_iam_auth(engine: AsyncEngine) -> None:
-    from botocore.session import get_session
+def setup_rds_iam_auth(
+    engine: AsyncEngine, rds: Optional[BaseClient] = None
+) -> RdsIamTokenRefresher:
+    if rds is None:
+        from botocore.session import get_session
 
-    rds: BaseClient = get_session().create_client("rds")
-    token_cache: list[Union[float, str]] = []
+        rds = get_session().create_client("rds")
+    token_refresher: RdsIamTokenRefresher = RdsIamTokenRefresher(
+        rds,
+        host=engine.url.host or "",
+        port=engine.url.port or 5432,
+        user=engine.url.username or "",
+    )
 
     @event.listens_for(engine.sync_engine, "do_connect", named=True)
     def provide_token(cparams: dict[str, Any], **_kwargs: Any) -> None:
-        if not token_cache or monotonic() - token_cache[0] > 600:  # pyre-ignore[58]
-            token = rds.generate_db_auth_token(
-                cparams["host"], cparams["port"], cparams["user"]
-            )
-            token_cache.clear()
-            token_cache.extend((monotonic(), token))
-        cparams["password"] = token_cache[1]
+        cparams["password"] = token_refresher.get_token()
 
         # SQLAlchemy converts the URL to connect() arguments, but asyncpg
         # only accepts sslmode et al. in a URL, not as arguments. So we
@@ -167,3 +217,5 @@ def setup_rds_iam_auth(engine: AsyncEngine) -> None:
                 f"SET statement_timeout = {timeout}"
             )
         )
+
+    return token_refresher
@@ -0,0 +1,161 @@
+# pyre-strict
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from secrets import token_hex
+from typing import Awaitable, Callable
+from unittest.mock import AsyncMock, Mock, patch
+
+from nostr_sdk import EventId, Output, SendEventOutput
+from quart import current_app
+from quart.app import QuartClient
+from sqlalchemy import event
+
+from nwc_backend.db import db
+from nwc_backend.event_handlers import connection_usage_writer
+from nwc_backend.event_handlers.__tests__.nip47_event_handler_test import Harness
+from nwc_backend.event_handlers.connection_usage_writer import (
+    ConnectionUsageWriter,
+    record_connection_usage,
+)
+from nwc_backend.event_handlers.nip47_event_handler import handle_nip47_event
+from nwc_backend.models.__tests__.model_examples import create_nwc_connection
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.nwc_connection import NWCConnection
+from nwc_backend.models.permissions_grouping import PermissionsGroup
+
+
+async def _get_last_used_at(connection: NWCConnection) -> datetime:
+    async with current_app.app_context():
+        connection = await db.session.get_one(NWCConnection, connection.id)
+        return connection.last_used_at
+
+
+async def test_flush_coalesces_updates(test_client: QuartClient) -> None:
+    now = datetime.now(timezone.utc)
+    async with test_client.app.app_context():
+        connections = [await create_nwc_connection() for _ in range(2)]
+        updated_at = connections[0].updated_at
+        writer = ConnectionUsageWriter(current_app, flush_interval=10)
+        for seconds in [1, 3, 2]:
+            writer.add(connections[0].id, now + timedelta(seconds=seconds))
+        writer.add(connections[1].id, now)
+
+        statements: list[tuple[str, bool]] = []
+        engine = db.engine.sync_engine
+
+        def record_statement(
+            statement: str, executemany: bool, **kwargs: object
+        ) -> None:
+            statements.append((statement.split()[0], executemany))
+
+        event.listen(engine, "before_cursor_execute", record_statement, named=True)
+        try:
+            await writer.flush()
+        finally:
+            event.remove(engine, "before_cursor_execute", record_statement)
+
+        assert statements == [("UPDATE", True)]
+        assert await _get_last_used_at(connections[0]) == now + timedelta(seconds=3)
+        assert await _get_last_used_at(connections[1]) == now
+
+        # Another worker may flush an older time later.
+        writer.add(connections[0].id, now + timedelta(seconds=2))
+        await writer.flush()
+        assert await _get_last_used_at(connections[0]) == now + timedelta(seconds=3)
+
+        async with current_app.app_context():
+            connection = await db.session.get_one(NWCConnection, connections[0].id)
+            assert connection.updated_at == updated_at
+            connection_dict = await connection.to_dict()
+        assert (
+            connection_dict["last_used_at"] == (now + timedelta(seconds=3)).isoformat()
+        )
+
+
+async def test_record_connection_usage__batched(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        connection = await create_nwc_connection()
+        writer = ConnectionUsageWriter(current_app, flush_interval=10)
+        with patch.object(connection_usage_writer, "_connection_usage_writer", writer):
+            await record_connection_usage(connection.id)
+        assert await _get_last_used_at(connection) is None
+
+        await writer.flush()
+        assert await _get_last_used_at(connection) is not None
+
+
+async def test_failed_batch_retried(test_client: QuartClient) -> None:
+    now = datetime.now(timezone.utc)
+    async with test_client.app.app_context():
+        connections = [await create_nwc_connection() for _ in range(2)]
+
+    writer = ConnectionUsageWriter(test_client.app, flush_interval=10)
+    writer.add(connections[0].id, now + timedelta(seconds=2))
+    writer.add(connections[1].id, now + timedelta(seconds=2))
+    with patch.object(db.session, "execute", side_effect=ConnectionError("db is down")):
+        await writer.flush()
+    # Uses made after the failed flush are merged with the failed batch.
+    writer.add(connections[0].id, now + timedelta(seconds=1))
+    writer.add(connections[1].id, now + timedelta(seconds=3))
+
+    await writer.flush()
+    async with test_client.app.app_context():
+        assert await _get_last_used_at(connections[0]) == now + timedelta(seconds=2)
+        assert await _get_last_used_at(connections[1]) == now + timedelta(seconds=3)
+
+
+async def test_stop_waits_for_in_flight_flush(test_client: QuartClient) -> None:
+    now = datetime.now(timezone.utc)
+    async with test_client.app.app_context():
+        connection = await create_nwc_connection()
+
+    writer = ConnectionUsageWriter(test_client.app, flush_interval=0.01)
+    writer.start()
+    writer.add(connection.id, now)
+
+    execute: Callable[..., Awaitable[object]] = db.session.execute
+    flush_started: asyncio.Event = asyncio.Event()
+
+    async def slow_execute(*args: object, **kwargs: object) -> object:
+        flush_started.set()
+        await asyncio.sleep(0.05)
+        return await execute(*args, **kwargs)
+
+    with patch.object(db.session, "execute", new=slow_execute):
+        await flush_started.wait()
+        await writer.stop()
+
+    async with test_client.app.app_context():
+        assert await _get_last_used_at(connection) == now
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_handle_nip47_event__records_usage(
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        connection = await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.READ_BALANCE],
+            keys=harness.client_app_keys,
+        )
+        assert await _get_last_used_at(connection) is None
+
+        before = datetime.now(timezone.utc)
+        with patch(
+            "nwc_backend.event_handlers.nip47_event_handler.get_info",
+            new=AsyncMock(return_value=Mock(to_dict=Mock(return_value={}))),
+        ):
+            await handle_nip47_event(
+                harness.create_request_event(
+                    method=Nip47RequestMethod.GET_INFO, params={}
+                )
+            )
+
+        assert await _get_last_used_at(connection) >= before
@@ -0,0 +1,107 @@
+# pyre-strict
+
+import json
+import time
+from hashlib import sha256
+from typing import Callable
+
+import pytest
+from nostr_sdk import Event, Keys, Kind, KindEnum
+
+from nwc_backend.event_handlers.event_builder import EventBuilder
+
+BENCHMARK_ROUNDS = 5
+BENCHMARK_REPEATS = 3
+BENCHMARK_MAX_RATIO = 1.5
+
+
+# The previous build path: hashes and signs in python, then parses the json.
+def _build_with_json_round_trip(builder: EventBuilder) -> Event:
+    pubkey = builder.keys.public_key().to_hex()
+    serialized_data = json.dumps(
+        [
+            0,
+            pubkey,
+            builder.created_at,
+            builder.kind.as_u16(),
+            builder.tags,
+            builder.content,
+        ],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    event_id = sha256(serialized_data.encode()).hexdigest()
+    return Event.from_json(
+        json.dumps(
+            {
+                "id": event_id,
+                "pubkey": builder.keys.public_key().to_hex(),
+                "created_at": builder.created_at,
+                "kind": builder.kind.as_u16(),
+                "tags": builder.tags,
+                "content": builder.content,
+                "sig": builder.keys.sign_schnorr(bytes.fromhex(event_id)),
+            }
+        )
+    )
+
+
+def _create_builder(keys: Keys, content: str) -> EventBuilder:
+    return (
+        EventBuilder(
+            kind=KindEnum.TEXT_NOTE(),  # pyre-ignore[6]
+            content=content,
+            keys=keys,
+        )
+        .add_tag(["p", Keys.generate().public_key().to_hex()])
+        .add_tag(["e", "a" * 64])
+    )
+
+
+def _time_per_build(build: Callable[[], Event]) -> float:
+    # The best of several runs, so other load on the machine doesn't skew it.
+    best = float("inf")
+    for _ in range(BENCHMARK_REPEATS):
+        start = time.perf_counter()
+        for _ in range(BENCHMARK_ROUNDS):
+            build()
+        best = min(best, (time.perf_counter() - start) / BENCHMARK_ROUNDS)
+    return best
+
+
+def test_build() -> None:
+    keys = Keys.generate()
+    builder = _create_builder(keys, 'hello "nostr" ✓\n')
+
+    event = builder.build()
+
+    assert event.verify()
+    assert event.author().to_hex() == keys.public_key().to_hex()
+    assert event.kind() == Kind.from_enum(KindEnum.TEXT_NOTE())  # pyre-ignore[6]
+    assert event.content() == 'hello "nostr" ✓\n'
+    assert event.created_at().as_secs() == builder.created_at
+    assert [tag.as_vec() for tag in event.tags()] == builder.tags
+    assert event.id().to_hex() == _build_with_json_round_trip(builder).id().to_hex()
+
+
+@pytest.mark.parametrize("size", [1_000, 100_000], ids=["1KB", "100KB"])
+def test_build__large_content(size: int) -> None:
+    builder = _create_builder(Keys.generate(), "x" * size)
+
+    event = builder.build()
+
+    assert event.verify()
+    assert event.content() == "x" * size
+    assert event.id().to_hex() == _build_with_json_round_trip(builder).id().to_hex()
+
+
+@pytest.mark.parametrize("size", [1_000, 100_000], ids=["1KB", "100KB"])
+def test_build_benchmark(size: int) -> None:
+    builder = _create_builder(Keys.generate(), "x" * size)
+
+    json_round_trip = _time_per_build(lambda: _build_with_json_round_trip(builder))
+    native = _time_per_build(builder.build)
+
+    # The gain is small next to hashing and signing, so this leaves room for noise
+    # and only catches the native build falling well behind the old path.
+    assert native < json_round_trip * BENCHMARK_MAX_RATIO
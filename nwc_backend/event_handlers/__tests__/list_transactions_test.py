@@ -1,7 +1,9 @@
 # pyre-strict
 
 import json
+import tracemalloc
 from secrets import token_hex
+from typing import Any, Callable
 from unittest.mock import ANY, AsyncMock, Mock, patch
 
 import aiohttp
@@ -10,7 +12,11 @@ from quart.app import QuartClient
 from uma_auth.models.transaction import TransactionType
 
 from nwc_backend.event_handlers.__tests__.utils import exclude_none_values
-from nwc_backend.event_handlers.list_transactions_handler import list_transactions
+from nwc_backend import fast_json
+from nwc_backend.event_handlers.list_transactions_handler import (
+    list_transactions,
+    summarize_list_transactions,
+)
 from nwc_backend.exceptions import InvalidInputException
 from nwc_backend.models.nip47_request import Nip47Request
 
@@ -70,3 +76,77 @@ async def test_list_transactions_failure__invalid_input(
                     params={"from": "abcde", "limit": 50, "offset": 100}
                 ),
             )
+
+
+@patch.object(aiohttp.ClientSession, "get")
+async def test_list_transactions__limit_capped(
+    mock_get: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value=json.dumps({"transactions": []}))
+    mock_response.ok = True
+    mock_get.return_value.__aenter__.return_value = mock_response
+
+    test_client.app.config["NIP47_LIST_TRANSACTIONS_MAX_LIMIT"] = 20
+    async with test_client.app.app_context():
+        for params, expected_params in [
+            ({"limit": 50}, {"limit": 20}),
+            ({"limit": 10}, {"limit": 10}),
+            ({}, {"limit": 20}),
+        ]:
+            await list_transactions(
+                access_token=token_hex(), request=Nip47Request(params=params)
+            )
+            mock_get.assert_called_with(
+                url="/transactions", params=expected_params, headers=ANY
+            )
+
+
+async def test_summarize_list_transactions(test_client: QuartClient) -> None:
+    result = {"transactions": [_create_transaction(i) for i in range(3)]}
+
+    async with test_client.app.app_context():
+        assert summarize_list_transactions(result) is result
+
+        test_client.app.config["NIP47_LIST_TRANSACTIONS_SAVE_SUMMARY"] = True
+        summary = summarize_list_transactions(result)
+        assert summary["transactions_count"] == 3
+        assert summary["sha256"] == summarize_list_transactions(result)["sha256"]
+        assert (
+            summary["sha256"]
+            != summarize_list_transactions({"transactions": []})["sha256"]
+        )
+
+
+def test_serialize_large_list_transactions() -> None:
+    content: dict[str, Any] = {
+        "result_type": "list_transactions",
+        "result": {"transactions": [_create_transaction(i) for i in range(5000)]},
+    }
+
+    def measure(dumps: Callable[[object], str]) -> tuple[str, int]:
+        tracemalloc.start()
+        try:
+            serialized = dumps(content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return serialized, peak
+
+    json_content, json_peak = measure(
+        lambda obj: json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    )
+    fast_json_content, fast_json_peak = measure(fast_json.dumps)
+
+    assert fast_json_content == json_content
+    assert fast_json_peak < json_peak
+
+
+def _create_transaction(i: int) -> dict[str, Any]:
+    return {
+        "type": TransactionType.INCOMING.value,
+        "invoice": token_hex(100),
+        "payment_hash": token_hex(),
+        "amount": 1000 * i,
+        "created_at": 1692055140 + i,
+    }
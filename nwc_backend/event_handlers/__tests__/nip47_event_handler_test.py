@@ -1,5 +1,6 @@
 # pyre-strict
 
+import asyncio
 import json
 from dataclasses import dataclass
 from secrets import token_hex
@@ -21,7 +22,7 @@ from nostr_sdk import (
 )
 import pytest
 from quart.app import QuartClient
-from sqlalchemy.sql import select
+from sqlalchemy.sql import select, update
 from uma_auth.models.error_response import ErrorCode as VaspErrorCode
 from uma_auth.models.error_response import ErrorResponse as VaspErrorResponse
 
@@ -34,6 +35,7 @@ from nwc_backend.models.__tests__.model_examples import (
 )
 from nwc_backend.models.nip47_request import Nip47Request
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.nwc_connection import NWCConnection
 from nwc_backend.models.permissions_grouping import PermissionsGroup
 from nwc_backend.nostr.nostr_config import NostrConfig
 
@@ -124,6 +126,10 @@ async def test_failed__no_nwc_connection(
     mock_nostr_send: AsyncMock,
     test_client: QuartClient,
 ) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
     async with test_client.app.app_context():
         harness = Harness.prepare()
         request_event = harness.create_request_event()
@@ -140,6 +146,10 @@ async def test_failed__access_token_expired(
     mock_nostr_send: AsyncMock,
     test_client: QuartClient,
 ) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
     async with test_client.app.app_context():
         harness = Harness.prepare()
         await create_nwc_connection(
@@ -165,6 +175,10 @@ async def test_failed__no_permission(
     mock_nostr_send: AsyncMock,
     test_client: QuartClient,
 ) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
     async with test_client.app.app_context():
         harness = Harness.prepare()
         await create_nwc_connection(
@@ -308,6 +322,89 @@ async def test_failed__vasp_error_response(
         assert content["error"]["message"] == vasp_response.message
 
 
+@patch("nwc_backend.models.nwc_connection._connection_cache", None)
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+@patch.object(aiohttp.ClientSession, "post")
+async def test_failed__payment_on_connection_revoked_by_other_process(
+    mock_vasp_pay_invoice: Mock,
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    test_client.app.config["NWC_CONNECTION_CACHE_TTL"] = 30
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        nwc_connection = await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.SEND_PAYMENTS],
+            keys=harness.client_app_keys,
+        )
+        # Cache the connection, then revoke it without invalidating the cache.
+        assert await NWCConnection.from_nostr_pubkey_cached(
+            harness.client_app_keys.public_key().to_hex()
+        )
+        await db.session.execute(
+            update(NWCConnection)
+            .where(NWCConnection.id == nwc_connection.id)
+            .values(connection_expires_at=1)
+        )
+        await db.session.commit()
+
+    async with test_client.app.app_context():
+        request_event = harness.create_request_event()
+        await handle_nip47_event(request_event)
+
+        mock_vasp_pay_invoice.assert_not_called()
+        response_event = mock_nostr_send.call_args[0][0]
+        content = harness.validate_response_event(response_event, request_event.id())
+        assert content["error"]["code"] == ErrorCode.UNAUTHORIZED.name
+
+
+@patch("nwc_backend.models.nwc_connection._connection_cache", None)
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+@patch.object(aiohttp.ClientSession, "get")
+async def test_failed__read_on_connection_revoked_by_other_process(
+    mock_vasp_get_balance: Mock,
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        nwc_connection = await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.READ_BALANCE],
+            keys=harness.client_app_keys,
+        )
+        # Connections aren't cached by default, so a revocation applies right away.
+        assert await NWCConnection.from_nostr_pubkey_cached(
+            harness.client_app_keys.public_key().to_hex()
+        )
+        await db.session.execute(
+            update(NWCConnection)
+            .where(NWCConnection.id == nwc_connection.id)
+            .values(connection_expires_at=1)
+        )
+        await db.session.commit()
+
+    async with test_client.app.app_context():
+        request_event = harness.create_request_event(
+            method=Nip47RequestMethod.GET_BALANCE, params={}
+        )
+        await handle_nip47_event(request_event)
+
+        mock_vasp_get_balance.assert_not_called()
+        response_event = mock_nostr_send.call_args[0][0]
+        content = harness.validate_response_event(response_event, request_event.id())
+        assert content["error"]["code"] == ErrorCode.UNAUTHORIZED.name
+
+
 @patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
 @patch.object(aiohttp.ClientSession, "post")
 async def test_duplicate_event(
@@ -390,3 +487,57 @@ async def test_failed__wrong_encryption_for_tag(
         )
         assert content["result_type"] == Nip47RequestMethod.PAY_INVOICE.value
         assert content["error"]["code"] == ErrorCode.OTHER.name
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_payments_of_same_connection_run_serially(
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+    in_flight: dict[Nip47RequestMethod, int] = {}
+    max_in_flight: dict[Nip47RequestMethod, int] = {}
+
+    def fake_handler(method: Nip47RequestMethod) -> AsyncMock:
+        async def handle(access_token: str, request: Nip47Request) -> Mock:
+            in_flight[method] = in_flight.get(method, 0) + 1
+            max_in_flight[method] = max(max_in_flight.get(method, 0), in_flight[method])
+            await asyncio.sleep(0.01)
+            in_flight[method] -= 1
+            return Mock(to_dict=Mock(return_value={}))
+
+        return AsyncMock(side_effect=handle)
+
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.SEND_PAYMENTS],
+            keys=harness.client_app_keys,
+        )
+        request_events = [
+            harness.create_request_event(method=method)
+            for method in [Nip47RequestMethod.PAY_INVOICE] * 3
+            + [Nip47RequestMethod.GET_INFO] * 3
+        ]
+
+    async def handle_in_own_context(event: Event) -> None:
+        async with test_client.app.app_context():
+            await handle_nip47_event(event)
+
+    with patch(
+        "nwc_backend.event_handlers.nip47_event_handler.pay_invoice",
+        new=fake_handler(Nip47RequestMethod.PAY_INVOICE),
+    ), patch(
+        "nwc_backend.event_handlers.nip47_event_handler.get_info",
+        new=fake_handler(Nip47RequestMethod.GET_INFO),
+    ):
+        await asyncio.gather(
+            *[handle_in_own_context(event) for event in request_events]
+        )
+
+    assert mock_nostr_send.call_count == 6
+    assert max_in_flight[Nip47RequestMethod.PAY_INVOICE] == 1
+    assert max_in_flight[Nip47RequestMethod.GET_INFO] == 3
@@ -0,0 +1,173 @@
+# pyre-strict
+
+from secrets import token_hex
+from typing import Any
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+from nostr_sdk import ErrorCode, EventId, Output, SendEventOutput
+from quart import current_app
+from quart.app import QuartClient
+from sqlalchemy.sql import select
+
+from nwc_backend.db import db
+from nwc_backend.event_handlers import nip47_rate_limiter
+from nwc_backend.event_handlers.__tests__.nip47_event_handler_test import Harness
+from nwc_backend.event_handlers.nip47_event_handler import handle_nip47_event
+from nwc_backend.event_handlers.nip47_rate_limiter import Nip47RateLimiter
+from nwc_backend.models.__tests__.model_examples import create_nwc_connection
+from nwc_backend.models.nip47_rate_limit_bucket import Nip47RateLimitBucket
+from nwc_backend.models.nip47_request import Nip47Request
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.permissions_grouping import PermissionsGroup
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _create_rate_limiter(clock: FakeClock, **config: Any) -> Nip47RateLimiter:
+    with patch.dict(current_app.config, config):
+        return Nip47RateLimiter(clock=clock, wall_clock=clock)
+
+
+async def test_try_acquire__disabled(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        rate_limiter = _create_rate_limiter(FakeClock())
+        for _ in range(100):
+            assert await rate_limiter.try_acquire(
+                uuid4(), Nip47RequestMethod.PAY_INVOICE
+            )
+
+
+async def test_try_acquire__in_memory(test_client: QuartClient) -> None:
+    clock = FakeClock()
+    connection_id = uuid4()
+    async with test_client.app.app_context():
+        rate_limiter = _create_rate_limiter(
+            clock,
+            NIP47_RATE_LIMIT_PAYMENTS_PER_MINUTE=6,
+            NIP47_RATE_LIMIT_PAYMENTS_BURST=2,
+            NIP47_RATE_LIMIT_READS_PER_MINUTE=60,
+        )
+
+        for method in [Nip47RequestMethod.PAY_INVOICE, Nip47RequestMethod.PAY_KEYSEND]:
+            assert await rate_limiter.try_acquire(connection_id, method)
+        assert not await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.EXECUTE_QUOTE
+        )
+        # Reads and other connections have their own buckets.
+        assert await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.GET_BALANCE
+        )
+        assert await rate_limiter.try_acquire(uuid4(), Nip47RequestMethod.PAY_INVOICE)
+
+        clock.now += 9
+        assert not await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+        clock.now += 1
+        assert await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+        assert not await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+
+        # The bucket never refills over its burst size.
+        clock.now += 3600
+        assert await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+        assert await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+        assert not await rate_limiter.try_acquire(
+            connection_id, Nip47RequestMethod.PAY_INVOICE
+        )
+
+
+async def test_try_acquire__shared_between_workers(test_client: QuartClient) -> None:
+    clock = FakeClock()
+    async with test_client.app.app_context():
+        nwc_connection = await create_nwc_connection()
+        config = {
+            "NIP47_RATE_LIMIT_PAYMENTS_PER_MINUTE": 6,
+            "NIP47_RATE_LIMIT_PAYMENTS_BURST": 3,
+            "NIP47_RATE_LIMIT_SHARED": True,
+        }
+        workers = [_create_rate_limiter(clock, **config) for _ in range(2)]
+
+        for worker in [workers[0], workers[1], workers[0]]:
+            assert await worker.try_acquire(
+                nwc_connection.id, Nip47RequestMethod.PAY_INVOICE
+            )
+        for worker in workers:
+            assert not await worker.try_acquire(
+                nwc_connection.id, Nip47RequestMethod.PAY_INVOICE
+            )
+        assert await workers[1].try_acquire(
+            nwc_connection.id, Nip47RequestMethod.GET_INFO
+        )
+
+        clock.now += 10
+        assert await workers[1].try_acquire(
+            nwc_connection.id, Nip47RequestMethod.PAY_INVOICE
+        )
+        assert not await workers[0].try_acquire(
+            nwc_connection.id, Nip47RequestMethod.PAY_INVOICE
+        )
+
+        buckets = (await db.session.execute(select(Nip47RateLimitBucket))).scalars()
+        assert len(buckets.all()) == 1
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_handle_nip47_event__rate_limited(
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = SendEventOutput(
+        id=EventId.from_hex(token_hex()),
+        output=Output(success=["wss://relay.getalby.com/v1"], failed={}),
+    )
+    async with test_client.app.app_context():
+        harness = Harness.prepare()
+        await create_nwc_connection(
+            granted_permissions_groups=[PermissionsGroup.READ_BALANCE],
+            keys=harness.client_app_keys,
+        )
+        rate_limiter = _create_rate_limiter(
+            FakeClock(),
+            NIP47_RATE_LIMIT_READS_PER_MINUTE=60,
+            NIP47_RATE_LIMIT_READS_BURST=1,
+        )
+        request_events = [
+            harness.create_request_event(method=Nip47RequestMethod.GET_INFO, params={})
+            for _ in range(2)
+        ]
+
+        with patch.object(
+            nip47_rate_limiter, "_nip47_rate_limiter", rate_limiter
+        ), patch(
+            "nwc_backend.event_handlers.nip47_event_handler.get_info",
+            new=AsyncMock(return_value=Mock(to_dict=Mock(return_value={}))),
+        ):
+            for request_event in request_events:
+                await handle_nip47_event(request_event)
+
+        assert mock_nostr_send.call_count == 2
+        content = harness.validate_response_event(
+            mock_nostr_send.call_args_list[1][0][0], request_events[1].id()
+        )
+        assert content["result_type"] == Nip47RequestMethod.GET_INFO.value
+        assert content["error"]["code"] == ErrorCode.RATE_LIMITED.name
+
+        nip47_requests = (await db.session.execute(select(Nip47Request))).scalars()
+        assert [request.event_id for request in nip47_requests] == [
+            request_events[0].id().to_hex()
+        ]
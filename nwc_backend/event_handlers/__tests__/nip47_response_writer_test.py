@@ -0,0 +1,111 @@
+# pyre-strict
+
+import asyncio
+from secrets import token_hex
+from typing import Awaitable, Callable
+from unittest.mock import patch
+from uuid import UUID
+
+from nostr_sdk import ErrorCode, Nip47Error
+from quart.app import QuartClient
+
+from nwc_backend.db import db
+from nwc_backend.event_handlers.nip47_response_writer import (
+    MAX_BATCH_ATTEMPTS,
+    Nip47ResponseWriter,
+)
+from nwc_backend.models.__tests__.model_examples import create_nip47_request
+from nwc_backend.models.nip47_request import Nip47Request
+
+
+async def test_responses_written_in_batches(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        requests = [await create_nip47_request() for _ in range(3)]
+
+    writer = Nip47ResponseWriter(
+        app=test_client.app, flush_interval=60, max_batch_size=2
+    )
+    writer.start()
+    response_event_ids = [token_hex() for _ in requests]
+    writer.add(requests[0], response_event_ids[0], {"balance": 1})
+    writer.add(
+        requests[1],
+        response_event_ids[1],
+        Nip47Error(code=ErrorCode.INTERNAL, message="error"),
+    )
+
+    # The first two responses fill a batch and are flushed without waiting.
+    await asyncio.sleep(0.05)
+    writer.add(requests[2], response_event_ids[2], {"balance": 3})
+    async with test_client.app.app_context():
+        request = await db.session.get_one(Nip47Request, requests[0].id)
+        assert request.response_event_id == response_event_ids[0]
+        assert request.response_result == {"balance": 1}
+        request = await db.session.get_one(Nip47Request, requests[1].id)
+        assert request.response_event_id == response_event_ids[1]
+        assert request.response_error_code == ErrorCode.INTERNAL
+        request = await db.session.get_one(Nip47Request, requests[2].id)
+        assert request.response_event_id != response_event_ids[2]
+
+    # Pending responses are flushed on stop.
+    await writer.stop()
+    async with test_client.app.app_context():
+        request = await db.session.get_one(Nip47Request, requests[2].id)
+        assert request.response_event_id == response_event_ids[2]
+        assert request.response_result == {"balance": 3}
+
+
+async def test_failed_batch_retried(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        requests = [await create_nip47_request() for _ in range(2)]
+
+    writer = Nip47ResponseWriter(
+        app=test_client.app, flush_interval=60, max_batch_size=10
+    )
+    response_event_ids = [token_hex() for _ in requests]
+    writer.add(requests[0], response_event_ids[0], {"balance": 1})
+    with patch.object(db.session, "execute", side_effect=ConnectionError("db is down")):
+        await writer.flush()
+    writer.add(requests[1], response_event_ids[1], {"balance": 2})
+
+    await writer.flush()
+    async with test_client.app.app_context():
+        for request, response_event_id in zip(requests, response_event_ids):
+            request = await db.session.get_one(Nip47Request, request.id)
+            assert request.response_event_id == response_event_id
+
+
+async def test_failed_batch_saved_row_by_row_after_max_attempts(
+    test_client: QuartClient,
+) -> None:
+    async with test_client.app.app_context():
+        requests = [await create_nip47_request() for _ in range(2)]
+    bad_request_id: UUID = requests[0].id
+
+    writer = Nip47ResponseWriter(
+        app=test_client.app, flush_interval=60, max_batch_size=10
+    )
+    response_event_ids = [token_hex() for _ in requests]
+    for request, response_event_id in zip(requests, response_event_ids):
+        writer.add(request, response_event_id, {"balance": 1})
+
+    execute: Callable[..., Awaitable[object]] = db.session.execute
+
+    async def execute_failing_bad_row(
+        statement: object, params: list[dict[str, object]]
+    ) -> object:
+        if any(row["id"] == bad_request_id for row in params):
+            raise ValueError("bad row")
+        return await execute(statement, params)
+
+    with patch.object(db.session, "execute", new=execute_failing_bad_row):
+        for _ in range(MAX_BATCH_ATTEMPTS):
+            await writer.flush()
+
+    # The bad row is dropped, and the other one is saved on its own.
+    assert not writer._pending  # noqa: SLF001
+    async with test_client.app.app_context():
+        request = await db.session.get_one(Nip47Request, requests[0].id)
+        assert request.response_event_id != response_event_ids[0]
+        request = await db.session.get_one(Nip47Request, requests[1].id)
+        assert request.response_event_id == response_event_ids[1]
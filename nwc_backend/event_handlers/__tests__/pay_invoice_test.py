@@ -16,6 +16,7 @@ from uma_auth.models.error_response import ErrorResponse as VaspErrorResponse
 from uma_auth.models.pay_invoice_request import PayInvoiceRequest
 
 from nwc_backend.db import db
+from nwc_backend.event_handlers import payment_utils
 from nwc_backend.event_handlers.__tests__.utils import exclude_none_values
 from nwc_backend.event_handlers.pay_invoice_handler import pay_invoice
 from nwc_backend.exceptions import InsufficientBudgetException, Nip47RequestException
@@ -486,3 +487,66 @@ async def test_budget_not_enough__spending_limit_USD_enabled(
         assert spending_cycle.limit_amount == spending_limit.amount
         assert spending_cycle.total_spent == 0
         assert spending_cycle.total_spent_on_hold == 0
+
+
+@patch.object(aiohttp.ClientSession, "post")
+@patch.object(aiohttp.ClientSession, "get")
+async def test_pay_invoice_success__cached_budget_rate(
+    mock_get_budget_estimate: Mock, mock_pay_invoice: Mock, test_client: QuartClient
+) -> None:
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(return_value=json.dumps({"preimage": token_hex()}))
+    mock_response.ok = True
+    mock_pay_invoice.return_value.__aenter__.return_value = mock_response
+
+    estimated_budget_currency_amount = 112
+    mock_response = AsyncMock()
+    mock_response.text = AsyncMock(
+        return_value=json.dumps(
+            {"estimated_budget_currency_amount": estimated_budget_currency_amount}
+        )
+    )
+    mock_response.ok = True
+    mock_get_budget_estimate.return_value.__aenter__.return_value = mock_response
+
+    test_client.app.config["BUDGET_RATE_CACHE_TTL"] = 60
+    test_client.app.config["BUDGET_RATE_CACHE_BUFFER_MULTIPLIER"] = 1.05
+    with patch.object(payment_utils, "_budget_rate_cache", None):
+        async with test_client.app.app_context():
+            params = {"invoice": INVOICE, "amount": 1000_000}
+            request = await create_nip47_request_with_spending_limit(
+                "USD", 10000, params
+            )
+            await pay_invoice(access_token=token_hex(), request=request)
+            mock_get_budget_estimate.assert_called_once()
+
+            # The second payment of twice the amount is estimated from the rate
+            # of the first, without calling the VASP.
+            request = await create_nip47_request(
+                nwc_connection=request.nwc_connection,
+                params={"invoice": INVOICE, "amount": 2000_000},
+            )
+            await pay_invoice(access_token=token_hex(), request=request)
+            mock_get_budget_estimate.assert_called_once()
+
+            payments = (
+                (
+                    await db.session.execute(
+                        select(OutgoingPayment).order_by(
+                            OutgoingPayment.sending_currency_amount
+                        )
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            assert [p.estimated_budget_currency_amount for p in payments] == [
+                estimated_budget_currency_amount,
+                2 * estimated_budget_currency_amount,
+            ]
+            assert payments[1].budget_on_hold == math.ceil(
+                2
+                * estimated_budget_currency_amount
+                * test_client.app.config["BUDGET_BUFFER_MULTIPLIER"]
+                * 1.05
+            )
@@ -0,0 +1,126 @@
+# pyre-strict
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from quart import Quart
+from sqlalchemy import Table, bindparam, or_, update
+from sqlalchemy.sql.dml import Update
+
+from nwc_backend.db import db
+from nwc_backend.models.nwc_connection import NWCConnection
+
+
+# Uses of a connection between two flushes are coalesced into a single update.
+class ConnectionUsageWriter:
+    def __init__(self, app: Quart, flush_interval: float) -> None:
+        self.app = app
+        self.flush_interval = flush_interval
+        self._pending: dict[UUID, datetime] = {}
+        self._stop_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @staticmethod
+    def from_config(app: Quart) -> Optional["ConnectionUsageWriter"]:
+        flush_interval = app.config.get("NWC_CONNECTION_LAST_USED_FLUSH_INTERVAL", 10)
+        if not flush_interval:
+            return None
+        return ConnectionUsageWriter(app=app, flush_interval=flush_interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="connection-usage-writer")
+
+    async def stop(self) -> None:
+        # Let an in-flight flush finish rather than cancelling it with its batch.
+        self._stop_requested.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def add(self, nwc_connection_id: UUID, used_at: datetime) -> None:
+        last_used_at = self._pending.get(nwc_connection_id)
+        if last_used_at is None or last_used_at < used_at:
+            self._pending[nwc_connection_id] = used_at
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        try:
+            async with self.app.app_context():
+                await db.session.execute(
+                    _last_used_at_update(),
+                    [
+                        {"connection_id": connection_id, "used_at": used_at}
+                        for connection_id, used_at in batch.items()
+                    ],
+                )
+                await db.session.commit()
+        except Exception:
+            # Keep the batch, merged with newer uses, to retry it in the next flush.
+            logging.exception("Failed to save last use of %d connections.", len(batch))
+            for connection_id, used_at in batch.items():
+                self.add(connection_id, used_at)
+
+    async def _run(self) -> None:
+        while not self._stop_requested.is_set():
+            try:
+                await asyncio.wait_for(self._stop_requested.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            await self.flush()
+
+
+async def record_connection_usage(
+    nwc_connection_id: UUID, used_at: Optional[datetime] = None
+) -> None:
+    used_at = used_at or datetime.now(timezone.utc)
+    if _connection_usage_writer:
+        _connection_usage_writer.add(nwc_connection_id, used_at)
+        return
+
+    await db.session.execute(
+        _last_used_at_update(),
+        [{"connection_id": nwc_connection_id, "used_at": used_at}],
+    )
+    await db.session.commit()
+
+
+def _last_used_at_update() -> Update:
+    table = NWCConnection.__table__
+    assert isinstance(table, Table)
+    # Workers flush independently, so an older time never overwrites a newer one.
+    # updated_at is kept, as it tracks changes to the connection's settings.
+    return (
+        update(table)
+        .where(
+            table.c.id == bindparam("connection_id"),
+            or_(
+                table.c.last_used_at.is_(None),
+                table.c.last_used_at < bindparam("used_at"),
+            ),
+        )
+        .values(last_used_at=bindparam("used_at"), updated_at=table.c.updated_at)
+    )
+
+
+async def start_connection_usage_writer(app: Quart) -> None:
+    global _connection_usage_writer  # noqa: PLW0603
+    _connection_usage_writer = ConnectionUsageWriter.from_config(app)
+    if _connection_usage_writer:
+        _connection_usage_writer.start()
+
+
+async def stop_connection_usage_writer() -> None:
+    global _connection_usage_writer  # noqa: PLW0603
+    if _connection_usage_writer:
+        await _connection_usage_writer.stop()
+        _connection_usage_writer = None
+
+
+_connection_usage_writer: Optional[ConnectionUsageWriter] = None
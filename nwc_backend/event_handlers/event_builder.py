@@ -1,8 +1,6 @@
 # pyre-strict
 
-import json
 from datetime import datetime, timezone
-from hashlib import sha256
 from typing import Any, Optional
 
 from nostr_sdk import (
@@ -10,15 +8,17 @@ from nostr_sdk import (
     Keys,
     Kind,
     KindEnum,
-    Nip44Version,
     Nip47Error,
     PublicKey,
-    nip04_encrypt,
-    nip44_encrypt,
+    Tag,
+    Timestamp,
 )
+from nostr_sdk import EventBuilder as SdkEventBuilder
 
+from nwc_backend import fast_json
 from nwc_backend.exceptions import EventBuilderException
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.nostr.conversation_keys import get_conversation_keys
 from nwc_backend.nostr.nostr_config import NostrConfig
 
 
@@ -43,19 +43,11 @@ class EventBuilder:
         if self.content_encrypted:
             raise EventBuilderException("Content has already been encrypted.")
 
+        conversation_keys = get_conversation_keys(self.keys, recipient_pubkey)
         self.content = (
-            nip44_encrypt(
-                secret_key=self.keys.secret_key(),
-                public_key=recipient_pubkey,
-                content=self.content,
-                version=Nip44Version.V2,
-            )
+            conversation_keys.nip44_encrypt(self.content)
             if use_nip44
-            else nip04_encrypt(
-                secret_key=self.keys.secret_key(),
-                public_key=recipient_pubkey,
-                content=self.content,
-            )
+            else conversation_keys.nip04_encrypt(self.content)
         )
         self.content_encrypted = True
         return self
@@ -70,37 +62,18 @@ class EventBuilder:
                 "Content must be encrypted using nip44 or nip04 for nip47 request and response."
             )
 
-        event_id = self._compute_id()
-        signature = self._sign(event_id)
-        return Event.from_json(
-            json.dumps(
-                {
-                    "id": event_id,
-                    "pubkey": self.keys.public_key().to_hex(),
-                    "created_at": self.created_at,
-                    "kind": self.kind.as_u16(),
-                    "tags": self.tags,
-                    "content": self.content,
-                    "sig": signature,
-                }
+        # The SDK builder computes the id and signs natively, without serializing
+        # the event to json and parsing it back.
+        return (
+            SdkEventBuilder(
+                kind=self.kind,
+                content=self.content,
+                tags=[Tag.parse(tag) for tag in self.tags],
             )
+            .custom_created_at(Timestamp.from_secs(self.created_at))
+            .to_event(self.keys)
         )
 
-    def _compute_id(self) -> str:
-        data = [
-            0,
-            self.keys.public_key().to_hex(),
-            self.created_at,
-            self.kind.as_u16(),
-            self.tags,
-            self.content,
-        ]
-        serialized_data = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-        return sha256(serialized_data.encode()).hexdigest()
-
-    def _sign(self, message: str) -> str:
-        return self.keys.sign_schnorr(bytes.fromhex(message))
-
 
 def create_nip47_response(
     event: Event, method: Nip47RequestMethod, result: dict[str, Any], use_nip44: bool
@@ -109,10 +82,10 @@ def create_nip47_response(
     return (
         EventBuilder(
             kind=KindEnum.WALLET_CONNECT_RESPONSE(),  # pyre-ignore[6]
-            content=json.dumps(content),
+            content=fast_json.dumps(content),
         )
         .encrypt_content(event.author(), use_nip44)
-        .add_tag(["p", NostrConfig.instance().identity_keys.public_key().to_hex()])
+        .add_tag(["p", NostrConfig.instance().identity_pubkey_hex])
         .add_tag(["e", event.id().to_hex()])
         .build()
     )
@@ -133,10 +106,10 @@ def create_nip47_error_response(
     return (
         EventBuilder(
             kind=KindEnum.WALLET_CONNECT_RESPONSE(),  # pyre-ignore[6]
-            content=json.dumps(content),
+            content=fast_json.dumps(content),
         )
         .encrypt_content(event.author(), use_nip44)
-        .add_tag(["p", NostrConfig.instance().identity_keys.public_key().to_hex()])
+        .add_tag(["p", NostrConfig.instance().identity_pubkey_hex])
         .add_tag(["e", event.id().to_hex()])
         .build()
     )
@@ -52,5 +52,5 @@ async def execute_quote(
         )
         return response
     except Exception:
-        await update_on_payment_failed(payment)
+        await update_on_payment_failed(request, payment)
         raise
@@ -1,9 +1,9 @@
 # pyre-strict
 
+from nwc_backend.event_handlers.payment_utils import estimate_budget_currency_amount
 from nwc_backend.models.nip47_budget import Nip47BudgetCurrency, Nip47BudgetResponse
 from nwc_backend.models.nip47_request import Nip47Request
 from nwc_backend.models.spending_limit_frequency import SpendingLimitFrequency
-from nwc_backend.vasp_client import VaspUmaClient
 
 
 async def get_budget(access_token: str, request: Nip47Request) -> Nip47BudgetResponse:
@@ -35,14 +35,14 @@ async def get_budget(access_token: str, request: Nip47Request) -> Nip47BudgetRes
             renewal_period=renewal_period,
         )
 
-    budget_estimate_response = await VaspUmaClient.instance().get_budget_estimate(
+    budget_estimate = await estimate_budget_currency_amount(
         access_token=access_token,
         sending_currency_code=budget_currency.code,
         sending_currency_amount=current_spending_limit.amount,
         budget_currency_code="SAT",
     )
 
-    total_budget_sats = budget_estimate_response.estimated_budget_currency_amount
+    total_budget_sats = budget_estimate.amount
     remaining_budget_sats = round(
         total_budget_sats
         / current_spending_limit.amount
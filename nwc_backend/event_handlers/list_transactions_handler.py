@@ -1,8 +1,13 @@
 # pyre-strict
 
+from hashlib import sha256
+from typing import Any, Optional
+
+from quart import current_app
 from uma_auth.models.list_transactions_response import ListTransactionsResponse
 from uma_auth.models.transaction import TransactionType
 
+from nwc_backend import fast_json
 from nwc_backend.event_handlers.input_validator import get_optional_field
 from nwc_backend.models.nip47_request import Nip47Request
 from nwc_backend.vasp_client import VaspUmaClient
@@ -15,8 +20,25 @@ async def list_transactions(
         access_token=access_token,
         from_timestamp=get_optional_field(request.params, "from", int),
         until_timestamp=get_optional_field(request.params, "until", int),
-        limit=get_optional_field(request.params, "limit", int),
+        limit=_get_capped_limit(get_optional_field(request.params, "limit", int)),
         offset=get_optional_field(request.params, "offset", int),
         unpaid=get_optional_field(request.params, "unpaid", bool),
         type=get_optional_field(request.params, "type", TransactionType),
     )
+
+
+def summarize_list_transactions(result: dict[str, Any]) -> dict[str, Any]:
+    if not current_app.config.get("NIP47_LIST_TRANSACTIONS_SAVE_SUMMARY", False):
+        return result
+
+    return {
+        "transactions_count": len(result.get("transactions") or []),
+        "sha256": sha256(fast_json.dumps(result).encode()).hexdigest(),
+    }
+
+
+def _get_capped_limit(limit: Optional[int]) -> Optional[int]:
+    max_limit = current_app.config.get("NIP47_LIST_TRANSACTIONS_MAX_LIMIT")
+    if not max_limit:
+        return limit
+    return min(limit, max_limit) if limit else max_limit
@@ -3,18 +3,21 @@
 import json
 import logging
 from datetime import datetime, timezone
+from typing import Any, Optional
+from uuid import UUID
 
 from nostr_sdk import (
     ErrorCode,
     Event,
     Nip47Error,
     TagKind,
-    nip04_decrypt,
-    nip44_decrypt,
 )
 from pydantic_core import ValidationError as PydanticValidationError
 from sqlalchemy.exc import IntegrityError
 
+from nwc_backend.event_handlers.connection_usage_writer import (
+    record_connection_usage,
+)
 from nwc_backend.event_handlers.event_builder import (
     create_nip47_error_response,
     create_nip47_response,
@@ -24,10 +27,15 @@ from nwc_backend.event_handlers.fetch_quote_handler import fetch_quote
 from nwc_backend.event_handlers.get_balance_handler import get_balance
 from nwc_backend.event_handlers.get_budget_handler import get_budget
 from nwc_backend.event_handlers.get_info_handler import get_info
-from nwc_backend.event_handlers.list_transactions_handler import list_transactions
+from nwc_backend.event_handlers.list_transactions_handler import (
+    list_transactions,
+    summarize_list_transactions,
+)
 from nwc_backend.event_handlers.lookup_invoice_handler import lookup_invoice
 from nwc_backend.event_handlers.lookup_user_handler import lookup_user
 from nwc_backend.event_handlers.make_invoice_handler import make_invoice
+from nwc_backend.event_handlers.nip47_rate_limiter import Nip47RateLimiter
+from nwc_backend.event_handlers.nip47_response_writer import defer_response_update
 from nwc_backend.event_handlers.pay_invoice_handler import pay_invoice
 from nwc_backend.event_handlers.pay_keysend_handler import pay_keysend
 from nwc_backend.event_handlers.pay_to_address_handler import pay_to_address
@@ -35,12 +43,21 @@ from nwc_backend.exceptions import Nip47RequestException
 from nwc_backend.models.nip47_request import Nip47Request
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
 from nwc_backend.models.nwc_connection import NWCConnection
-from nwc_backend.nostr.nostr_client import nostr_client
+from nwc_backend.nostr.conversation_keys import get_conversation_keys
+from nwc_backend.nostr.crypto_executor import run_crypto
+from nwc_backend.nostr.event_publisher import publish_event
 from nwc_backend.nostr.nostr_config import NostrConfig
 from nwc_backend.nostr.encryption import is_encryption_supported
+from nwc_backend.serial_lanes import LaneTicket, SerialLanes
+
+# Payment requests of the same connection update the same spending cycle, so they
+# run one at a time in the order received. Other requests are not serialized.
+_connection_payment_lanes: SerialLanes[UUID] = SerialLanes()
 
 
-async def handle_nip47_event(event: Event) -> None:
+async def handle_nip47_event(
+    event: Event, author_ticket: Optional[LaneTicket[str]] = None
+) -> None:
     expiration = event.get_tag_content(TagKind.EXPIRATION())  # pyre-ignore[6]
     if expiration and datetime.fromtimestamp(
         float(expiration), timezone.utc
@@ -49,23 +66,14 @@ async def handle_nip47_event(event: Event) -> None:
         return
 
     is_nip04_encrypted = "?iv=" in event.content()
-    content = json.loads(
-        nip04_decrypt(
-            secret_key=NostrConfig.instance().identity_keys.secret_key(),
-            public_key=event.author(),
-            encrypted_content=event.content(),
-        )
-        if is_nip04_encrypted
-        else nip44_decrypt(
-            secret_key=NostrConfig.instance().identity_keys.secret_key(),
-            public_key=event.author(),
-            payload=event.content(),
-        )
-    )
+    content = json.loads(await run_crypto(_decrypt_content, event, is_nip04_encrypted))
 
-    nwc_connection = await NWCConnection.from_nostr_pubkey(event.author().to_hex())
+    nwc_connection = await NWCConnection.from_nostr_pubkey_cached(
+        event.author().to_hex()
+    )
     if not nwc_connection:
-        error_response = create_nip47_error_response(
+        error_response = await run_crypto(
+            create_nip47_error_response,
             event=event,
             method=None,
             error=Nip47Error(
@@ -74,15 +82,56 @@ async def handle_nip47_event(event: Event) -> None:
             ),
             use_nip44=not is_nip04_encrypted,
         )
-        await nostr_client.send_event(error_response)
+        await publish_event(error_response)
         return
 
     method = Nip47RequestMethod(content["method"])
+    payment_ticket = (
+        _connection_payment_lanes.reserve(nwc_connection.id)
+        if method.is_payment()
+        else None
+    )
+    # Later requests of the author only wait for this one to be routed to its lane.
+    if author_ticket:
+        author_ticket.release()
 
+    try:
+        await _handle_nip47_request(
+            event=event,
+            nwc_connection=nwc_connection,
+            method=method,
+            content=content,
+            payment_ticket=payment_ticket,
+        )
+    finally:
+        if payment_ticket:
+            payment_ticket.release()
+
+
+async def reject_nip47_event(event: Event, message: str) -> None:
+    error_response = await run_crypto(
+        create_nip47_error_response,
+        event=event,
+        method=None,
+        error=Nip47Error(code=ErrorCode.RATE_LIMITED, message=message),
+        use_nip44="?iv=" not in event.content(),
+    )
+    await publish_event(error_response)
+
+
+async def _handle_nip47_request(
+    event: Event,
+    nwc_connection: NWCConnection,
+    method: Nip47RequestMethod,
+    content: dict[str, Any],
+    payment_ticket: Optional[LaneTicket[UUID]],
+) -> None:
+    is_nip04_encrypted = "?iv=" in event.content()
     try:
         _check_encryption(event)
     except Nip47RequestException as ex:
-        error_response = create_nip47_error_response(
+        error_response = await run_crypto(
+            create_nip47_error_response,
             event=event,
             method=method,
             error=Nip47Error(
@@ -91,11 +140,12 @@ async def handle_nip47_event(event: Event) -> None:
             ),
             use_nip44=not is_nip04_encrypted,
         )
-        await nostr_client.send_event(error_response)
+        await publish_event(error_response)
         return
 
     if not nwc_connection.has_command_permission(method):
-        error_response = create_nip47_error_response(
+        error_response = await run_crypto(
+            create_nip47_error_response,
             event=event,
             method=method,
             error=Nip47Error(
@@ -104,11 +154,12 @@ async def handle_nip47_event(event: Event) -> None:
             ),
             use_nip44=not is_nip04_encrypted,
         )
-        await nostr_client.send_event(error_response)
+        await publish_event(error_response)
         return
 
     if nwc_connection.is_oauth_access_token_expired():
-        error_response = create_nip47_error_response(
+        error_response = await run_crypto(
+            create_nip47_error_response,
             event=event,
             method=method,
             error=Nip47Error(
@@ -117,7 +168,21 @@ async def handle_nip47_event(event: Event) -> None:
             ),
             use_nip44=not is_nip04_encrypted,
         )
-        await nostr_client.send_event(error_response)
+        await publish_event(error_response)
+        return
+
+    if not await Nip47RateLimiter.instance().try_acquire(nwc_connection.id, method):
+        error_response = await run_crypto(
+            create_nip47_error_response,
+            event=event,
+            method=method,
+            error=Nip47Error(
+                code=ErrorCode.RATE_LIMITED,
+                message="Too many requests for this nwc connection.",
+            ),
+            use_nip44=not is_nip04_encrypted,
+        )
+        await publish_event(error_response)
         return
 
     params = content["params"]
@@ -132,9 +197,17 @@ async def handle_nip47_event(event: Event) -> None:
     except IntegrityError:
         logging.debug("Event %s has been processed already.", event.id().to_hex())
         return
+    await record_connection_usage(nwc_connection.id)
+
+    if payment_ticket:
+        # Gives up the worker while earlier payments of the connection are running.
+        await payment_ticket.wait()
 
-    uma_access_token = nwc_connection.long_lived_vasp_token
     try:
+        if method.is_payment():
+            await _recheck_connection_for_payment(nwc_connection, method)
+
+        uma_access_token = nwc_connection.long_lived_vasp_token
         match method:
             case Nip47RequestMethod.EXECUTE_QUOTE:
                 response = await execute_quote(uma_access_token, nip47_request)
@@ -185,25 +258,53 @@ async def handle_nip47_event(event: Event) -> None:
             )
 
     if isinstance(response, Nip47Error):
-        response_event = create_nip47_error_response(
+        response_event = await run_crypto(
+            create_nip47_error_response,
             event=event,
             method=method,
             error=response,
             use_nip44=not is_nip04_encrypted,
         )
     else:
-        response = response.to_dict()
-        response_event = create_nip47_response(
+        result = response.to_dict()
+        response_event = await run_crypto(
+            create_nip47_response,
             event=event,
             method=method,
-            result=response,
+            result=result,
             use_nip44=not is_nip04_encrypted,
         )
+        response = (
+            summarize_list_transactions(result)
+            if method == Nip47RequestMethod.LIST_TRANSACTIONS
+            else result
+        )
 
-    output = await nostr_client.send_event(response_event)
-    await nip47_request.update_response_and_save(
-        response_event_id=output.id.to_hex(), response=response
-    )
+    response_event_id = await publish_event(response_event)
+    # Payments save their response right away, others may be written in batches.
+    if method.is_payment() or not defer_response_update(
+        nip47_request, response_event_id, response
+    ):
+        await nip47_request.update_response_and_save(
+            response_event_id=response_event_id, response=response
+        )
+
+
+# A cached connection may lag behind changes made by other workers.
+async def _recheck_connection_for_payment(
+    nwc_connection: NWCConnection, method: Nip47RequestMethod
+) -> None:
+    await nwc_connection.reload()
+    if not nwc_connection.has_command_permission(method):
+        raise Nip47RequestException(
+            error_code=ErrorCode.RESTRICTED,
+            error_message=f"No permission for request method {method.name}.",
+        )
+    if nwc_connection.is_oauth_access_token_expired():
+        raise Nip47RequestException(
+            error_code=ErrorCode.UNAUTHORIZED,
+            error_message="The nwc connection secret has expired.",
+        )
 
 
 def _check_encryption(event: Event) -> None:
@@ -232,3 +333,14 @@ def _check_encryption(event: Event) -> None:
             error_code=ErrorCode.OTHER,
             error_message="NIP44 encryption specified but NIP04 encryption is used.",
         )
+
+
+def _decrypt_content(event: Event, is_nip04_encrypted: bool) -> str:
+    conversation_keys = get_conversation_keys(
+        NostrConfig.instance().identity_keys, event.author()
+    )
+    return (
+        conversation_keys.nip04_decrypt(event.content())
+        if is_nip04_encrypted
+        else conversation_keys.nip44_decrypt(event.content())
+    )
@@ -0,0 +1,169 @@
+# pyre-strict
+
+from dataclasses import dataclass
+from time import monotonic, time
+from typing import Callable, Optional
+from uuid import UUID, uuid4
+
+from quart import current_app
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from nwc_backend.db import db
+from nwc_backend.models.nip47_rate_limit_bucket import (
+    Nip47RateLimitBucket,
+    Nip47RateLimitClass,
+)
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.ttl_cache import TTLCache
+
+# Buckets which are not used for long enough to refill are dropped, so this only
+# bounds the number of connections sending requests at the same time.
+MAX_IN_MEMORY_BUCKETS = 100_000
+
+_BucketKey = tuple[UUID, Nip47RateLimitClass]
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: int
+    refill_per_second: float
+
+    @property
+    def refill_duration(self) -> float:
+        return self.capacity / self.refill_per_second
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit, now: float) -> None:
+        self.limit = limit
+        self.tokens: float = limit.capacity
+        self.refilled_at = now
+
+    def try_consume(self, now: float) -> bool:
+        self.tokens = min(
+            self.limit.capacity,
+            self.tokens + (now - self.refilled_at) * self.limit.refill_per_second,
+        )
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# Buckets are kept per worker, unless NIP47_RATE_LIMIT_SHARED keeps them in the db.
+class Nip47RateLimiter:
+    def __init__(
+        self,
+        clock: Callable[[], float] = monotonic,
+        wall_clock: Callable[[], float] = time,
+    ) -> None:
+        self.limits: dict[Nip47RateLimitClass, RateLimit] = {}
+        for method_class in Nip47RateLimitClass:
+            prefix = f"NIP47_RATE_LIMIT_{method_class.name}"
+            per_minute = current_app.config.get(f"{prefix}_PER_MINUTE", 0)
+            if per_minute:
+                self.limits[method_class] = RateLimit(
+                    capacity=current_app.config.get(f"{prefix}_BURST", per_minute),
+                    refill_per_second=per_minute / 60,
+                )
+        self.shared: bool = current_app.config.get("NIP47_RATE_LIMIT_SHARED", False)
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._buckets: TTLCache[_BucketKey, TokenBucket] = TTLCache[
+            _BucketKey, TokenBucket
+        ](
+            max_size=MAX_IN_MEMORY_BUCKETS,
+            ttl=max(
+                (limit.refill_duration for limit in self.limits.values()),
+                default=0,
+            ),
+            clock=clock,
+        )
+
+    @staticmethod
+    def instance() -> "Nip47RateLimiter":
+        global _nip47_rate_limiter  # noqa: PLW0603
+        if _nip47_rate_limiter is None:
+            _nip47_rate_limiter = Nip47RateLimiter()
+
+        return _nip47_rate_limiter
+
+    async def try_acquire(
+        self, nwc_connection_id: UUID, method: Nip47RequestMethod
+    ) -> bool:
+        method_class = Nip47RateLimitClass.from_method(method)
+        limit = self.limits.get(method_class)
+        if not limit:
+            return True
+        if self.shared:
+            return await self._try_acquire_shared(
+                nwc_connection_id, method_class, limit
+            )
+
+        key = (nwc_connection_id, method_class)
+        now = self._clock()
+        bucket = self._buckets.get(key) or TokenBucket(limit, now)
+        acquired = bucket.try_consume(now)
+        # A bucket which is not used until it is full again is the same as a new one.
+        self._buckets.set(key, bucket, ttl=limit.refill_duration)
+        return acquired
+
+    async def _try_acquire_shared(
+        self,
+        nwc_connection_id: UUID,
+        method_class: Nip47RateLimitClass,
+        limit: RateLimit,
+    ) -> bool:
+        now = self._wall_clock()
+        # The buckets are updated outside of the request's session, so a token is
+        # taken atomically without committing anything else.
+        if await self._try_consume_shared(nwc_connection_id, method_class, limit, now):
+            return True
+
+        try:
+            async with db.engine.begin() as connection:
+                await connection.execute(
+                    insert(Nip47RateLimitBucket).values(
+                        id=uuid4(),
+                        nwc_connection_id=nwc_connection_id,
+                        method_class=method_class,
+                        tokens=limit.capacity - 1,
+                        refilled_at=now,
+                    )
+                )
+            return True
+        except IntegrityError:
+            # The bucket exists: either it is empty, or another worker created it
+            # since it was read.
+            return await self._try_consume_shared(
+                nwc_connection_id, method_class, limit, now
+            )
+
+    async def _try_consume_shared(
+        self,
+        nwc_connection_id: UUID,
+        method_class: Nip47RateLimitClass,
+        limit: RateLimit,
+        now: float,
+    ) -> bool:
+        refilled = (
+            Nip47RateLimitBucket.tokens
+            + (now - Nip47RateLimitBucket.refilled_at) * limit.refill_per_second
+        )
+        available = case((refilled > limit.capacity, limit.capacity), else_=refilled)
+        async with db.engine.begin() as connection:
+            result = await connection.execute(
+                update(Nip47RateLimitBucket)
+                .where(
+                    Nip47RateLimitBucket.nwc_connection_id == nwc_connection_id,
+                    Nip47RateLimitBucket.method_class == method_class,
+                    available >= 1,
+                )
+                .values(tokens=available - 1, refilled_at=now)
+            )
+        return result.rowcount == 1
+
+
+_nip47_rate_limiter: Optional[Nip47RateLimiter] = None
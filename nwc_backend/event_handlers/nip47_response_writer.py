@@ -0,0 +1,139 @@
+# pyre-strict
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from nostr_sdk import Nip47Error
+from quart import Quart
+from sqlalchemy import update
+
+from nwc_backend.db import db
+from nwc_backend.models.nip47_request import Nip47Request
+
+# Number of times a batch is flushed before its rows are saved one at a time.
+MAX_BATCH_ATTEMPTS = 3
+
+
+class Nip47ResponseWriter:
+    def __init__(self, app: Quart, flush_interval: float, max_batch_size: int) -> None:
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._pending: list[dict[str, Any]] = []
+        self._batch_full = asyncio.Event()
+        self._failed_attempts = 0
+        self._stopping = False
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @staticmethod
+    def from_config(app: Quart) -> Optional["Nip47ResponseWriter"]:
+        flush_interval_ms = app.config.get("NIP47_RESPONSE_FLUSH_INTERVAL_MS", 0)
+        if not flush_interval_ms:
+            return None
+        return Nip47ResponseWriter(
+            app=app,
+            flush_interval=flush_interval_ms / 1000,
+            max_batch_size=app.config.get("NIP47_RESPONSE_FLUSH_BATCH_SIZE", 100),
+        )
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="nip47-response-writer")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._batch_full.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def add(
+        self,
+        request: Nip47Request,
+        response_event_id: str,
+        response: dict[str, Any] | Nip47Error,
+    ) -> None:
+        if isinstance(response, Nip47Error):
+            response_result, response_error_code = None, response.code
+        else:
+            response_result, response_error_code = response, None
+        self._pending.append(
+            {
+                "id": request.id,
+                "response_event_id": response_event_id,
+                "response_result": response_result,
+                "response_error_code": response_error_code,
+            }
+        )
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        if await self._save(batch):
+            self._failed_attempts = 0
+            return
+
+        self._failed_attempts += 1
+        if self._failed_attempts < MAX_BATCH_ATTEMPTS:
+            # Keep the batch, ahead of newer updates, to retry it in the next flush.
+            self._pending = batch + self._pending
+            return
+
+        # Save the rows one at a time, so a bad row doesn't hold back the others.
+        self._failed_attempts = 0
+        for row in batch:
+            if not await self._save([row]):
+                logging.error("Dropped the response of request %s.", row["id"])
+
+    async def _save(self, batch: list[dict[str, Any]]) -> bool:
+        try:
+            async with self.app.app_context():
+                await db.session.execute(update(Nip47Request), batch)
+                await db.session.commit()
+            return True
+        except Exception:
+            logging.exception("Failed to save responses of %d requests.", len(batch))
+            return False
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._batch_full.clear()
+            await self.flush()
+
+
+# Returns False if batching is disabled, and the caller should save the response.
+def defer_response_update(
+    request: Nip47Request,
+    response_event_id: str,
+    response: dict[str, Any] | Nip47Error,
+) -> bool:
+    if not _response_writer:
+        return False
+    _response_writer.add(request, response_event_id, response)
+    return True
+
+
+async def start_response_writer(app: Quart) -> None:
+    global _response_writer  # noqa: PLW0603
+    _response_writer = Nip47ResponseWriter.from_config(app)
+    if _response_writer:
+        _response_writer.start()
+
+
+async def stop_response_writer() -> None:
+    global _response_writer  # noqa: PLW0603
+    if _response_writer:
+        await _response_writer.stop()
+        _response_writer = None
+
+
+_response_writer: Optional[Nip47ResponseWriter] = None
@@ -53,5 +53,5 @@ async def pay_invoice(access_token: str, request: Nip47Request) -> PayInvoiceRes
         )
         return response
     except Exception:
-        await update_on_payment_failed(payment)
+        await update_on_payment_failed(request, payment)
         raise
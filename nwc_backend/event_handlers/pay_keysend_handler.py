@@ -43,5 +43,5 @@ async def pay_keysend(access_token: str, request: Nip47Request) -> PayKeysendRes
         )
         return response
     except Exception:
-        await update_on_payment_failed(payment)
+        await update_on_payment_failed(request, payment)
         raise
@@ -53,5 +53,5 @@ async def pay_to_address(
         )
         return response
     except Exception:
-        await update_on_payment_failed(payment)
+        await update_on_payment_failed(request, payment)
         raise
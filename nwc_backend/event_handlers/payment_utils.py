@@ -2,6 +2,8 @@
 
 import logging
 import math
+from dataclasses import dataclass
+from fractions import Fraction
 from typing import Optional
 from uuid import uuid4
 
@@ -18,9 +20,14 @@ from nwc_backend.models.outgoing_payment import (
 from nwc_backend.models.payment_quote import PaymentQuote
 from nwc_backend.models.spending_cycle import SpendingCycle
 from nwc_backend.models.spending_limit import SpendingLimit
+from nwc_backend.ttl_cache import TTLCache
 from nwc_backend.typing import none_throws
 from nwc_backend.vasp_client import VaspUmaClient
 
+# Rates are derived from estimates of at least this many budget currency units, so
+# rounding skews them by 0.5% at most.
+MIN_AMOUNT_FOR_BUDGET_RATE = 100
+
 
 async def update_on_payment_succeeded(
     request: Nip47Request,
@@ -42,9 +49,12 @@ async def update_on_payment_succeeded(
         spending_cycle.total_spent += none_throws(settled_budget_currency_amount)
 
     await db.session.commit()
+    _invalidate_balance(request)
 
 
-async def update_on_payment_failed(payment: OutgoingPayment) -> None:
+async def update_on_payment_failed(
+    request: Nip47Request, payment: OutgoingPayment
+) -> None:
     payment.status = PaymentStatus.FAILED
     if payment.spending_cycle:
         spending_cycle = await db.session.get_one(
@@ -52,12 +62,60 @@ async def update_on_payment_failed(payment: OutgoingPayment) -> None:
         )
         spending_cycle.total_spent_on_hold -= none_throws(payment.budget_on_hold)
     await db.session.commit()
+    _invalidate_balance(request)
+
+
+def _invalidate_balance(request: Nip47Request) -> None:
+    # A failed payment may still have moved funds, e.g. if it timed out.
+    VaspUmaClient.instance().invalidate_balance(
+        request.nwc_connection.long_lived_vasp_token
+    )
 
 
 def get_budget_buffer_multiplier() -> float:
     return current_app.config.get("BUDGET_BUFFER_MULTIPLIER") or 1
 
 
+@dataclass(frozen=True)
+class BudgetEstimate:
+    amount: int
+    # The multiplier applied to the amount to get the budget to put on hold.
+    buffer_multiplier: float
+
+
+# Within BUDGET_RATE_CACHE_TTL of an estimate from the VASP, its rate is reused
+# with BUDGET_RATE_CACHE_BUFFER_MULTIPLIER added to the buffer.
+async def estimate_budget_currency_amount(
+    access_token: str,
+    sending_currency_code: str,
+    sending_currency_amount: int,
+    budget_currency_code: str,
+) -> BudgetEstimate:
+    rate_cache = _get_budget_rate_cache()
+    rate_key = (sending_currency_code, budget_currency_code)
+    rate = rate_cache.get(rate_key)
+    if rate is not None:
+        return BudgetEstimate(
+            amount=math.ceil(sending_currency_amount * rate),
+            buffer_multiplier=get_budget_buffer_multiplier()
+            * (current_app.config.get("BUDGET_RATE_CACHE_BUFFER_MULTIPLIER") or 1),
+        )
+
+    response = await VaspUmaClient.instance().get_budget_estimate(
+        access_token=access_token,
+        sending_currency_code=sending_currency_code,
+        sending_currency_amount=sending_currency_amount,
+        budget_currency_code=budget_currency_code,
+    )
+    estimated_amount = response.estimated_budget_currency_amount
+    # Small amounts are dominated by rounding, so their rate isn't reused.
+    if estimated_amount >= MIN_AMOUNT_FOR_BUDGET_RATE:
+        rate_cache.set(rate_key, Fraction(estimated_amount, sending_currency_amount))
+    return BudgetEstimate(
+        amount=estimated_amount, buffer_multiplier=get_budget_buffer_multiplier()
+    )
+
+
 async def create_outgoing_payment(
     access_token: str,
     request: Nip47Request,
@@ -87,20 +145,17 @@ async def create_outgoing_payment(
 
         if budget_currency.code == sending_currency_code:
             estimated_budget_currency_amount = sending_currency_amount
+            budget_buffer_multiplier = get_budget_buffer_multiplier()
         else:
-            budget_estimate_response = (
-                await VaspUmaClient.instance().get_budget_estimate(
-                    access_token=access_token,
-                    sending_currency_code=sending_currency_code,
-                    sending_currency_amount=sending_currency_amount,
-                    budget_currency_code=budget_currency.code,
-                )
-            )
-            estimated_budget_currency_amount = (
-                budget_estimate_response.estimated_budget_currency_amount
+            budget_estimate = await estimate_budget_currency_amount(
+                access_token=access_token,
+                sending_currency_code=sending_currency_code,
+                sending_currency_amount=sending_currency_amount,
+                budget_currency_code=budget_currency.code,
             )
+            estimated_budget_currency_amount = budget_estimate.amount
+            budget_buffer_multiplier = budget_estimate.buffer_multiplier
 
-        budget_buffer_multiplier = get_budget_buffer_multiplier()
         budget_on_hold = math.ceil(
             estimated_budget_currency_amount * budget_buffer_multiplier
         )
@@ -121,6 +176,16 @@ async def create_outgoing_payment(
     return payment
 
 
+def _get_budget_rate_cache() -> TTLCache[tuple[str, str], Fraction]:
+    global _budget_rate_cache  # noqa: PLW0603
+    if _budget_rate_cache is None:
+        _budget_rate_cache = TTLCache(
+            max_size=current_app.config.get("BUDGET_RATE_CACHE_SIZE", 1000),
+            ttl=current_app.config.get("BUDGET_RATE_CACHE_TTL", 0),
+        )
+    return _budget_rate_cache
+
+
 def _get_settled_budget_currency_amount_from_payment(
     request: Nip47Request, payment: OutgoingPayment
 ) -> Optional[int]:
@@ -134,3 +199,6 @@ def _get_settled_budget_currency_amount_from_payment(
             request.id,
         )
         return payment.estimated_budget_currency_amount
+
+
+_budget_rate_cache: Optional[TTLCache[tuple[str, str], Fraction]] = None
@@ -15,6 +15,10 @@ class EventBuilderException(Exception):
     pass
 
 
+class DecryptionException(Exception):
+    pass
+
+
 class InvalidClientIdException(Exception):
     pass
 
@@ -40,6 +44,7 @@ class NotImplementedException(Nip47RequestException):
 
 class VaspErrorResponseException(Nip47RequestException):
     def __init__(self, http_status: int, response: str) -> None:
+        self.http_status = http_status
         try:
             error_response = ErrorResponse.from_json(response)
             super().__init__(
@@ -62,6 +67,22 @@ class VaspErrorResponseException(Nip47RequestException):
             super().__init__(error_code=error_code, error_message=response)
 
 
+class VaspUnavailableException(Nip47RequestException):
+    def __init__(self) -> None:
+        super().__init__(
+            error_code=ErrorCode.RATE_LIMITED,
+            error_message="The wallet is temporarily unavailable, try again later.",
+        )
+
+
+class VaspTimeoutException(Nip47RequestException):
+    def __init__(self) -> None:
+        super().__init__(
+            error_code=ErrorCode.INTERNAL,
+            error_message="The wallet did not respond in time.",
+        )
+
+
 class InsufficientBudgetException(Nip47RequestException):
     def __init__(self) -> None:
         super().__init__(
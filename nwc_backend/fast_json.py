@@ -0,0 +1,13 @@
+# pyre-strict
+
+import json
+
+import orjson
+
+
+def dumps(obj: object) -> str:
+    try:
+        return orjson.dumps(obj).decode()
+    except TypeError:
+        # orjson doesn't support some values, e.g. integers over 64 bits.
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
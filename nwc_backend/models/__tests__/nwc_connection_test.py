@@ -1,22 +1,28 @@
 from datetime import datetime, timezone
 from secrets import token_hex
 from time import time
+from unittest.mock import patch
 from uuid import uuid4
 
 import pytest
 from quart.app import QuartClient
+from sqlalchemy import inspect, update
 from sqlalchemy.exc import IntegrityError
 
 from nwc_backend.db import db
 from nwc_backend.models.__tests__.model_examples import (
     create_client_app,
     create_currency,
+    create_nip47_request,
+    create_nwc_connection,
+    create_spending_limit,
     create_user,
 )
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
 from nwc_backend.models.nwc_connection import NWCConnection
 from nwc_backend.models.permissions_grouping import PermissionsGroup
 from nwc_backend.models.spending_limit import SpendingLimit, SpendingLimitFrequency
+from nwc_backend.typing import none_throws
 
 
 async def test_nwc_connection_model(test_client: QuartClient) -> None:
@@ -147,3 +153,101 @@ async def test_client_app_id_or_custom_name_constraint(
             )
             db.session.add(nwc_connection)
             await db.session.commit()
+
+
+@patch("nwc_backend.models.nwc_connection._connection_cache", None)
+async def test_from_nostr_pubkey_cached(test_client: QuartClient) -> None:
+    test_client.app.config["NWC_CONNECTION_CACHE_TTL"] = 30
+    async with test_client.app.app_context():
+        nwc_connection = await create_nwc_connection()
+        spending_limit = await create_spending_limit(nwc_connection=nwc_connection)
+        nostr_pubkey = none_throws(nwc_connection.nostr_pubkey)
+
+    async with test_client.app.app_context():
+        # The first lookup populates the cache.
+        assert await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+
+    with patch.object(NWCConnection, "from_nostr_pubkey") as mock_from_nostr_pubkey:
+        async with test_client.app.app_context():
+            cached_connection = none_throws(
+                await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+            )
+            mock_from_nostr_pubkey.assert_not_called()
+            # Everything is loaded, so nothing is lazy loaded later on.
+            assert not inspect(cached_connection).unloaded
+            assert cached_connection.id == nwc_connection.id
+            assert cached_connection.created_at == nwc_connection.created_at
+            assert cached_connection.user.uma_address == nwc_connection.user.uma_address
+            assert (
+                none_throws(cached_connection.client_app).client_id
+                == none_throws(nwc_connection.client_app).client_id
+            )
+            assert (
+                cached_connection.long_lived_vasp_token
+                == nwc_connection.long_lived_vasp_token
+            )
+            assert cached_connection.budget_currency == nwc_connection.budget_currency
+            assert cached_connection.has_command_permission(
+                Nip47RequestMethod.PAY_INVOICE
+            )
+            cached_spending_limit = none_throws(cached_connection.spending_limit)
+            assert not inspect(cached_spending_limit).unloaded
+            assert cached_spending_limit.id == spending_limit.id
+            assert await cached_spending_limit.get_or_create_current_spending_cycle()
+
+            # The cached connection can be used to create new requests.
+            await create_nip47_request(nwc_connection=cached_connection)
+
+
+@patch("nwc_backend.models.nwc_connection._connection_cache", None)
+async def test_reload_updates_cache(test_client: QuartClient) -> None:
+    test_client.app.config["NWC_CONNECTION_CACHE_TTL"] = 30
+    async with test_client.app.app_context():
+        nwc_connection = await create_nwc_connection()
+        nostr_pubkey = none_throws(nwc_connection.nostr_pubkey)
+
+    async with test_client.app.app_context():
+        cached_connection = none_throws(
+            await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+        )
+        spending_limit = await create_spending_limit(nwc_connection=cached_connection)
+        # Changed by another process, which can't invalidate our cache.
+        await db.session.execute(
+            update(NWCConnection)
+            .where(NWCConnection.id == cached_connection.id)
+            .values(connection_expires_at=1, spending_limit_id=spending_limit.id)
+        )
+        await db.session.commit()
+
+    async with test_client.app.app_context():
+        cached_connection = none_throws(
+            await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+        )
+        assert not cached_connection.is_connection_expired()
+        assert not cached_connection.spending_limit
+
+        await cached_connection.reload()
+        assert cached_connection.is_connection_expired()
+        assert none_throws(cached_connection.spending_limit).id == spending_limit.id
+
+    async with test_client.app.app_context():
+        cached_connection = none_throws(
+            await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+        )
+        assert cached_connection.is_connection_expired()
+
+
+@patch("nwc_backend.models.nwc_connection._connection_cache", None)
+async def test_refresh_oauth_tokens_invalidates_cache(
+    test_client: QuartClient,
+) -> None:
+    test_client.app.config["NWC_CONNECTION_CACHE_TTL"] = 30
+    async with test_client.app.app_context():
+        nwc_connection = await create_nwc_connection()
+        nostr_pubkey = none_throws(nwc_connection.nostr_pubkey)
+        assert await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
+
+        await nwc_connection.refresh_oauth_tokens()
+
+    async with test_client.app.app_context():
+        assert not await NWCConnection.from_nostr_pubkey_cached(nostr_pubkey)
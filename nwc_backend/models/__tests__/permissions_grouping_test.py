@@ -0,0 +1,49 @@
+# pyre-strict
+
+from quart.app import QuartClient
+
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.models.permissions_grouping import (
+    PermissionsGroup,
+    get_granted_methods,
+    get_vasp_supported_methods,
+)
+
+
+async def test_get_granted_methods(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        granted_methods = get_granted_methods([PermissionsGroup.READ_BALANCE.value])
+        assert granted_methods == {
+            Nip47RequestMethod.GET_BALANCE,
+            Nip47RequestMethod.GET_INFO,
+            Nip47RequestMethod.GET_BUDGET,
+            Nip47RequestMethod.LOOKUP_USER,
+        }
+        assert get_granted_methods([PermissionsGroup.READ_BALANCE.value]) is (
+            granted_methods
+        )
+
+
+async def test_get_granted_methods__limited_to_vasp_supported_commands(
+    test_client: QuartClient,
+) -> None:
+    test_client.app.config["VASP_SUPPORTED_COMMANDS"] = ["get_info", "pay_invoice"]
+    async with test_client.app.app_context():
+        assert get_vasp_supported_methods() == {
+            Nip47RequestMethod.GET_INFO,
+            Nip47RequestMethod.PAY_INVOICE,
+        }
+        assert get_granted_methods(
+            [PermissionsGroup.SEND_PAYMENTS.value, PermissionsGroup.READ_BALANCE.value]
+        ) == {Nip47RequestMethod.GET_INFO, Nip47RequestMethod.PAY_INVOICE}
+
+
+async def test_get_vasp_supported_methods__ignores_unknown_commands(
+    test_client: QuartClient,
+) -> None:
+    test_client.app.config["VASP_SUPPORTED_COMMANDS"] = ["get_info", "unknown"]
+    async with test_client.app.app_context():
+        assert get_vasp_supported_methods() == {Nip47RequestMethod.GET_INFO}
+
+        test_client.app.config["VASP_SUPPORTED_COMMANDS"] = ["get_balance"]
+        assert get_vasp_supported_methods() == {Nip47RequestMethod.GET_BALANCE}
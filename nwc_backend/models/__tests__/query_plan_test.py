@@ -0,0 +1,70 @@
+# pyre-strict
+
+from uuid import UUID, uuid4
+
+import pytest
+from quart.app import QuartClient
+from sqlalchemy import Select, func, select
+from sqlalchemy.dialects import postgresql
+
+from nwc_backend.db import db
+from nwc_backend.models.outgoing_payment import OutgoingPayment
+from nwc_backend.models.spending_cycle import SpendingCycle
+
+CONNECTION_ID: UUID = uuid4()
+SPENDING_LIMIT_ID: UUID = uuid4()
+
+HOT_QUERIES: dict[str, tuple[Select, str]] = {
+    "current_spending_cycle": (
+        select(SpendingCycle)
+        .filter(SpendingCycle.spending_limit_id == SPENDING_LIMIT_ID)
+        .order_by(SpendingCycle.start_time.desc())
+        .limit(1),
+        "spending_cycle_spending_limit_id_start_time_unique_idx",
+    ),
+    "outgoing_payments": (
+        select(OutgoingPayment)
+        .where(OutgoingPayment.nwc_connection_id == CONNECTION_ID)
+        .where(OutgoingPayment.is_not_failed())
+        .order_by(OutgoingPayment.created_at.desc())
+        .offset(20)
+        .limit(10),
+        "outgoing_payment_connection_id_created_at_not_failed_idx",
+    ),
+    "outgoing_payments_count": (
+        select(func.count(OutgoingPayment.id))
+        .where(OutgoingPayment.nwc_connection_id == CONNECTION_ID)
+        .where(OutgoingPayment.is_not_failed()),
+        "outgoing_payment_connection_id_created_at_not_failed_idx",
+    ),
+}
+
+
+def _compile(query: Select, dialect: object) -> str:
+    return str(
+        query.compile(
+            dialect=dialect,  # pyre-ignore[6]
+            compile_kwargs={"literal_binds": True},
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "name", ["current_spending_cycle", "outgoing_payments", "outgoing_payments_count"]
+)
+async def test_hot_query_plan(test_client: QuartClient, name: str) -> None:
+    query, index_name = HOT_QUERIES[name]
+    # The queries are rendered for postgres too, to keep them portable, but only the
+    # test database is available to explain them.
+    assert _compile(query, postgresql.dialect())
+
+    async with test_client.app.app_context():
+        async with db.engine.connect() as connection:
+            sql = _compile(query, connection.dialect)
+            result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in result]
+
+    searches = [step for step in plan if step.startswith(("SCAN", "SEARCH"))]
+    assert f"INDEX {index_name} " in searches[0], plan
+    # The index also returns the rows in order, so there is no sort.
+    assert not any("TEMP B-TREE" in step for step in plan), plan
@@ -0,0 +1,48 @@
+# pyre-strict
+
+from enum import Enum
+from uuid import UUID
+
+from sqlalchemy import Enum as DBEnum
+from sqlalchemy import Float, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from nwc_backend.db import UUID as DBUUID
+from nwc_backend.models.model_base import ModelBase
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+
+
+class Nip47RateLimitClass(Enum):
+    PAYMENTS = "payments"
+    READS = "reads"
+
+    @staticmethod
+    def from_method(method: Nip47RequestMethod) -> "Nip47RateLimitClass":
+        return (
+            Nip47RateLimitClass.PAYMENTS
+            if method.is_payment()
+            else Nip47RateLimitClass.READS
+        )
+
+
+class Nip47RateLimitBucket(ModelBase):
+    __tablename__ = "nip47_rate_limit_bucket"
+
+    nwc_connection_id: Mapped[UUID] = mapped_column(
+        DBUUID(), ForeignKey("nwc_connection.id"), nullable=False
+    )
+    method_class: Mapped[Nip47RateLimitClass] = mapped_column(
+        DBEnum(Nip47RateLimitClass, native_enum=False), nullable=False
+    )
+    tokens: Mapped[float] = mapped_column(Float(), nullable=False)
+    # Epoch seconds of the last refill, so refills can be computed in SQL the same
+    # way on every database.
+    refilled_at: Mapped[float] = mapped_column(Float(), nullable=False)
+
+
+Index(
+    "nip47_rate_limit_bucket_nwc_connection_id_method_class_unique_idx",
+    Nip47RateLimitBucket.nwc_connection_id,
+    Nip47RateLimitBucket.method_class,
+    unique=True,
+)
@@ -1,15 +1,16 @@
+from datetime import datetime, timezone
 from typing import Any, Optional
 from uuid import UUID, uuid4
 
 from nostr_sdk import ErrorCode, Nip47Error
 from sqlalchemy import JSON
 from sqlalchemy import Enum as DBEnum
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, String, update
 from sqlalchemy.dialects.postgresql.json import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from nwc_backend.db import UUID as DBUUID
-from nwc_backend.db import Column, db
+from nwc_backend.db import Column, DateTime, db
 from nwc_backend.models.model_base import ModelBase
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
 from nwc_backend.models.nwc_connection import NWCConnection
@@ -38,6 +39,8 @@ class Nip47Request(ModelBase):
     response_error_code: Mapped[Optional[ErrorCode]] = mapped_column(
         DBEnum(ErrorCode, native_enum=False)
     )
+    # Set when no relay accepted the response event, so the client never received it.
+    response_publish_failed_at: Mapped[Optional[datetime]] = mapped_column(DateTime())
 
     nwc_connection: Mapped[NWCConnection] = relationship("NWCConnection", lazy="joined")
 
@@ -74,5 +77,14 @@ class Nip47Request(ModelBase):
         db.session.add(self)
         await db.session.commit()
 
+    @staticmethod
+    async def mark_response_publish_failed(event_id: str) -> None:
+        await db.session.execute(
+            update(Nip47Request)
+            .where(Nip47Request.event_id == event_id)
+            .values(response_publish_failed_at=datetime.now(timezone.utc))
+        )
+        await db.session.commit()
+
     def get_spending_limit(self) -> Optional[SpendingLimit]:
         return self.nwc_connection.spending_limit
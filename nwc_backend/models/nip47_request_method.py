@@ -20,3 +20,11 @@ class Nip47RequestMethod(Enum):
     @staticmethod
     def get_values() -> list[str]:
         return [method.value for method in Nip47RequestMethod]
+
+    def is_payment(self) -> bool:
+        return self in (
+            Nip47RequestMethod.PAY_INVOICE,
+            Nip47RequestMethod.PAY_KEYSEND,
+            Nip47RequestMethod.PAY_TO_ADDRESS,
+            Nip47RequestMethod.EXECUTE_QUOTE,
+        )
@@ -1,32 +1,38 @@
 # pyre-strict
 
+from copy import deepcopy
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from hashlib import sha256
 from time import time
-from typing import Any, Optional
+from typing import Any, Optional, Sequence, Type, TypeVar
 from uuid import UUID
 
 from aioauth.utils import generate_token
 from nostr_sdk import Keys
 from quart import current_app
-from sqlalchemy import JSON, CheckConstraint, ForeignKey, Integer, String
+from sqlalchemy import JSON, CheckConstraint, ForeignKey, Integer, String, inspect
 from sqlalchemy.dialects.postgresql.json import JSONB
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import (
+    Mapped,
+    make_transient_to_detached,
+    mapped_column,
+    relationship,
+)
 from sqlalchemy.sql import select
 from uma_auth.models.currency import Currency
 
 from nwc_backend.db import UUID as DBUUID
-from nwc_backend.db import DBCurrency, db
+from nwc_backend.db import DateTime, DBCurrency, db
 from nwc_backend.models.client_app import ClientApp
 from nwc_backend.models.model_base import ModelBase
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
-from nwc_backend.models.permissions_grouping import (
-    PERMISSIONS_GROUP_TO_METHODS,
-    PermissionsGroup,
-)
+from nwc_backend.models.permissions_grouping import get_granted_methods
+from nwc_backend.models.spending_cycle import SpendingCycle
 from nwc_backend.models.spending_limit import SpendingLimit
 from nwc_backend.models.user import User
 from nwc_backend.nostr.nostr_config import NostrConfig
+from nwc_backend.ttl_cache import TTLCache
 from nwc_backend.typing import none_throws
 
 ACCESS_TOKEN_EXPIRES_IN: int = 30 * 24 * 60 * 60
@@ -61,6 +67,10 @@ class NWCConnection(ModelBase):
         ),
     )
 
+    # The time of the last nip47 request, which is written in batches so it may lag
+    # behind by a few seconds.
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime())
+
     # These should be set as soon as the connection is confirmed by the user.
     nostr_pubkey: Mapped[Optional[str]] = mapped_column(String(255), unique=True)
 
@@ -91,23 +101,17 @@ class NWCConnection(ModelBase):
         ),
     )
 
+    def get_granted_methods(self) -> frozenset[Nip47RequestMethod]:
+        return get_granted_methods(self.granted_permissions_groups)
+
     def get_all_granted_granular_permissions(self) -> list[str]:
-        all_permissions = set()
-        vasp_supported_commands = current_app.config.get("VASP_SUPPORTED_COMMANDS")
-        for group in self.granted_permissions_groups + [
-            PermissionsGroup.ALWAYS_GRANTED.value
-        ]:
-            all_permissions.update(
-                [
-                    p
-                    for p in PERMISSIONS_GROUP_TO_METHODS[PermissionsGroup(group)]
-                    if p in vasp_supported_commands
-                ]
-            )
-        return list(all_permissions)
+        granted_methods = self.get_granted_methods()
+        return [
+            method.value for method in Nip47RequestMethod if method in granted_methods
+        ]
 
     def has_command_permission(self, command: Nip47RequestMethod) -> bool:
-        return command.value in self.get_all_granted_granular_permissions()
+        return command in self.get_granted_methods()
 
     def create_oauth_auth_code(self) -> str:
         now = int(time())
@@ -117,6 +121,7 @@ class NWCConnection(ModelBase):
         return authorization_code
 
     async def refresh_oauth_tokens(self) -> dict[str, Any]:
+        previous_nostr_pubkey = self.nostr_pubkey
         now = int(time())
         refresh_token = generate_token()
         self.hashed_refresh_token = sha256(refresh_token.encode()).hexdigest()
@@ -134,6 +139,8 @@ class NWCConnection(ModelBase):
                 self.connection_expires_at,  # pyre-ignore[6]
             )
         await db.session.commit()
+        if previous_nostr_pubkey:
+            NWCConnection.invalidate_cache(previous_nostr_pubkey)
 
         access_token = keypair.secret_key().to_hex()
         spending_limit = self.spending_limit
@@ -153,7 +160,7 @@ class NWCConnection(ModelBase):
 
     def get_nwc_connection_uri(self, access_token: str) -> str:
         nostr_config = NostrConfig.instance()
-        wallet_pubkey = nostr_config.identity_keys.public_key().to_hex()
+        wallet_pubkey = nostr_config.identity_pubkey_hex
         wallet_relay = nostr_config.relay_url
         return f"nostr+walletconnect://{wallet_pubkey}?relay={wallet_relay}&lud16={self.user.uma_address}&secret={access_token}"
 
@@ -164,6 +171,36 @@ class NWCConnection(ModelBase):
         )
         return result.scalars().one_or_none()
 
+    # Changes made by other workers only show once the cached copy expires, so
+    # payments reload the connection.
+    @staticmethod
+    async def from_nostr_pubkey_cached(nostr_pubkey: str) -> Optional["NWCConnection"]:
+        cache = _get_connection_cache()
+        snapshot = cache.get(nostr_pubkey)
+        if snapshot is None:
+            nwc_connection = await NWCConnection.from_nostr_pubkey(nostr_pubkey)
+            if not nwc_connection:
+                return None
+            cache.set(
+                nostr_pubkey, NWCConnectionSnapshot.from_connection(nwc_connection)
+            )
+            return nwc_connection
+
+        return await db.session.merge(snapshot.to_connection(), load=False)
+
+    async def reload(self) -> None:
+        await db.session.refresh(self)
+        nostr_pubkey = self.nostr_pubkey
+        if nostr_pubkey:
+            _get_connection_cache().set(
+                nostr_pubkey, NWCConnectionSnapshot.from_connection(self)
+            )
+
+    @staticmethod
+    def invalidate_cache(nostr_pubkey: Optional[str]) -> None:
+        if nostr_pubkey:
+            _get_connection_cache().pop(nostr_pubkey)
+
     @staticmethod
     async def from_oauth_authorization_code(
         authorization_code: str,
@@ -200,29 +237,42 @@ class NWCConnection(ModelBase):
         return self.is_connection_expired()
 
     async def to_dict(self) -> dict[str, Any]:
+        return (await NWCConnection.to_dicts([self]))[0]
+
+    @staticmethod
+    async def to_dicts(connections: Sequence["NWCConnection"]) -> list[dict[str, Any]]:
+        current_spending_cycles = await SpendingLimit.get_current_spending_cycles(
+            [
+                connection.spending_limit
+                for connection in connections
+                if connection.spending_limit
+            ]
+        )
+        return [
+            connection._to_dict(  # noqa: SLF001
+                current_spending_cycle=(
+                    current_spending_cycles.get(connection.spending_limit.id)
+                    if connection.spending_limit
+                    else None
+                ),
+            )
+            for connection in connections
+        ]
+
+    def _to_dict(
+        self, current_spending_cycle: Optional[SpendingCycle]
+    ) -> dict[str, Any]:
         connection_name = (
             self.custom_name
             if self.custom_name is not None
             else none_throws(self.client_app).app_name
         )
-        from nwc_backend.models.nip47_request import Nip47Request
-
-        last_request_time = await db.session.scalar(
-            select(Nip47Request.created_at)
-            .filter_by(nwc_connection_id=self.id)
-            .order_by(Nip47Request.created_at.desc())
-            .limit(1)
-        )
         response = {
             "connection_id": str(self.id),
             "client_app": self.client_app.to_dict() if self.client_app else None,
             "name": connection_name,
             "created_at": self.created_at.isoformat(),
-            "last_used_at": (
-                last_request_time.isoformat()
-                if last_request_time
-                else self.updated_at.isoformat()
-            ),
+            "last_used_at": (self.last_used_at or self.updated_at).isoformat(),
             "expires_at": (
                 datetime.fromtimestamp(
                     float(self.connection_expires_at), timezone.utc
@@ -233,8 +283,83 @@ class NWCConnection(ModelBase):
             "permissions": self.granted_permissions_groups,
             "budget_currency": self.budget_currency.to_dict(),
             "spending_limit": (
-                await self.spending_limit.to_dict() if self.spending_limit else None
+                self.spending_limit.to_dict_with_cycle(current_spending_cycle)
+                if self.spending_limit
+                else None
             ),
         }
 
         return response
+
+
+# The column values of a row, by attribute name.
+_ColumnValues = tuple[tuple[str, object], ...]
+
+_Model = TypeVar("_Model", bound=ModelBase)
+
+
+def _get_column_values(instance: ModelBase) -> _ColumnValues:
+    return tuple(
+        (column.key, deepcopy(getattr(instance, column.key)))
+        for column in inspect(type(instance)).column_attrs
+    )
+
+
+def _build_detached(
+    model: Type[_Model], values: _ColumnValues, **relationships: Any
+) -> _Model:
+    instance = model(**{key: deepcopy(value) for key, value in values}, **relationships)
+    make_transient_to_detached(instance)
+    return instance
+
+
+# Copies every column, so a connection built from it has nothing to lazy load.
+@dataclass(frozen=True)
+class NWCConnectionSnapshot:
+    nostr_pubkey: str
+    connection: _ColumnValues
+    user: _ColumnValues
+    client_app: Optional[_ColumnValues]
+    spending_limit: Optional[_ColumnValues]
+
+    @staticmethod
+    def from_connection(nwc_connection: NWCConnection) -> "NWCConnectionSnapshot":
+        client_app = nwc_connection.client_app
+        spending_limit = nwc_connection.spending_limit
+        return NWCConnectionSnapshot(
+            nostr_pubkey=none_throws(nwc_connection.nostr_pubkey),
+            connection=_get_column_values(nwc_connection),
+            user=_get_column_values(nwc_connection.user),
+            client_app=_get_column_values(client_app) if client_app else None,
+            spending_limit=(
+                _get_column_values(spending_limit) if spending_limit else None
+            ),
+        )
+
+    def to_connection(self) -> NWCConnection:
+        return _build_detached(
+            NWCConnection,
+            self.connection,
+            user=_build_detached(User, self.user),
+            client_app=(
+                _build_detached(ClientApp, self.client_app) if self.client_app else None
+            ),
+            spending_limit=(
+                _build_detached(SpendingLimit, self.spending_limit)
+                if self.spending_limit
+                else None
+            ),
+        )
+
+
+def _get_connection_cache() -> TTLCache[str, NWCConnectionSnapshot]:
+    global _connection_cache  # noqa: PLW0603
+    if _connection_cache is None:
+        _connection_cache = TTLCache(
+            max_size=current_app.config.get("NWC_CONNECTION_CACHE_SIZE", 10_000),
+            ttl=current_app.config.get("NWC_CONNECTION_CACHE_TTL", 0),
+        )
+    return _connection_cache
+
+
+_connection_cache: Optional[TTLCache[str, NWCConnectionSnapshot]] = None
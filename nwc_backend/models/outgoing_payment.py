@@ -6,7 +6,7 @@ from uuid import UUID
 
 from sqlalchemy import BigInteger
 from sqlalchemy import Enum as DBEnum
-from sqlalchemy import ForeignKey, Index, String
+from sqlalchemy import ColumnElement, ForeignKey, Index, String, literal_column, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from nwc_backend.db import UUID as DBUUID
@@ -21,6 +21,9 @@ class PaymentStatus(Enum):
     FAILED = "FAILED"
 
 
+NOT_FAILED_CONDITION = "status != 'FAILED'"
+
+
 class OutgoingPayment(ModelBase):
     __tablename__ = "outgoing_payment"
 
@@ -59,13 +62,22 @@ class OutgoingPayment(ModelBase):
 
     __table_args__ = (
         Index(
-            "outgoing_payment_connection_id_status_created_at_idx",
+            "outgoing_payment_connection_id_created_at_not_failed_idx",
             "nwc_connection_id",
-            "status",
             "created_at",
+            postgresql_where=text(NOT_FAILED_CONDITION),
+            sqlite_where=text(NOT_FAILED_CONDITION),
         ),
     )
 
+    @staticmethod
+    def is_not_failed() -> ColumnElement[bool]:
+        # Compared to a literal instead of a bound parameter, so the query planner
+        # can match the condition of the partial index in prepared statements too.
+        return OutgoingPayment.status != literal_column(
+            f"'{PaymentStatus.FAILED.name}'"
+        )
+
     def to_dict(self) -> dict[str, Any]:
         return {
             "id": str(self.id),
@@ -1,4 +1,12 @@
+# pyre-strict
+
+import logging
 from enum import Enum
+from functools import lru_cache
+from typing import Iterable
+
+from quart import current_app
+
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
 
 
@@ -10,7 +18,7 @@ class PermissionsGroup(Enum):
     ALWAYS_GRANTED = "always_granted"
 
 
-METHOD_TO_PERMISSIONS_GROUP = {
+METHOD_TO_PERMISSIONS_GROUP: dict[str, PermissionsGroup] = {
     Nip47RequestMethod.MAKE_INVOICE.value: PermissionsGroup.RECEIVE_PAYMENTS,
     Nip47RequestMethod.GET_BALANCE.value: PermissionsGroup.READ_BALANCE,
     Nip47RequestMethod.PAY_KEYSEND.value: PermissionsGroup.SEND_PAYMENTS,
@@ -30,7 +38,7 @@ METHOD_TO_PERMISSIONS_GROUP = {
     PermissionsGroup.READ_TRANSACTIONS.value: PermissionsGroup.READ_TRANSACTIONS,
 }
 
-PERMISSIONS_GROUP_TO_METHODS = {
+PERMISSIONS_GROUP_TO_METHODS: dict[PermissionsGroup, list[str]] = {
     PermissionsGroup.RECEIVE_PAYMENTS: [
         Nip47RequestMethod.MAKE_INVOICE.value,
     ],
@@ -54,3 +62,44 @@ PERMISSIONS_GROUP_TO_METHODS = {
         Nip47RequestMethod.GET_BUDGET.value,
     ],
 }
+
+
+def get_vasp_supported_methods() -> frozenset[Nip47RequestMethod]:
+    return _compile_supported_methods(
+        tuple(current_app.config.get("VASP_SUPPORTED_COMMANDS") or [])
+    )
+
+
+def get_granted_methods(
+    permissions_groups: Iterable[str],
+) -> frozenset[Nip47RequestMethod]:
+    return _compile_granted_methods(
+        frozenset(permissions_groups), get_vasp_supported_methods()
+    )
+
+
+@lru_cache(maxsize=8)
+def _compile_supported_methods(
+    commands: tuple[str, ...],
+) -> frozenset[Nip47RequestMethod]:
+    supported_methods = set()
+    for command in commands:
+        try:
+            supported_methods.add(Nip47RequestMethod(command))
+        except ValueError:
+            logging.warning("Ignoring unknown VASP supported command %s.", command)
+    return frozenset(supported_methods)
+
+
+@lru_cache(maxsize=256)
+def _compile_granted_methods(
+    permissions_groups: frozenset[str],
+    supported_methods: frozenset[Nip47RequestMethod],
+) -> frozenset[Nip47RequestMethod]:
+    granted_methods = set()
+    for group in permissions_groups | {PermissionsGroup.ALWAYS_GRANTED.value}:
+        granted_methods.update(
+            Nip47RequestMethod(method)
+            for method in PERMISSIONS_GROUP_TO_METHODS[PermissionsGroup(group)]
+        )
+    return frozenset(granted_methods & supported_methods)
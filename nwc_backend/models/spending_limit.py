@@ -2,10 +2,10 @@
 
 import re
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 from uuid import UUID, uuid4
 
-from sqlalchemy import BigInteger
+from sqlalchemy import BigInteger, and_, func
 from sqlalchemy import Enum as DBEnum
 from sqlalchemy import ForeignKey
 from sqlalchemy.exc import IntegrityError
@@ -91,6 +91,42 @@ class SpendingLimit(ModelBase):
             return last_spending_cycle
         return None
 
+    @staticmethod
+    async def get_current_spending_cycles(
+        spending_limits: Sequence["SpendingLimit"],
+    ) -> dict[UUID, SpendingCycle]:
+        if not spending_limits:
+            return {}
+
+        last_start_times = (
+            select(
+                SpendingCycle.spending_limit_id,
+                func.max(SpendingCycle.start_time).label("start_time"),
+            )
+            .filter(
+                SpendingCycle.spending_limit_id.in_(
+                    [spending_limit.id for spending_limit in spending_limits]
+                )
+            )
+            .group_by(SpendingCycle.spending_limit_id)
+            .subquery()
+        )
+        results = await db.session.execute(
+            select(SpendingCycle).join(
+                last_start_times,
+                and_(
+                    SpendingCycle.spending_limit_id
+                    == last_start_times.c.spending_limit_id,
+                    SpendingCycle.start_time == last_start_times.c.start_time,
+                ),
+            )
+        )
+        return {
+            spending_cycle.spending_limit_id: spending_cycle
+            for spending_cycle in results.scalars()
+            if not spending_cycle.has_ended()
+        }
+
     async def get_or_create_current_spending_cycle(self) -> SpendingCycle:
         current_cycle = await self.get_current_spending_cycle()
         if current_cycle:
@@ -132,7 +168,11 @@ class SpendingLimit(ModelBase):
         return start_time + cycle_length
 
     async def to_dict(self) -> dict[str, Any]:
-        current_cycle = await self.get_current_spending_cycle()
+        return self.to_dict_with_cycle(await self.get_current_spending_cycle())
+
+    def to_dict_with_cycle(
+        self, current_cycle: Optional[SpendingCycle]
+    ) -> dict[str, Any]:
         return {
             "limit_amount": self.amount,
             "limit_frequency": self.frequency.value,
@@ -0,0 +1,140 @@
+# pyre-strict
+
+from unittest.mock import patch
+
+import pytest
+from nostr_sdk import (
+    Keys,
+    Nip44Version,
+    generate_shared_key,
+    nip04_decrypt,
+    nip04_encrypt,
+    nip44_decrypt,
+    nip44_encrypt,
+)
+from quart.app import QuartClient
+
+from nwc_backend.exceptions import DecryptionException
+from nwc_backend.nostr import conversation_keys as conversation_keys_module
+from nwc_backend.nostr.conversation_keys import (
+    ConversationKeys,
+    get_conversation_keys,
+)
+
+
+def test_nip44_spec_vector() -> None:
+    keys = Keys.parse("0" * 63 + "1")
+    other_keys = Keys.parse("0" * 63 + "2")
+    conversation_keys = ConversationKeys.derive(keys, other_keys.public_key())
+
+    assert (
+        conversation_keys.nip44_conversation_key.hex()
+        == "c41c775356fd92eadc63ff5a0dc1da211b268cbea22316767095b2871ea1412d"
+    )
+    payload = conversation_keys.nip44_encrypt("a", nonce=bytes(31) + b"\x01")
+    assert payload == (
+        "AgAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAABee0G5VSK0/9YypIObAtDKfYEAjD35uVkHyB0"
+        "F4DwrcNaCXlCWZKaArsGrY6M9wnuTMxWfp1RTN9Xga8no+kF5Vsb"
+    )
+    assert conversation_keys.nip44_decrypt(payload) == "a"
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["a", "hello" * 10, "€" * 1000, "x" * 60_000],
+    ids=["single_char", "short", "multibyte", "large"],
+)
+def test_nip44_interop_with_nostr_sdk(content: str) -> None:
+    keys = Keys.generate()
+    other_keys = Keys.generate()
+    conversation_keys = ConversationKeys.derive(keys, other_keys.public_key())
+
+    payload = conversation_keys.nip44_encrypt(content)
+    assert (
+        nip44_decrypt(
+            secret_key=other_keys.secret_key(),
+            public_key=keys.public_key(),
+            payload=payload,
+        )
+        == content
+    )
+
+    payload = nip44_encrypt(
+        secret_key=other_keys.secret_key(),
+        public_key=keys.public_key(),
+        content=content,
+        version=Nip44Version.V2,
+    )
+    assert conversation_keys.nip44_decrypt(payload) == content
+
+
+def test_nip04_interop_with_nostr_sdk() -> None:
+    keys = Keys.generate()
+    other_keys = Keys.generate()
+    conversation_keys = ConversationKeys.derive(keys, other_keys.public_key())
+    content = '{"method": "get_balance", "params": {}}'
+
+    encrypted_content = conversation_keys.nip04_encrypt(content)
+    assert (
+        nip04_decrypt(
+            secret_key=other_keys.secret_key(),
+            public_key=keys.public_key(),
+            encrypted_content=encrypted_content,
+        )
+        == content
+    )
+
+    encrypted_content = nip04_encrypt(
+        secret_key=other_keys.secret_key(),
+        public_key=keys.public_key(),
+        content=content,
+    )
+    assert conversation_keys.nip04_decrypt(encrypted_content) == content
+
+
+def test_nip44_decrypt__tampered_payload() -> None:
+    conversation_keys = ConversationKeys.derive(
+        Keys.generate(), Keys.generate().public_key()
+    )
+    payload = conversation_keys.nip44_encrypt("hello")
+    tampered = payload[:50] + ("A" if payload[50] != "A" else "B") + payload[51:]
+
+    with pytest.raises(DecryptionException):
+        conversation_keys.nip44_decrypt(tampered)
+    with pytest.raises(DecryptionException):
+        conversation_keys.nip44_decrypt("#" + payload[1:])
+
+
+def test_nip44_decrypt__invalid_utf8() -> None:
+    conversation_keys = ConversationKeys.derive(
+        Keys.generate(), Keys.generate().public_key()
+    )
+    # Authenticates fine, but the plaintext isn't valid UTF-8.
+    payload = conversation_keys._nip44_encrypt_bytes(b"\xff\xfe")  # noqa: SLF001
+
+    with pytest.raises(DecryptionException):
+        conversation_keys.nip44_decrypt(payload)
+
+
+async def test_get_conversation_keys__cached_per_pubkey(
+    test_client: QuartClient,
+) -> None:
+    keys = Keys.generate()
+    client_keys = Keys.generate()
+
+    async with test_client.app.app_context():
+        with patch(
+            "nwc_backend.nostr.conversation_keys.generate_shared_key",
+            side_effect=generate_shared_key,
+        ) as mock_generate_shared_key:
+            conversation_keys = get_conversation_keys(keys, client_keys.public_key())
+            assert (
+                get_conversation_keys(keys, client_keys.public_key())
+                is conversation_keys
+            )
+            mock_generate_shared_key.assert_called_once()
+
+            get_conversation_keys(keys, Keys.generate().public_key())
+            assert mock_generate_shared_key.call_count == 2
+
+        conversation_keys_module._get_conversation_key_cache().clear()
@@ -0,0 +1,157 @@
+# pyre-strict
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any
+
+from nostr_sdk import Event, Keys, KindEnum, nip44_decrypt
+from quart import current_app
+from quart.app import QuartClient
+
+from nwc_backend.event_handlers.event_builder import (
+    EventBuilder,
+    create_nip47_response,
+)
+from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.nostr import crypto_executor
+from nwc_backend.nostr.crypto_executor import (
+    run_crypto,
+    start_crypto_executor,
+    stop_crypto_executor,
+)
+from nwc_backend.nostr.nostr_config import NostrConfig
+
+# Keeps the encrypted response under the 64KB nip44 plaintext limit.
+LIST_TRANSACTIONS_SIZE = 150
+BURST_SIZE = 20
+
+
+def _create_request(client_keys: Keys) -> Event:
+    return (
+        EventBuilder(
+            kind=KindEnum.WALLET_CONNECT_REQUEST(),  # pyre-ignore[6]
+            content=json.dumps({"method": "list_transactions", "params": {}}),
+            keys=client_keys,
+        )
+        .encrypt_content(
+            NostrConfig.instance().identity_keys.public_key(), use_nip44=True
+        )
+        .build()
+    )
+
+
+def _list_transactions_result() -> dict[str, Any]:
+    return {
+        "transactions": [
+            {
+                "type": "incoming",
+                "invoice": "lnbc" + "1" * 150,
+                "description": "payment",
+                "payment_hash": f"{i:064x}",
+                "amount": 1000 * i,
+                "created_at": 1700000000 + i,
+            }
+            for i in range(LIST_TRANSACTIONS_SIZE)
+        ]
+    }
+
+
+async def _measure_max_loop_lag(request: Event, result: dict[str, Any]) -> float:
+    # The worst delay, in seconds, of a ticker woken every 1ms while a burst of
+    # list_transactions responses is built.
+    max_lag: float = 0.0
+    done: bool = False
+
+    async def ticker() -> None:
+        nonlocal max_lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    await asyncio.gather(
+        *[
+            run_crypto(
+                create_nip47_response,
+                event=request,
+                method=Nip47RequestMethod.LIST_TRANSACTIONS,
+                result=result,
+                use_nip44=True,
+            )
+            for _ in range(BURST_SIZE)
+        ]
+    )
+    done = True
+    await ticker_task
+    return max_lag
+
+
+async def test_run_crypto__inline(test_client: QuartClient) -> None:
+    assert crypto_executor._crypto_executor is None
+    assert await run_crypto(lambda a, b: a + b, 1, b=2) == 3
+
+
+async def test_run_crypto__in_thread_pool(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        current_app.config["NOSTR_CRYPTO_THREADS"] = 2
+        start_crypto_executor(current_app)
+        try:
+            client_keys = Keys.generate()
+            request = _create_request(client_keys)
+            response = await run_crypto(
+                create_nip47_response,
+                event=request,
+                method=Nip47RequestMethod.LIST_TRANSACTIONS,
+                result={"transactions": []},
+                use_nip44=True,
+            )
+            assert response.verify()
+            content = nip44_decrypt(
+                secret_key=client_keys.secret_key(),
+                public_key=NostrConfig.instance().identity_keys.public_key(),
+                payload=response.content(),
+            )
+            assert json.loads(content)["result"] == {"transactions": []}
+        finally:
+            stop_crypto_executor()
+            current_app.config.pop("NOSTR_CRYPTO_THREADS")
+
+
+async def test_run_crypto__does_not_block_event_loop(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        current_app.config["NOSTR_CRYPTO_THREADS"] = 1
+        start_crypto_executor(current_app)
+        try:
+            # The call only returns True if the event loop gets to release it while
+            # the call is running.
+            released = threading.Event()
+            call = asyncio.create_task(run_crypto(released.wait, 5))
+            await asyncio.sleep(0.01)
+            released.set()
+            assert await call
+        finally:
+            stop_crypto_executor()
+            current_app.config.pop("NOSTR_CRYPTO_THREADS")
+
+
+async def test_event_loop_lag_of_large_responses(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        request = _create_request(Keys.generate())
+        result = _list_transactions_result()
+        assert len(json.dumps(result)) > 40_000
+
+        inline_lag = await _measure_max_loop_lag(request, result)
+
+        current_app.config["NOSTR_CRYPTO_THREADS"] = 4
+        start_crypto_executor(current_app)
+        try:
+            offloaded_lag = await _measure_max_loop_lag(request, result)
+        finally:
+            stop_crypto_executor()
+            current_app.config.pop("NOSTR_CRYPTO_THREADS")
+
+        assert offloaded_lag < inline_lag / 2
@@ -0,0 +1,124 @@
+# pyre-strict
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from nostr_sdk import Event, Keys, KindEnum, Output, SendEventOutput
+from quart.app import QuartClient
+
+from nwc_backend.db import db
+from nwc_backend.event_handlers.event_builder import EventBuilder
+from nwc_backend.models.__tests__.model_examples import create_nip47_request
+from nwc_backend.models.nip47_request import Nip47Request
+from nwc_backend.nostr import event_publisher
+from nwc_backend.nostr.event_publisher import (
+    EventPublisher,
+    publish_event,
+    start_event_publisher,
+    stop_event_publisher,
+)
+
+
+def _create_event() -> Event:
+    return EventBuilder(
+        kind=KindEnum.TEXT_NOTE(),  # pyre-ignore[6]
+        content="hello",
+        keys=Keys.generate(),
+    ).build()
+
+
+def _create_response_event(request_event_id: str) -> Event:
+    return (
+        EventBuilder(
+            kind=KindEnum.WALLET_CONNECT_RESPONSE(),  # pyre-ignore[6]
+            content="hello",
+        )
+        .encrypt_content(Keys.generate().public_key(), use_nip44=True)
+        .add_tag(["e", request_event_id])
+        .build()
+    )
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_publish_event__inline(
+    mock_nostr_send: AsyncMock, test_client: QuartClient
+) -> None:
+    event = _create_event()
+    mock_nostr_send.return_value = SendEventOutput(
+        id=event.id(), output=Output(success=["wss://fake.relay.url"], failed={})
+    )
+
+    assert await publish_event(event) == event.id().to_hex()
+    mock_nostr_send.assert_awaited_once_with(event)
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_publish_event__queued(
+    mock_nostr_send: AsyncMock, test_client: QuartClient
+) -> None:
+    relay_acknowledged: asyncio.Event = asyncio.Event()
+
+    async def send_event(event: Event) -> SendEventOutput:
+        await relay_acknowledged.wait()
+        return SendEventOutput(
+            id=event.id(),
+            output=Output(
+                success=["wss://fake.relay.url"],
+                failed={"wss://other.relay.url": "timeout"},
+            ),
+        )
+
+    mock_nostr_send.side_effect = send_event
+    test_client.app.config["NOSTR_PUBLISHER_WORKERS"] = 2
+    await start_event_publisher(test_client.app)
+    publisher = event_publisher._event_publisher  # noqa: SLF001
+    assert isinstance(publisher, EventPublisher)
+
+    events = [_create_event() for _ in range(3)]
+    event_ids = [await publish_event(event) for event in events]
+    assert event_ids == [event.id().to_hex() for event in events]
+
+    relay_acknowledged.set()
+    await publisher.join()
+    assert mock_nostr_send.await_count == 3
+
+    await stop_event_publisher()
+    assert event_publisher._event_publisher is None  # noqa: SLF001
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+async def test_publish_event__queued_rejected_by_every_relay(
+    mock_nostr_send: AsyncMock, test_client: QuartClient
+) -> None:
+    async with test_client.app.app_context():
+        published_request = await create_nip47_request()
+        rejected_request = await create_nip47_request()
+        response_events = [
+            _create_response_event(request.event_id)
+            for request in [published_request, rejected_request]
+        ]
+
+    rejected_event_id: str = rejected_request.event_id
+
+    async def send_event(event: Event) -> SendEventOutput:
+        if event.event_ids()[0].to_hex() == rejected_event_id:
+            return SendEventOutput(
+                id=event.id(),
+                output=Output(success=[], failed={"wss://fake.relay.url": "blocked"}),
+            )
+        return SendEventOutput(
+            id=event.id(), output=Output(success=["wss://fake.relay.url"], failed={})
+        )
+
+    mock_nostr_send.side_effect = send_event
+    test_client.app.config["NOSTR_PUBLISHER_WORKERS"] = 1
+    await start_event_publisher(test_client.app)
+    for response_event in response_events:
+        await publish_event(response_event)
+    await stop_event_publisher()
+
+    async with test_client.app.app_context():
+        published_request = await db.session.get_one(Nip47Request, published_request.id)
+        assert published_request.response_publish_failed_at is None
+        rejected_request = await db.session.get_one(Nip47Request, rejected_request.id)
+        assert rejected_request.response_publish_failed_at is not None
@@ -0,0 +1,190 @@
+# pyre-strict
+
+import json
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+from nostr_sdk import ErrorCode, Event, Keys, KindEnum, nip44_decrypt
+from quart.app import QuartClient
+
+from nwc_backend.event_handlers.event_builder import EventBuilder
+from nwc_backend.nostr.nip47_admission import Nip47AdmissionController
+from nwc_backend.nostr.nip47_event_queue import Nip47EventQueue
+from nwc_backend.nostr.nostr_client_initializer import NotificationHandler
+from nwc_backend.nostr.nostr_config import NostrConfig
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _create_request_event(keys: Keys, expiration: float | None = None) -> Event:
+    builder = EventBuilder(
+        kind=KindEnum.WALLET_CONNECT_REQUEST(),  # pyre-ignore[6]
+        content=json.dumps({"method": "get_info", "params": {}}),
+        keys=keys,
+    ).encrypt_content(NostrConfig.instance().identity_keys.public_key(), use_nip44=True)
+    if expiration:
+        builder.add_tag(["expiration", str(int(expiration))])
+    return builder.build()
+
+
+def test_admit_within_limits() -> None:
+    controller = Nip47AdmissionController(
+        max_in_flight=3, max_in_flight_per_author=2, max_queue_age=0
+    )
+
+    first = controller.admit("alice")
+    second = controller.admit("alice")
+    assert first and second
+    assert controller.admit("alice") is None
+
+    third = controller.admit("bob")
+    assert third
+    assert controller.admit("carol") is None
+    assert controller.in_flight == 3
+
+    first.release()
+    first.release()
+    assert controller.in_flight == 2
+    assert controller.admit("alice")
+
+
+def test_stale_admission_and_service_time() -> None:
+    clock = FakeClock()
+    controller = Nip47AdmissionController(
+        max_in_flight=0, max_in_flight_per_author=0, max_queue_age=5, clock=clock
+    )
+
+    admission = controller.admit("alice")
+    assert admission
+    clock.now = 5
+    assert not admission.is_stale()
+    clock.now = 6
+    assert admission.is_stale()
+
+    admission.release(served=False)
+    assert controller.average_service_time == 0
+
+    admission = controller.admit("alice")
+    assert admission
+    clock.now = 16
+    admission.release()
+    assert controller.average_service_time == 2
+
+
+async def test_event_expiring_before_served_dropped(test_client: QuartClient) -> None:
+    async with test_client.app.app_context():
+        controller = Nip47AdmissionController(
+            max_in_flight=10, max_in_flight_per_author=0, max_queue_age=0
+        )
+        controller.average_service_time = 5
+        keys = Keys.generate()
+
+        assert not controller.will_expire_before_served(_create_request_event(keys))
+        assert controller.will_expire_before_served(
+            _create_request_event(keys, expiration=time.time() + 2)
+        )
+        assert not controller.will_expire_before_served(
+            _create_request_event(keys, expiration=time.time() + 60)
+        )
+
+
+async def test_event_with_malformed_expiration_not_dropped(
+    test_client: QuartClient,
+) -> None:
+    async with test_client.app.app_context():
+        controller = Nip47AdmissionController(
+            max_in_flight=10, max_in_flight_per_author=0, max_queue_age=0
+        )
+        event = (
+            EventBuilder(
+                kind=KindEnum.WALLET_CONNECT_REQUEST(),  # pyre-ignore[6]
+                content=json.dumps({"method": "get_info", "params": {}}),
+                keys=Keys.generate(),
+            )
+            .encrypt_content(
+                NostrConfig.instance().identity_keys.public_key(), use_nip44=True
+            )
+            .add_tag(["expiration", "soon"])
+            .build()
+        )
+
+        assert not controller.will_expire_before_served(event)
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+@patch(
+    "nwc_backend.nostr.nostr_client_initializer.handle_nip47_event",
+    new_callable=AsyncMock,
+)
+async def test_event_over_limit_rejected(
+    mock_handle_nip47_event: AsyncMock,
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = Mock()
+    async with test_client.app.app_context():
+        controller = Nip47AdmissionController(
+            max_in_flight=0, max_in_flight_per_author=1, max_queue_age=0
+        )
+        held_admission = controller.admit(Keys.generate().public_key().to_hex())
+        keys = Keys.generate()
+        admission = controller.admit(keys.public_key().to_hex())
+        handler = NotificationHandler(admission_controller=controller)
+
+        event = _create_request_event(keys)
+        await handler.handle("wss://fake.relay.url", "sub", event)
+
+        mock_handle_nip47_event.assert_not_awaited()
+        error_response = mock_nostr_send.call_args[0][0]
+        content = json.loads(
+            nip44_decrypt(
+                secret_key=keys.secret_key(),
+                public_key=NostrConfig.instance().identity_keys.public_key(),
+                payload=error_response.content(),
+            )
+        )
+        assert content["error"]["code"] == ErrorCode.RATE_LIMITED.name
+
+        # Admitted events release their slot once handled.
+        assert admission and held_admission
+        admission.release()
+        await handler.handle("wss://fake.relay.url", "sub", _create_request_event(keys))
+        mock_handle_nip47_event.assert_awaited_once()
+        assert controller.in_flight == 1
+
+
+@patch("nwc_backend.nostr.nostr_client.nostr_client.send_event", new_callable=AsyncMock)
+@patch("nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new_callable=AsyncMock)
+async def test_stale_queued_event_shed(
+    mock_handle_nip47_event: AsyncMock,
+    mock_nostr_send: AsyncMock,
+    test_client: QuartClient,
+) -> None:
+    mock_nostr_send.return_value = Mock()
+    clock = FakeClock()
+    controller = Nip47AdmissionController(
+        max_in_flight=0, max_in_flight_per_author=0, max_queue_age=5, clock=clock
+    )
+    keys = Keys.generate()
+    async with test_client.app.app_context():
+        stale_event = _create_request_event(keys)
+        fresh_event = _create_request_event(keys)
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=1)
+    await event_queue.put(stale_event, controller.admit(keys.public_key().to_hex()))
+    clock.now = 10
+    await event_queue.put(fresh_event, controller.admit(keys.public_key().to_hex()))
+    event_queue.start()
+    await event_queue.join()
+    await event_queue.stop()
+
+    mock_handle_nip47_event.assert_awaited_once()
+    assert mock_handle_nip47_event.call_args[0][0] == fresh_event
+    mock_nostr_send.assert_awaited_once()
+    assert controller.in_flight == 0
@@ -0,0 +1,228 @@
+# pyre-strict
+
+import asyncio
+from unittest.mock import patch
+
+from nostr_sdk import Event, Keys, KindEnum
+from quart.app import QuartClient
+
+from nwc_backend.event_handlers.event_builder import EventBuilder
+from nwc_backend.nostr.nip47_admission import Nip47AdmissionController
+from nwc_backend.nostr.nip47_event_queue import Nip47EventQueue
+from nwc_backend.serial_lanes import LaneTicket, SerialLanes
+
+
+def _create_event(keys: Keys, content: str) -> Event:
+    return EventBuilder(
+        kind=KindEnum.TEXT_NOTE(),  # pyre-ignore[6]
+        content=content,
+        keys=keys,
+    ).build()
+
+
+async def test_events_from_same_author_handled_in_order(
+    test_client: QuartClient,
+) -> None:
+    keys = Keys.generate()
+    handled: list[str] = []
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        # The ticket is held for the whole handling here. Later events finish
+        # faster, so they would overtake earlier ones without ordering.
+        await asyncio.sleep(0.01 * (5 - int(event.content())))
+        handled.append(event.content())
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=4)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for i in range(5):
+            await event_queue.put(_create_event(keys, str(i)))
+        await event_queue.join()
+        await event_queue.stop()
+
+    assert handled == ["0", "1", "2", "3", "4"]
+
+
+async def test_events_from_different_authors_handled_concurrently(
+    test_client: QuartClient,
+) -> None:
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=3)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for _ in range(6):
+            await event_queue.put(_create_event(Keys.generate(), "0"))
+        await event_queue.join()
+        await event_queue.stop()
+
+    assert max_in_flight == 3
+
+
+async def test_failed_event_does_not_stop_worker(test_client: QuartClient) -> None:
+    keys = Keys.generate()
+    handled: list[str] = []
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        if event.content() == "0":
+            raise ValueError("boom")
+        handled.append(event.content())
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=1)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        await event_queue.put(_create_event(keys, "0"))
+        await event_queue.put(_create_event(keys, "1"))
+        await event_queue.join()
+        await event_queue.stop()
+
+    assert handled == ["1"]
+
+
+async def test_busy_author_does_not_block_other_authors(
+    test_client: QuartClient,
+) -> None:
+    busy_keys: Keys = Keys.generate()
+    other_keys = Keys.generate()
+    unblock_busy_author: asyncio.Event = asyncio.Event()
+    handled: list[str] = []
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        # Events of the busy author hold their lane until unblocked.
+        if event.author() == busy_keys.public_key():
+            await unblock_busy_author.wait()
+        handled.append(event.content())
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=2)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for i in range(5):
+            await event_queue.put(_create_event(busy_keys, f"busy {i}"))
+        await event_queue.put(_create_event(other_keys, "other"))
+
+        for _ in range(100):
+            if handled:
+                break
+            await asyncio.sleep(0.01)
+        assert handled == ["other"]
+
+        unblock_busy_author.set()
+        await event_queue.join()
+        await event_queue.stop()
+
+    assert handled == ["other"] + [f"busy {i}" for i in range(5)]
+
+
+async def test_waiting_payments_do_not_block_other_authors(
+    test_client: QuartClient,
+) -> None:
+    payment_keys: Keys = Keys.generate()
+    other_keys = Keys.generate()
+    payment_lanes: SerialLanes[str] = SerialLanes()
+    unblock_payment: asyncio.Event = asyncio.Event()
+    handled: list[str] = []
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        if event.author() != payment_keys.public_key():
+            handled.append(event.content())
+            return
+
+        # Like payments, these are routed to a lane of their own and release the
+        # author's lane. The first one blocks the lane until unblocked.
+        payment_ticket = payment_lanes.reserve("connection")
+        ticket.release()
+        try:
+            await payment_ticket.wait()
+            if event.content() == "payment 0":
+                await unblock_payment.wait()
+            handled.append(event.content())
+        finally:
+            payment_ticket.release()
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=2)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for i in range(3):
+            await event_queue.put(_create_event(payment_keys, f"payment {i}"))
+        # Let the payments reach their lane before the other author's request.
+        await asyncio.sleep(0.05)
+        await event_queue.put(_create_event(other_keys, "other"))
+
+        for _ in range(100):
+            if handled:
+                break
+            await asyncio.sleep(0.01)
+        assert handled == ["other"]
+
+        unblock_payment.set()
+        await event_queue.join()
+        await event_queue.stop()
+
+    assert handled == ["other"] + [f"payment {i}" for i in range(3)]
+
+
+async def test_stop_drains_queued_events(test_client: QuartClient) -> None:
+    keys = Keys.generate()
+    handled: list[str] = []
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        await asyncio.sleep(0.01)
+        handled.append(event.content())
+
+    event_queue = Nip47EventQueue(app=test_client.app, num_workers=1, drain_timeout=1)
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for i in range(3):
+            await event_queue.put(_create_event(keys, str(i)))
+        await event_queue.stop()
+
+    assert handled == ["0", "1", "2"]
+
+
+async def test_stop_releases_admissions_of_cancelled_events(
+    test_client: QuartClient,
+) -> None:
+    keys = Keys.generate()
+    controller = Nip47AdmissionController(
+        max_in_flight=10, max_in_flight_per_author=0, max_queue_age=0
+    )
+
+    async def fake_handle(event: Event, ticket: LaneTicket[str]) -> None:
+        await asyncio.sleep(10)
+
+    event_queue = Nip47EventQueue(
+        app=test_client.app, num_workers=1, drain_timeout=0.05
+    )
+    with patch(
+        "nwc_backend.nostr.nip47_event_queue.handle_nip47_event", new=fake_handle
+    ):
+        event_queue.start()
+        for i in range(3):
+            await event_queue.put(
+                _create_event(keys, str(i)),
+                controller.admit(keys.public_key().to_hex()),
+            )
+        await event_queue.stop()
+
+    assert controller.in_flight == 0
+    assert event_queue.qsize() == 0
@@ -0,0 +1,80 @@
+# pyre-strict
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from nostr_sdk import Keys
+from quart.app import QuartClient
+
+from nwc_backend.nostr.nip47_shard import Nip47Shard
+from nwc_backend.typing import none_throws
+
+
+def test_each_pubkey_owned_by_exactly_one_shard() -> None:
+    shards = [Nip47Shard(index=i, count=3) for i in range(3)]
+    owners = [0, 0, 0]
+    for _ in range(60):
+        pubkey = Keys.generate().public_key().to_hex()
+        owned_by = [shard.index for shard in shards if shard.owns(pubkey)]
+        assert len(owned_by) == 1
+        owners[owned_by[0]] += 1
+    assert all(count > 0 for count in owners)
+
+
+async def test_from_config__disabled(test_client: QuartClient) -> None:
+    assert await Nip47Shard.from_config(test_client.app) is None
+
+
+async def test_from_config__explicit_index(test_client: QuartClient) -> None:
+    test_client.app.config["NIP47_SHARD_COUNT"] = 4
+    test_client.app.config["NIP47_SHARD_INDEX"] = 2
+    assert await Nip47Shard.from_config(test_client.app) == Nip47Shard(index=2, count=4)
+
+
+async def test_from_config__claims_free_shards(
+    test_client: QuartClient, tmp_path: Path
+) -> None:
+    test_client.app.config["NIP47_SHARD_COUNT"] = 2
+    test_client.app.config["NIP47_SHARD_LOCK_DIR"] = str(tmp_path)
+
+    shards = [await Nip47Shard.from_config(test_client.app) for _ in range(2)]
+    try:
+        assert [shard.index if shard else None for shard in shards] == [0, 1]
+
+        # Once every shard is taken, a worker waits for one to be released.
+        claim = asyncio.create_task(Nip47Shard.from_config(test_client.app))
+        await asyncio.sleep(0.05)
+        assert not claim.done()
+        none_throws(shards[1]).release()
+        shards[1] = await asyncio.wait_for(claim, timeout=1)
+        assert none_throws(shards[1]).index == 1
+    finally:
+        for shard in shards:
+            if shard:
+                shard.release()
+
+
+async def test_check_owner__logs_shard_without_worker(
+    test_client: QuartClient, tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    test_client.app.config["NIP47_SHARD_COUNT"] = 2
+    test_client.app.config["NIP47_SHARD_LOCK_DIR"] = str(tmp_path)
+    shard = none_throws(await Nip47Shard.from_config(test_client.app))
+    other_shard = None
+    try:
+        pubkey = Keys.generate().public_key().to_hex()
+        while shard.owns(pubkey):
+            pubkey = Keys.generate().public_key().to_hex()
+
+        shard.check_owner(pubkey)
+        assert "Nip47 shard 1 of 2 has no worker" in caplog.text
+
+        caplog.clear()
+        other_shard = await Nip47Shard.from_config(test_client.app)
+        Nip47Shard(index=0, count=2, lock_dir=str(tmp_path)).check_owner(pubkey)
+        assert not caplog.text
+    finally:
+        shard.release()
+        if other_shard:
+            other_shard.release()
@@ -0,0 +1,95 @@
+# pyre-strict
+
+import json
+from unittest.mock import AsyncMock, patch
+
+from nostr_sdk import Event, Keys, KindEnum
+from quart.app import QuartClient
+
+from nwc_backend.event_handlers.event_builder import EventBuilder
+from nwc_backend.nostr.nostr_client_initializer import NotificationHandler
+from nwc_backend.nostr.nostr_config import NostrConfig
+from nwc_backend.ttl_cache import TTLCache
+
+
+def _create_request_event() -> Event:
+    return (
+        EventBuilder(
+            kind=KindEnum.WALLET_CONNECT_REQUEST(),  # pyre-ignore[6]
+            content=json.dumps({"method": "get_info", "params": {}}),
+            keys=Keys.generate(),
+        )
+        .encrypt_content(
+            NostrConfig.instance().identity_keys.public_key(), use_nip44=True
+        )
+        .build()
+    )
+
+
+@patch(
+    "nwc_backend.nostr.nostr_client_initializer.handle_nip47_event",
+    new_callable=AsyncMock,
+)
+async def test_duplicate_event_skipped(
+    mock_handle_nip47_event: AsyncMock, test_client: QuartClient
+) -> None:
+    async with test_client.app.app_context():
+        event = _create_request_event()
+        handler = NotificationHandler()
+        await handler.handle("wss://fake.relay.url", "sub", event)
+        await handler.handle("wss://other.relay.url", "sub", event)
+
+        mock_handle_nip47_event.assert_awaited_once_with(event)
+
+
+@patch(
+    "nwc_backend.nostr.nostr_client_initializer.handle_nip47_event",
+    new_callable=AsyncMock,
+)
+async def test_events_ignored_once_stopped(
+    mock_handle_nip47_event: AsyncMock, test_client: QuartClient
+) -> None:
+    async with test_client.app.app_context():
+        handler = NotificationHandler()
+        handler.stop()
+        await handler.handle("wss://fake.relay.url", "sub", _create_request_event())
+
+        mock_handle_nip47_event.assert_not_awaited()
+
+
+@patch(
+    "nwc_backend.nostr.nostr_client_initializer.handle_nip47_event",
+    new_callable=AsyncMock,
+)
+async def test_event_with_invalid_signature_not_remembered(
+    mock_handle_nip47_event: AsyncMock, test_client: QuartClient
+) -> None:
+    async with test_client.app.app_context():
+        event = _create_request_event()
+        event_json = json.loads(event.as_json())
+        event_json["sig"] = "0" * 128
+        invalid_event = Event.from_json(json.dumps(event_json))
+
+        handler = NotificationHandler()
+        await handler.handle("wss://fake.relay.url", "sub", invalid_event)
+        mock_handle_nip47_event.assert_not_awaited()
+
+        await handler.handle("wss://fake.relay.url", "sub", event)
+        mock_handle_nip47_event.assert_awaited_once_with(event)
+
+
+@patch(
+    "nwc_backend.nostr.nostr_client_initializer.handle_nip47_event",
+    new_callable=AsyncMock,
+)
+async def test_configured_recent_event_ids_used(
+    mock_handle_nip47_event: AsyncMock, test_client: QuartClient
+) -> None:
+    recent_event_ids: TTLCache[str, bool] = TTLCache(max_size=5, ttl=30)
+    handler = NotificationHandler(recent_event_ids=recent_event_ids)
+    assert handler.recent_event_ids is recent_event_ids
+
+    async with test_client.app.app_context():
+        event = _create_request_event()
+        await handler.handle("wss://fake.relay.url", "sub", event)
+    assert event.id().to_hex() in recent_event_ids
@@ -0,0 +1,171 @@
+# pyre-strict
+
+import base64
+import hmac
+import os
+import threading
+from dataclasses import dataclass
+from hashlib import sha256
+from typing import Optional
+
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
+from nostr_sdk import Keys, PublicKey, generate_shared_key
+from quart import current_app
+
+from nwc_backend.exceptions import DecryptionException
+from nwc_backend.ttl_cache import TTLCache
+
+NIP44_V2 = 2
+NIP44_MIN_PLAINTEXT_SIZE = 1
+NIP44_MAX_PLAINTEXT_SIZE = 65535
+
+
+# Deriving the keys costs an EC multiplication, so they are cached per client pubkey.
+@dataclass(frozen=True)
+class ConversationKeys:
+    nip04_shared_key: bytes
+    nip44_conversation_key: bytes
+
+    @staticmethod
+    def derive(keys: Keys, public_key: PublicKey) -> "ConversationKeys":
+        shared_x = generate_shared_key(
+            secret_key=keys.secret_key(), public_key=public_key
+        )
+        return ConversationKeys(
+            nip04_shared_key=shared_x,
+            # HKDF-extract with the nip44 v2 salt.
+            nip44_conversation_key=hmac.digest(b"nip44-v2", shared_x, sha256),
+        )
+
+    def nip04_encrypt(self, content: str) -> str:
+        iv = os.urandom(16)
+        padder = padding.PKCS7(128).padder()
+        padded = padder.update(content.encode()) + padder.finalize()
+        encryptor = Cipher(
+            algorithms.AES(self.nip04_shared_key), modes.CBC(iv)
+        ).encryptor()
+        ciphertext = encryptor.update(padded) + encryptor.finalize()
+        return (
+            base64.b64encode(ciphertext).decode()
+            + "?iv="
+            + base64.b64encode(iv).decode()
+        )
+
+    def nip04_decrypt(self, encrypted_content: str) -> str:
+        try:
+            encoded_ciphertext, encoded_iv = encrypted_content.split("?iv=")
+            decryptor = Cipher(
+                algorithms.AES(self.nip04_shared_key),
+                modes.CBC(base64.b64decode(encoded_iv)),
+            ).decryptor()
+            padded = (
+                decryptor.update(base64.b64decode(encoded_ciphertext))
+                + decryptor.finalize()
+            )
+            unpadder = padding.PKCS7(128).unpadder()
+            return (unpadder.update(padded) + unpadder.finalize()).decode()
+        except ValueError as ex:
+            raise DecryptionException(f"Invalid nip04 payload: {ex}") from ex
+
+    def nip44_encrypt(self, content: str, nonce: Optional[bytes] = None) -> str:
+        return self._nip44_encrypt_bytes(content.encode(), nonce)
+
+    def _nip44_encrypt_bytes(
+        self, plaintext: bytes, nonce: Optional[bytes] = None
+    ) -> str:
+        if not NIP44_MIN_PLAINTEXT_SIZE <= len(plaintext) <= NIP44_MAX_PLAINTEXT_SIZE:
+            raise ValueError("Invalid nip44 plaintext size.")
+
+        nonce = nonce or os.urandom(32)
+        chacha_key, chacha_nonce, hmac_key = self._nip44_message_keys(nonce)
+        padded = (
+            len(plaintext).to_bytes(2, "big")
+            + plaintext
+            + bytes(_nip44_padded_size(len(plaintext)) - len(plaintext))
+        )
+        ciphertext = _chacha20(chacha_key, chacha_nonce, padded)
+        mac = hmac.digest(hmac_key, nonce + ciphertext, sha256)
+        return base64.b64encode(bytes([NIP44_V2]) + nonce + ciphertext + mac).decode()
+
+    def nip44_decrypt(self, payload: str) -> str:
+        if not payload or payload[0] == "#":
+            raise DecryptionException("Unsupported nip44 version.")
+        try:
+            data = base64.b64decode(payload, validate=True)
+        except ValueError as ex:
+            raise DecryptionException("Invalid nip44 payload encoding.") from ex
+        if not 99 <= len(data) <= 65603:
+            raise DecryptionException("Invalid nip44 payload size.")
+        if data[0] != NIP44_V2:
+            raise DecryptionException(f"Unsupported nip44 version {data[0]}.")
+
+        nonce, ciphertext, mac = data[1:33], data[33:-32], data[-32:]
+        chacha_key, chacha_nonce, hmac_key = self._nip44_message_keys(nonce)
+        if not hmac.compare_digest(
+            mac, hmac.digest(hmac_key, nonce + ciphertext, sha256)
+        ):
+            raise DecryptionException("Invalid nip44 MAC.")
+
+        padded = _chacha20(chacha_key, chacha_nonce, ciphertext)
+        size = int.from_bytes(padded[:2], "big")
+        if not NIP44_MIN_PLAINTEXT_SIZE <= size <= NIP44_MAX_PLAINTEXT_SIZE or len(
+            padded
+        ) != 2 + _nip44_padded_size(size):
+            raise DecryptionException("Invalid nip44 padding.")
+        try:
+            return padded[2 : 2 + size].decode()
+        except UnicodeDecodeError as ex:
+            raise DecryptionException("Invalid nip44 plaintext encoding.") from ex
+
+    def _nip44_message_keys(self, nonce: bytes) -> tuple[bytes, bytes, bytes]:
+        keys = HKDFExpand(algorithm=hashes.SHA256(), length=76, info=nonce).derive(
+            self.nip44_conversation_key
+        )
+        return keys[:32], keys[32:44], keys[44:]
+
+
+def get_conversation_keys(keys: Keys, public_key: PublicKey) -> ConversationKeys:
+    cache_key = (keys.public_key().to_hex(), public_key.to_hex())
+    cache = _get_conversation_key_cache()
+    with _cache_lock:
+        conversation_keys = cache.get(cache_key)
+    if conversation_keys is None:
+        conversation_keys = ConversationKeys.derive(keys, public_key)
+        with _cache_lock:
+            cache.set(cache_key, conversation_keys)
+    return conversation_keys
+
+
+def _nip44_padded_size(size: int) -> int:
+    if size <= 32:
+        return 32
+    next_power = 1 << (size - 1).bit_length()
+    chunk = 32 if next_power <= 256 else next_power // 8
+    return chunk * ((size - 1) // chunk + 1)
+
+
+def _chacha20(key: bytes, nonce: bytes, data: bytes) -> bytes:
+    # The cryptography ChaCha20 nonce is the 32 bit little endian block counter
+    # followed by the 96 bit nonce.
+    encryptor = Cipher(
+        algorithms.ChaCha20(key, bytes(4) + nonce), mode=None
+    ).encryptor()
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def _get_conversation_key_cache() -> TTLCache[tuple[str, str], ConversationKeys]:
+    global _conversation_key_cache  # noqa: PLW0603
+    if _conversation_key_cache is None:
+        _conversation_key_cache = TTLCache(
+            max_size=current_app.config.get(
+                "NOSTR_CONVERSATION_KEY_CACHE_SIZE", 10_000
+            ),
+            ttl=current_app.config.get("NOSTR_CONVERSATION_KEY_CACHE_TTL", 3600),
+        )
+    return _conversation_key_cache
+
+
+_cache_lock = threading.Lock()
+_conversation_key_cache: Optional[TTLCache[tuple[str, str], ConversationKeys]] = None
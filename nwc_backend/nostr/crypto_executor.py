@@ -0,0 +1,43 @@
+# pyre-strict
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from quart import Quart
+
+T = TypeVar("T")
+
+
+# nostr_sdk releases the GIL in native code, so offloaded calls run in parallel.
+# Without a thread pool configured, the call runs inline.
+async def run_crypto(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    executor = _crypto_executor
+    if executor is None:
+        return func(*args, **kwargs)
+    context: contextvars.Context = contextvars.copy_context()
+
+    def run_in_context() -> T:
+        return context.run(func, *args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(executor, run_in_context)
+
+
+def start_crypto_executor(app: Quart) -> None:
+    global _crypto_executor  # noqa: PLW0603
+    num_threads = app.config.get("NOSTR_CRYPTO_THREADS", 0)
+    if num_threads and _crypto_executor is None:
+        _crypto_executor = ThreadPoolExecutor(
+            max_workers=num_threads, thread_name_prefix="nostr-crypto"
+        )
+
+
+def stop_crypto_executor() -> None:
+    global _crypto_executor  # noqa: PLW0603
+    if _crypto_executor is not None:
+        _crypto_executor.shutdown(wait=True)
+        _crypto_executor = None
+
+
+_crypto_executor: Optional[ThreadPoolExecutor] = None
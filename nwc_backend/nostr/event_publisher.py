@@ -0,0 +1,127 @@
+# pyre-strict
+
+import asyncio
+import logging
+from typing import Optional
+
+from nostr_sdk import Event, Kind, KindEnum
+from quart import Quart
+
+from nwc_backend.models.nip47_request import Nip47Request
+from nwc_backend.nostr.nostr_client import nostr_client
+
+
+# Publishes from a bounded queue, so callers don't wait for the relays.
+class EventPublisher:
+    def __init__(self, app: Quart, num_workers: int, max_size: int = 0) -> None:
+        self.app = app
+        self.num_workers = num_workers
+        self._queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=max_size)
+        self._workers: list[asyncio.Task[None]] = []
+
+    @staticmethod
+    def from_config(app: Quart) -> Optional["EventPublisher"]:
+        num_workers = app.config.get("NOSTR_PUBLISHER_WORKERS", 0)
+        if not num_workers:
+            return None
+        return EventPublisher(
+            app=app,
+            num_workers=num_workers,
+            max_size=app.config.get("NOSTR_PUBLISHER_QUEUE_SIZE", 1000),
+        )
+
+    def start(self) -> None:
+        for i in range(self.num_workers):
+            self._workers.append(
+                asyncio.create_task(self._run_worker(), name=f"nostr-publisher-{i}")
+            )
+
+    async def stop(self, timeout: float = 5) -> None:
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except TimeoutError:
+            logging.warning(
+                "Dropping %d unpublished events on shutdown.", self._queue.qsize()
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def publish(self, event: Event) -> None:
+        await self._queue.put(event)
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    async def _run_worker(self) -> None:
+        while True:
+            event = await self._queue.get()
+            try:
+                published = False
+                try:
+                    output = await nostr_client.send_event(event)
+                    published = _check_publish_output(
+                        event, output.output.success, output.output.failed
+                    )
+                except Exception:
+                    logging.exception("Failed to publish event %s", event.id().to_hex())
+                if not published:
+                    async with self.app.app_context():
+                        await _record_publish_failure(event)
+            except Exception:
+                logging.exception(
+                    "Failed to record the outcome of event %s", event.id().to_hex()
+                )
+            finally:
+                self._queue.task_done()
+
+
+async def publish_event(event: Event) -> str:
+    if _event_publisher:
+        await _event_publisher.publish(event)
+        return event.id().to_hex()
+
+    output = await nostr_client.send_event(event)
+    if not _check_publish_output(event, output.output.success, output.output.failed):
+        await _record_publish_failure(event)
+    return output.id.to_hex()
+
+
+def _check_publish_output(
+    event: Event, success: list[str], failed: dict[str, Optional[str]]
+) -> bool:
+    if failed:
+        logging.warning(
+            "Event %s failed to publish to %s, succeeded on %s.",
+            event.id().to_hex(),
+            str(failed),
+            str(success),
+        )
+    return bool(success)
+
+
+async def _record_publish_failure(event: Event) -> None:
+    if event.kind() != Kind.from_enum(
+        KindEnum.WALLET_CONNECT_RESPONSE()  # pyre-ignore[6]
+    ):
+        return
+    for request_event_id in event.event_ids():
+        await Nip47Request.mark_response_publish_failed(request_event_id.to_hex())
+
+
+async def start_event_publisher(app: Quart) -> None:
+    global _event_publisher  # noqa: PLW0603
+    _event_publisher = EventPublisher.from_config(app)
+    if _event_publisher:
+        _event_publisher.start()
+
+
+async def stop_event_publisher() -> None:
+    global _event_publisher  # noqa: PLW0603
+    if _event_publisher:
+        await _event_publisher.stop()
+        _event_publisher = None
+
+
+_event_publisher: Optional[EventPublisher] = None
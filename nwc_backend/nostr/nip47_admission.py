@@ -0,0 +1,100 @@
+# pyre-strict
+
+from collections import defaultdict
+from time import monotonic, time
+from typing import Callable, Optional
+
+from nostr_sdk import Event, TagKind
+from quart import Quart
+
+
+class Nip47Admission:
+    def __init__(
+        self, controller: "Nip47AdmissionController", author: str, admitted_at: float
+    ) -> None:
+        self.controller = controller
+        self.author = author
+        self.admitted_at = admitted_at
+        self._released = False
+
+    @property
+    def age(self) -> float:
+        return self.controller.clock() - self.admitted_at
+
+    def is_stale(self) -> bool:
+        max_queue_age = self.controller.max_queue_age
+        return bool(max_queue_age) and self.age > max_queue_age
+
+    def release(self, served: bool = True) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.controller.release(self, served)
+
+
+# Rejects requests right away once too many are in flight, globally or per author,
+# instead of letting every request time out.
+class Nip47AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_in_flight_per_author: int,
+        max_queue_age: float,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_author = max_in_flight_per_author
+        self.max_queue_age = max_queue_age
+        self.clock = clock
+        self.in_flight = 0
+        self._in_flight_per_author: defaultdict[str, int] = defaultdict(int)
+        # Exponentially weighted moving average of the time to serve a request.
+        self.average_service_time = 0.0
+
+    @staticmethod
+    def from_config(app: Quart) -> Optional["Nip47AdmissionController"]:
+        max_in_flight = app.config.get("NIP47_MAX_IN_FLIGHT", 0)
+        max_in_flight_per_author = app.config.get("NIP47_MAX_IN_FLIGHT_PER_AUTHOR", 0)
+        max_queue_age = app.config.get("NIP47_MAX_QUEUE_AGE", 0)
+        if not (max_in_flight or max_in_flight_per_author or max_queue_age):
+            return None
+        return Nip47AdmissionController(
+            max_in_flight=max_in_flight,
+            max_in_flight_per_author=max_in_flight_per_author,
+            max_queue_age=max_queue_age,
+        )
+
+    def will_expire_before_served(self, event: Event) -> bool:
+        expiration = event.get_tag_content(TagKind.EXPIRATION())  # pyre-ignore[6]
+        if not expiration:
+            return False
+        try:
+            expires_at = float(expiration)
+        except ValueError:
+            # The tag comes from the client, so a malformed one is treated as never
+            # expiring rather than failing the event here.
+            return False
+        return expires_at < time() + self.average_service_time
+
+    def admit(self, author: str) -> Optional[Nip47Admission]:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return None
+        if (
+            self.max_in_flight_per_author
+            and self._in_flight_per_author[author] >= self.max_in_flight_per_author
+        ):
+            return None
+
+        self.in_flight += 1
+        self._in_flight_per_author[author] += 1
+        return Nip47Admission(self, author, self.clock())
+
+    def release(self, admission: Nip47Admission, served: bool) -> None:
+        self.in_flight -= 1
+        self._in_flight_per_author[admission.author] -= 1
+        if not self._in_flight_per_author[admission.author]:
+            del self._in_flight_per_author[admission.author]
+        if served:
+            self.average_service_time = (
+                0.8 * self.average_service_time + 0.2 * admission.age
+            )
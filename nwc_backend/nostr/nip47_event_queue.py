@@ -0,0 +1,189 @@
+# pyre-strict
+
+import asyncio
+import logging
+from typing import Optional
+
+from nostr_sdk import Event
+from quart import Quart
+
+from nwc_backend.event_handlers.nip47_event_handler import (
+    handle_nip47_event,
+    reject_nip47_event,
+)
+from nwc_backend.nostr.nip47_admission import Nip47Admission
+from nwc_backend.serial_lanes import LaneTicket, SerialLanes, WorkerSlot
+
+
+_QueuedEvent = tuple[Event, LaneTicket[str], Optional[Nip47Admission]]
+
+
+# Events of an author are routed in order. An event waiting for its turn, and a
+# payment waiting for earlier payments of its connection, don't hold a worker.
+class Nip47EventQueue:
+    def __init__(
+        self, app: Quart, num_workers: int, max_size: int = 0, drain_timeout: float = 0
+    ) -> None:
+        self.app = app
+        self.num_workers = num_workers
+        self.drain_timeout = drain_timeout
+        # Events whose turn in their author's lane has come, waiting for a worker.
+        self._ready: asyncio.Queue[_QueuedEvent] = asyncio.Queue()
+        self._capacity: Optional[asyncio.Semaphore] = (
+            asyncio.Semaphore(max_size) if max_size else None
+        )
+        self._worker_slots = asyncio.Semaphore(num_workers)
+        self._author_lanes: SerialLanes[str] = SerialLanes()
+        self._queued = 0
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._dispatcher: Optional[asyncio.Task[None]] = None
+        self._workers: set[asyncio.Task[None]] = set()
+        self._stopped = False
+
+    @staticmethod
+    def from_config(app: Quart) -> Optional["Nip47EventQueue"]:
+        num_workers = app.config.get("NIP47_EVENT_WORKERS", 0)
+        if not num_workers:
+            return None
+        return Nip47EventQueue(
+            app=app,
+            num_workers=num_workers,
+            max_size=app.config.get("NIP47_EVENT_QUEUE_SIZE", 1000),
+            drain_timeout=app.config.get("NIP47_EVENT_QUEUE_DRAIN_TIMEOUT", 20),
+        )
+
+    def start(self) -> None:
+        self._dispatcher = asyncio.create_task(
+            self._run_dispatcher(), name="nip47-dispatcher"
+        )
+
+    async def stop(self) -> None:
+        # Callers stop putting events first. The events already queued get up to
+        # `drain_timeout` seconds to be handled before the rest are cancelled.
+        if self.drain_timeout:
+            try:
+                async with asyncio.timeout(self.drain_timeout):
+                    await self.join()
+            except TimeoutError:
+                logging.warning(
+                    "Cancelling %d unfinished nip47 events.", self._unfinished
+                )
+
+        self._stopped = True
+        tasks = [*self._workers]
+        if self._dispatcher:
+            tasks.append(self._dispatcher)
+            self._dispatcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        while not self._ready.empty():
+            self._drop(*self._ready.get_nowait())
+
+    def qsize(self) -> int:
+        return self._queued
+
+    async def put(
+        self, event: Event, admission: Optional[Nip47Admission] = None
+    ) -> None:
+        # Reserve the author's lane before any await so the lane order matches the
+        # order in which events were received.
+        ticket = self._author_lanes.reserve(event.author().to_hex())
+        try:
+            if self._capacity:
+                await self._capacity.acquire()
+        except BaseException:
+            ticket.release()
+            raise
+
+        self._queued += 1
+        self._unfinished += 1
+        self._finished.clear()
+        ticket.on_turn(lambda: self._on_turn(event, ticket, admission))
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def _on_turn(
+        self,
+        event: Event,
+        ticket: LaneTicket[str],
+        admission: Optional[Nip47Admission],
+    ) -> None:
+        if self._stopped:
+            self._drop(event, ticket, admission)
+        else:
+            self._ready.put_nowait((event, ticket, admission))
+
+    def _drop(
+        self,
+        event: Event,
+        ticket: LaneTicket[str],
+        admission: Optional[Nip47Admission],
+    ) -> None:
+        logging.warning("Dropping event %s on shutdown.", event.id().to_hex())
+        self._queued -= 1
+        if self._capacity:
+            self._capacity.release()
+        ticket.release()
+        if admission:
+            admission.release(served=False)
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def _run_dispatcher(self) -> None:
+        while True:
+            worker_slot = WorkerSlot(self._worker_slots)
+            await worker_slot.acquire()
+            try:
+                event, ticket, admission = await self._ready.get()
+            except BaseException:
+                worker_slot.release()
+                raise
+
+            self._queued -= 1
+            if self._capacity:
+                self._capacity.release()
+            worker = asyncio.create_task(
+                self._run_worker(event, ticket, admission, worker_slot)
+            )
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    async def _run_worker(
+        self,
+        event: Event,
+        ticket: LaneTicket[str],
+        admission: Optional[Nip47Admission],
+        worker_slot: WorkerSlot,
+    ) -> None:
+        worker_slot.bind()
+        served = True
+        try:
+            async with self.app.app_context():
+                if admission and admission.is_stale():
+                    served = False
+                    logging.warning(
+                        "Shedding event %s after %.1fs in queue.",
+                        event.id().to_hex(),
+                        admission.age,
+                    )
+                    await reject_nip47_event(
+                        event, "The wallet is overloaded, try again later."
+                    )
+                else:
+                    await handle_nip47_event(event, ticket)
+        except Exception:
+            logging.exception("Failed to handle event %s", event.id().to_hex())
+        finally:
+            ticket.release()
+            if admission:
+                admission.release(served)
+            worker_slot.release()
+            self._unfinished -= 1
+            if not self._unfinished:
+                self._finished.set()
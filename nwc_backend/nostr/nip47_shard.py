@@ -0,0 +1,121 @@
+# pyre-strict
+
+import asyncio
+import fcntl
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import IO, Optional
+
+from quart import Quart
+
+# How often to check whether the worker of another shard is down, per shard.
+OWNER_CHECK_INTERVAL = 60
+# Bounds of the backoff between attempts to claim a shard while all are taken.
+SHARD_CLAIM_MIN_DELAY = 0.1
+SHARD_CLAIM_MAX_DELAY = 5.0
+
+
+# Requests are assigned to shards by author pubkey, so all requests of a connection
+# are handled by the same worker.
+@dataclass(frozen=True)
+class Nip47Shard:
+    index: int
+    count: int
+    # Set when the shard was claimed with a lock file in this directory.
+    lock_dir: Optional[str] = None
+    lock_file: Optional[IO[str]] = field(default=None, compare=False, repr=False)
+    _owner_checked_at: dict[int, float] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    def get_shard_index(self, author_pubkey_hex: str) -> int:
+        return int(author_pubkey_hex, 16) % self.count
+
+    def owns(self, author_pubkey_hex: str) -> bool:
+        return self.get_shard_index(author_pubkey_hex) == self.index
+
+    # Requests of a shard without a worker are dropped by every worker.
+    def check_owner(self, author_pubkey_hex: str) -> None:
+        lock_dir = self.lock_dir
+        if lock_dir is None:
+            return
+
+        index = self.get_shard_index(author_pubkey_hex)
+        now = monotonic()
+        checked_at = self._owner_checked_at.get(index)
+        if checked_at is not None and now - checked_at < OWNER_CHECK_INTERVAL:
+            return
+        self._owner_checked_at[index] = now
+
+        if not _is_shard_claimed(lock_dir, index):
+            logging.error(
+                "Nip47 shard %d of %d has no worker, its requests are not handled.",
+                index,
+                self.count,
+            )
+
+    def release(self) -> None:
+        if self.lock_file:
+            self.lock_file.close()
+
+    @staticmethod
+    async def from_config(app: Quart) -> Optional["Nip47Shard"]:
+        count = app.config.get("NIP47_SHARD_COUNT", 1)
+        if count <= 1:
+            return None
+
+        index = app.config.get("NIP47_SHARD_INDEX")
+        if index is not None:
+            if not 0 <= index < count:
+                raise ValueError(f"Invalid nip47 shard index {index} of {count}.")
+            logging.info("Handling nip47 shard %d of %d.", index, count)
+            return Nip47Shard(index=index, count=count)
+
+        lock_dir = app.config.get("NIP47_SHARD_LOCK_DIR") or tempfile.gettempdir()
+        # On a reload, the workers being replaced hold their shards until they exit.
+        delay = SHARD_CLAIM_MIN_DELAY
+        while (claimed := _claim_shard_index(lock_dir=lock_dir, count=count)) is None:
+            logging.warning(
+                "All %d nip47 shards are taken, retrying in %.1fs. NIP47_SHARD_COUNT "
+                "should match the number of workers.",
+                count,
+                delay,
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHARD_CLAIM_MAX_DELAY)
+
+        index, lock_file = claimed
+        logging.info("Handling nip47 shard %d of %d.", index, count)
+        return Nip47Shard(
+            index=index, count=count, lock_dir=lock_dir, lock_file=lock_file
+        )
+
+
+def _get_lock_path(lock_dir: str, index: int) -> str:
+    return os.path.join(lock_dir, f"nwc-nip47-shard-{index}.lock")
+
+
+# The lock is held until the shard is released or the process exits.
+def _claim_shard_index(lock_dir: str, count: int) -> Optional[tuple[int, IO[str]]]:
+    for index in range(count):
+        lock_file = open(_get_lock_path(lock_dir, index), "a")  # noqa: SIM115
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        return index, lock_file
+    return None
+
+
+def _is_shard_claimed(lock_dir: str, index: int) -> bool:
+    with open(_get_lock_path(lock_dir, index), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
@@ -2,34 +2,117 @@
 
 import asyncio
 import logging
+from typing import Optional
 
 from nostr_sdk import Event, Filter, HandleNotification, Kind, KindEnum, RelayMessage
 from quart import current_app
 
+from nwc_backend.event_handlers.connection_usage_writer import (
+    start_connection_usage_writer,
+    stop_connection_usage_writer,
+)
 from nwc_backend.event_handlers.event_builder import EventBuilder
-from nwc_backend.event_handlers.nip47_event_handler import handle_nip47_event
+from nwc_backend.event_handlers.nip47_event_handler import (
+    handle_nip47_event,
+    reject_nip47_event,
+)
+from nwc_backend.event_handlers.nip47_response_writer import (
+    start_response_writer,
+    stop_response_writer,
+)
 from nwc_backend.exceptions import PublishEventFailedException
 from nwc_backend.models.nip47_request_method import Nip47RequestMethod
+from nwc_backend.nostr.crypto_executor import (
+    run_crypto,
+    start_crypto_executor,
+    stop_crypto_executor,
+)
+from nwc_backend.nostr.event_publisher import (
+    start_event_publisher,
+    stop_event_publisher,
+)
+from nwc_backend.nostr.nip47_admission import Nip47AdmissionController
+from nwc_backend.nostr.nip47_event_queue import Nip47EventQueue
+from nwc_backend.nostr.nip47_shard import Nip47Shard
 from nwc_backend.nostr.nostr_client import nostr_client
 from nwc_backend.nostr.nostr_config import NostrConfig
 from nwc_backend.nostr.encryption import NWC_ENCRYPTION_SCHEMES_SUPPORTED
+from nwc_backend.ttl_cache import TTLCache
 
 
 class NotificationHandler(HandleNotification):
+    def __init__(
+        self,
+        event_queue: Optional[Nip47EventQueue] = None,
+        recent_event_ids: Optional[TTLCache[str, bool]] = None,
+        shard: Optional[Nip47Shard] = None,
+        admission_controller: Optional[Nip47AdmissionController] = None,
+    ) -> None:
+        self.event_queue = event_queue
+        self.shard = shard
+        self.admission_controller = admission_controller
+        self.stopped = False
+        # Relays may deliver the same event more than once. This skips duplicates
+        # cheaply, while the unique nip47_request.event_id stays the source of truth.
+        self.recent_event_ids: TTLCache[str, bool] = (
+            TTLCache(max_size=10_000, ttl=600)
+            if recent_event_ids is None
+            else recent_event_ids
+        )
+
+    def stop(self) -> None:
+        self.stopped = True
+
     async def handle(self, relay_url: str, subscription_id: str, event: Event) -> None:
-        async with current_app.app_context():
-            logging.info("Received new event from %s: %s", relay_url, event.as_json())
-            if not event.verify():
-                logging.warning(
-                    "Ignoring event with invalid signature or id: %s", event.as_json()
-                )
-                return
-
-            match event.kind().as_enum():
-                case KindEnum.WALLET_CONNECT_REQUEST():
-                    await handle_nip47_event(event)
-                case _:
-                    raise NotImplementedError()
+        if self.stopped:
+            logging.debug("Ignoring event %s on shutdown.", event.id().to_hex())
+            return
+        if self.shard and not self.shard.owns(event.author().to_hex()):
+            self.shard.check_owner(event.author().to_hex())
+            return
+
+        event_id = event.id().to_hex()
+        if event_id in self.recent_event_ids:
+            logging.debug("Ignoring duplicate event %s from %s", event_id, relay_url)
+            return
+
+        logging.info("Received new event from %s: %s", relay_url, event.as_json())
+        if not await run_crypto(event.verify):
+            logging.warning(
+                "Ignoring event with invalid signature or id: %s", event.as_json()
+            )
+            return
+        # Only remember verified ids, so an invalid event can't block a real one.
+        self.recent_event_ids.set(event_id, True)
+
+        match event.kind().as_enum():
+            case KindEnum.WALLET_CONNECT_REQUEST():
+                admission = None
+                admission_controller = self.admission_controller
+                if admission_controller:
+                    if admission_controller.will_expire_before_served(event):
+                        logging.debug("Dropping event %s about to expire.", event_id)
+                        return
+                    admission = admission_controller.admit(event.author().to_hex())
+                    if not admission:
+                        logging.warning("Rejecting event %s under load.", event_id)
+                        async with current_app.app_context():
+                            await reject_nip47_event(
+                                event, "Too many requests, try again later."
+                            )
+                        return
+
+                if self.event_queue:
+                    await self.event_queue.put(event, admission)
+                else:
+                    try:
+                        async with current_app.app_context():
+                            await handle_nip47_event(event)
+                    finally:
+                        if admission:
+                            admission.release()
+            case _:
+                raise NotImplementedError()
 
     async def handle_msg(self, relay_url: str, msg: RelayMessage) -> None:
         logging.info("Received new message from %s: %s", relay_url, msg.as_json())
@@ -50,8 +133,60 @@ async def init_nostr_client() -> None:
         .pubkey(nostr_config.identity_keys.public_key())
         .kind(Kind.from_enum(KindEnum.WALLET_CONNECT_REQUEST()))  # pyre-ignore[6]
     )
+    app = current_app._get_current_object()  # pyre-ignore[16]
+    start_crypto_executor(app)
+    # Claim the shard before subscribing, so events aren't dropped while waiting for
+    # a shard to free up.
+    global _nip47_shard  # noqa: PLW0603
+    _nip47_shard = await Nip47Shard.from_config(app)
     await nostr_client.subscribe([nip47_filter])
-    asyncio.create_task(nostr_client.handle_notifications(NotificationHandler()))
+
+    await start_event_publisher(app)
+    await start_response_writer(app)
+    await start_connection_usage_writer(app)
+
+    global _nip47_event_queue  # noqa: PLW0603
+    _nip47_event_queue = Nip47EventQueue.from_config(app)
+    if _nip47_event_queue:
+        _nip47_event_queue.start()
+    recent_event_ids: TTLCache[str, bool] = TTLCache(
+        max_size=app.config.get("NIP47_RECENT_EVENT_IDS_SIZE", 10_000),
+        ttl=app.config.get("NIP47_RECENT_EVENT_IDS_TTL", 600),
+    )
+    global _notification_handler, _notifications_task  # noqa: PLW0603
+    _notification_handler = NotificationHandler(
+        _nip47_event_queue,
+        recent_event_ids,
+        _nip47_shard,
+        Nip47AdmissionController.from_config(app),
+    )
+    _notifications_task = asyncio.create_task(
+        nostr_client.handle_notifications(_notification_handler)
+    )
+
+
+async def shutdown_nostr_client() -> None:
+    global _nip47_event_queue, _nip47_shard  # noqa: PLW0603
+    global _notification_handler, _notifications_task  # noqa: PLW0603
+    # Stop taking new events before draining the queue, so none are put on a
+    # stopped queue.
+    if _notification_handler:
+        _notification_handler.stop()
+        _notification_handler = None
+    if _notifications_task:
+        _notifications_task.cancel()
+        await asyncio.gather(_notifications_task, return_exceptions=True)
+        _notifications_task = None
+    if _nip47_event_queue:
+        await _nip47_event_queue.stop()
+        _nip47_event_queue = None
+    if _nip47_shard:
+        _nip47_shard.release()
+        _nip47_shard = None
+    await stop_event_publisher()
+    await stop_response_writer()
+    await stop_connection_usage_writer()
+    stop_crypto_executor()
 
 
 async def _publish_nip47_info() -> None:
@@ -74,3 +209,9 @@ async def _publish_nip47_info() -> None:
 
     if not response.output.success:
         raise PublishEventFailedException(nip47_info_event, response.output.failed)
+
+
+_nip47_event_queue: Optional[Nip47EventQueue] = None
+_nip47_shard: Optional[Nip47Shard] = None
+_notification_handler: Optional[NotificationHandler] = None
+_notifications_task: Optional["asyncio.Task[None]"] = None
@@ -11,13 +11,18 @@ from quart import Quart, current_app
 class NostrConfig:
     relay_url: str
     identity_keys: Keys
+    identity_pubkey_hex: str
 
     @staticmethod
     def load(app: Optional[Quart] = None) -> "NostrConfig":
         if app is None:
             app = current_app
         keys = Keys.parse(app.config["NOSTR_PRIVKEY"])
-        return NostrConfig(relay_url=app.config["RELAY"], identity_keys=keys)
+        return NostrConfig(
+            relay_url=app.config["RELAY"],
+            identity_keys=keys,
+            identity_pubkey_hex=keys.public_key().to_hex(),
+        )
 
     @staticmethod
     def instance(app: Optional[Quart] = None) -> "NostrConfig":
@@ -0,0 +1,101 @@
+# pyre-strict
+
+import asyncio
+import logging
+import random
+from time import monotonic
+from typing import Callable, Optional
+
+from botocore.client import BaseClient
+from sqlalchemy.util import await_only
+
+from nwc_backend.typing import none_throws
+
+# RDS IAM auth tokens are valid for 15 minutes, and are renewed after 10 minutes.
+RDS_IAM_TOKEN_TTL = 600
+# Tokens older than this are not used to connect anymore.
+RDS_IAM_TOKEN_MAX_AGE = 840
+
+
+# Renews the token in the background, so opening a connection doesn't block the
+# event loop on botocore.
+class RdsIamTokenRefresher:
+    def __init__(
+        self,
+        rds: BaseClient,
+        host: str,
+        port: int,
+        user: str,
+        refresh_interval: float = RDS_IAM_TOKEN_TTL,
+        refresh_jitter: float = 60,
+        retry_interval: float = 10,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.rds = rds
+        self.host = host
+        self.port = port
+        self.user = user
+        self.refresh_interval = refresh_interval
+        self.refresh_jitter = refresh_jitter
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self._token: Optional[tuple[float, str]] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._refresh_task: Optional[asyncio.Task[None]] = None
+
+    # Called from the do_connect listener, which runs in a greenlet.
+    def get_token(self) -> str:
+        token = self._token
+        if token is not None and self.clock() - token[0] <= RDS_IAM_TOKEN_MAX_AGE:
+            return token[1]
+
+        if self._task is None:
+            # Only happens before the refresher is started, e.g. in migrations.
+            token = (self.clock(), self._generate_token())
+            self._token = token
+            return token[1]
+
+        # Only happens if the refreshes keep failing.
+        logging.warning("Refreshing the RDS IAM auth token on connect.")
+        return await_only(self._refresh_now())
+
+    async def refresh(self) -> None:
+        token = await asyncio.to_thread(self._generate_token)
+        self._token = (self.clock(), token)
+
+    async def _refresh_now(self) -> str:
+        # Connections opened together share a single refresh.
+        refresh_task = self._refresh_task
+        if refresh_task is None or refresh_task.done():
+            refresh_task = asyncio.create_task(self.refresh())
+            self._refresh_task = refresh_task
+        await asyncio.shield(refresh_task)
+        return none_throws(self._token)[1]
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            logging.exception("Failed to generate the RDS IAM auth token.")
+        self._task = asyncio.create_task(self._run(), name="rds-iam-token-refresher")
+
+    async def stop(self) -> None:
+        task = self._task
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._task = None
+
+    def _generate_token(self) -> str:
+        return self.rds.generate_db_auth_token(self.host, self.port, self.user)
+
+    async def _run(self) -> None:
+        delay = self.refresh_interval - random.uniform(0, self.refresh_jitter)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+                delay = self.refresh_interval - random.uniform(0, self.refresh_jitter)
+            except Exception:
+                logging.exception("Failed to refresh the RDS IAM auth token.")
+                delay = self.retry_interval
@@ -0,0 +1,97 @@
+# pyre-strict
+
+import asyncio
+from contextvars import ContextVar
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+# A task gives up its slot while it waits for its turn in a lane.
+class WorkerSlot:
+    def __init__(self, slots: asyncio.Semaphore) -> None:
+        self._slots = slots
+        self._held = False
+
+    async def acquire(self) -> None:
+        await self._slots.acquire()
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._slots.release()
+
+    def bind(self) -> None:
+        _current_worker_slot.set(self)
+
+
+_current_worker_slot: ContextVar[WorkerSlot] = ContextVar("current_worker_slot")
+
+
+class LaneTicket(Generic[K]):
+    def __init__(
+        self,
+        lanes: "SerialLanes[K]",
+        key: K,
+        previous: Optional["asyncio.Future[None]"],
+        done: "asyncio.Future[None]",
+    ) -> None:
+        self._lanes = lanes
+        self.key = key
+        self._previous = previous
+        self._done = done
+
+    async def wait(self) -> None:
+        previous = self._previous
+        if previous is None or previous.done():
+            return
+
+        worker_slot = _current_worker_slot.get(None)
+        if worker_slot:
+            worker_slot.release()
+        await asyncio.shield(previous)
+        if worker_slot:
+            await worker_slot.acquire()
+
+    def on_turn(self, callback: Callable[[], None]) -> None:
+        previous = self._previous
+        if previous is None or previous.done():
+            callback()
+        else:
+            previous.add_done_callback(lambda _: callback())
+
+    def release(self) -> None:
+        if self._done.done():
+            return
+
+        previous = self._previous
+        if previous is None or previous.done():
+            self._finish()
+        else:
+            # Released before our turn came, e.g. on cancellation. Keep the lane in
+            # order by only handing over once everything ahead of us is finished.
+            previous.add_done_callback(lambda _: self._finish())
+
+    def _finish(self) -> None:
+        if not self._done.done():
+            self._done.set_result(None)
+        self._lanes._forget(self.key, self._done)  # noqa: SLF001
+
+
+class SerialLanes(Generic[K]):
+    def __init__(self) -> None:
+        self._tails: dict[K, asyncio.Future[None]] = {}
+
+    def reserve(self, key: K) -> LaneTicket[K]:
+        done = asyncio.get_running_loop().create_future()
+        previous = self._tails.get(key)
+        self._tails[key] = done
+        return LaneTicket(self, key, previous, done)
+
+    def __len__(self) -> int:
+        return len(self._tails)
+
+    def _forget(self, key: K, done: "asyncio.Future[None]") -> None:
+        if self._tails.get(key) is done:
+            del self._tails[key]
@@ -0,0 +1,29 @@
+# pyre-strict
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+# Callers arriving while a call with the same key is in flight share its result.
+class SingleFlight(Generic[K, V]):
+    def __init__(self) -> None:
+        self._in_flight: dict[K, asyncio.Future[V]] = {}
+
+    async def run(self, key: K, call: Callable[[], Awaitable[V]]) -> V:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so a cancelled caller doesn't cancel the call for the others.
+        return await asyncio.shield(future)
+
+    def _forget(self, key: K, future: "asyncio.Future[V]") -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -1,8 +1,11 @@
 # pyre-strict
 
+import asyncio
 import json
 import ssl
-from typing import Any, Optional
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Optional
 from urllib.parse import urlparse
 
 import aiohttp
@@ -25,14 +28,81 @@ from uma_auth.models.pay_to_address_response import PayToAddressResponse
 from uma_auth.models.quote import Quote
 from uma_auth.models.transaction import Transaction, TransactionType
 
-from nwc_backend.exceptions import VaspErrorResponseException
+from nwc_backend.circuit_breaker import CircuitBreaker
+from nwc_backend.exceptions import (
+    VaspErrorResponseException,
+    VaspTimeoutException,
+    VaspUnavailableException,
+)
+from nwc_backend.latency_histogram import LatencyHistogram
 from nwc_backend.models.receiving_address import ReceivingAddress, ReceivingAddressType
+from nwc_backend.single_flight import SingleFlight
+from nwc_backend.ttl_cache import TTLCache
+from nwc_backend.typing import none_throws
+
+# (access token, currency code, balance generation)
+_BalanceRequestKey = tuple[str, Optional[str], int]
+# (path, sorted query params, access token)
+_GetRequestKey = tuple[str, tuple[tuple[str, object], ...], str]
 
 
 class VaspUmaClient:
     def __init__(self) -> None:
         self.base_url: str = current_app.config["VASP_UMA_API_BASE_URL"]
         self.ca_file: Optional[str] = current_app.config.get("INTERNAL_CA_FILE")
+        self.connection_limit: int = current_app.config.get(
+            "VASP_HTTP_CONNECTION_LIMIT", 100
+        )
+        self.connection_limit_per_host: int = current_app.config.get(
+            "VASP_HTTP_CONNECTION_LIMIT_PER_HOST", 0
+        )
+        self.keepalive_timeout: float = current_app.config.get(
+            "VASP_HTTP_KEEPALIVE_TIMEOUT", 15.0
+        )
+        self.dns_cache_ttl: int = current_app.config.get("VASP_HTTP_DNS_CACHE_TTL", 10)
+        self.timeout: float = current_app.config.get("VASP_HTTP_TIMEOUT", 10)
+        # Matches the aiohttp default total timeout payments had before, since a
+        # payment which times out is failed while the VASP may still settle it.
+        self.payment_timeout: float = current_app.config.get(
+            "VASP_HTTP_PAYMENT_TIMEOUT", 300
+        )
+        self.circuit_breaker = CircuitBreaker(
+            failure_rate_threshold=current_app.config.get(
+                "VASP_CIRCUIT_BREAKER_FAILURE_RATE", 0
+            ),
+            min_calls=current_app.config.get("VASP_CIRCUIT_BREAKER_MIN_CALLS", 20),
+            window=current_app.config.get("VASP_CIRCUIT_BREAKER_WINDOW", 30),
+            open_duration=current_app.config.get(
+                "VASP_CIRCUIT_BREAKER_OPEN_DURATION", 10
+            ),
+        )
+        self.latency_histograms: dict[str, LatencyHistogram] = {}
+        self._http_session: Optional[aiohttp.ClientSession] = None
+
+        # Short lived caches of get_info and get_balance responses per access token,
+        # for clients polling them. Balances are cached per token and currency code.
+        self._response_cache_size: int = current_app.config.get(
+            "VASP_RESPONSE_CACHE_SIZE", 10_000
+        )
+        self._info_cache: TTLCache[str, GetInfoResponse] = TTLCache(
+            max_size=self._response_cache_size,
+            ttl=current_app.config.get("VASP_GET_INFO_CACHE_TTL", 0),
+        )
+        self._balance_cache: TTLCache[
+            str, TTLCache[Optional[str], GetBalanceResponse]
+        ] = TTLCache(
+            max_size=self._response_cache_size,
+            ttl=current_app.config.get("VASP_GET_BALANCE_CACHE_TTL", 0),
+        )
+        # Bumped when balances are invalidated, so balances fetched before that
+        # aren't cached or shared with requests made after it.
+        self._balance_generation = 0
+        self._balance_requests: SingleFlight[_BalanceRequestKey, GetBalanceResponse] = (
+            SingleFlight[_BalanceRequestKey, GetBalanceResponse]()
+        )
+        self._get_requests: SingleFlight[_GetRequestKey, str] = SingleFlight[
+            _GetRequestKey, str
+        ]()
 
     @staticmethod
     def instance() -> "VaspUmaClient":
@@ -42,25 +112,70 @@ class VaspUmaClient:
 
         return _vasp_uma_client
 
-    async def _get_http_session(self) -> aiohttp.ClientSession:
+    def _create_http_session(self) -> aiohttp.ClientSession:
         base_url_parts = urlparse(self.base_url)
         base_url_without_path = f"{base_url_parts.scheme}://{base_url_parts.netloc}"
-        if self.ca_file:
-            return aiohttp.ClientSession(
-                base_url=base_url_without_path,
-                connector=aiohttp.TCPConnector(
-                    ssl=ssl.create_default_context(cafile=self.ca_file)
-                ),
-            )
-        else:
-            return aiohttp.ClientSession(base_url=base_url_without_path)
+        connector = aiohttp.TCPConnector(
+            ssl=(
+                ssl.create_default_context(cafile=self.ca_file)
+                if self.ca_file
+                else True
+            ),
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        return aiohttp.ClientSession(
+            base_url=base_url_without_path, connector=connector
+        )
+
+    async def open_http_session(self) -> None:
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = self._create_http_session()
+
+    async def close_http_session(self) -> None:
+        http_session = self._http_session
+        self._http_session = None
+        if http_session is not None and not http_session.closed:
+            await http_session.close()
+
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        # The session is normally opened when the app starts serving, but fall back
+        # to opening it lazily so the client also works outside of the app lifecycle.
+        await self.open_http_session()
+        return none_throws(self._http_session)
 
+    # With `coalesce`, concurrent identical requests share one call and its result,
+    # so it is only set for idempotent lookups.
     async def _make_http_get(
-        self, path: str, access_token: str, params: Optional[dict[str, Any]] = None
+        self,
+        path: str,
+        access_token: str,
+        params: Optional[dict[str, Any]] = None,
+        coalesce: bool = False,
+        endpoint: Optional[str] = None,
+    ) -> str:
+        if not coalesce:
+            return await self._send_http_get(path, access_token, params, endpoint)
+
+        key = (path, tuple(sorted(params.items())) if params else (), access_token)
+        return await self._get_requests.run(
+            key, lambda: self._send_http_get(path, access_token, params, endpoint)
+        )
+
+    async def _send_http_get(
+        self,
+        path: str,
+        access_token: str,
+        params: Optional[dict[str, Any]],
+        endpoint: Optional[str],
     ) -> str:
         base_url_parts = urlparse(self.base_url)
         base_url_path = base_url_parts.path
-        async with await self._get_http_session() as session:
+        session = await self._get_http_session()
+        async with self._track_request(f"GET {endpoint or path}", self.timeout):
             async with session.get(  # pyre-ignore[16]
                 url=f"{base_url_path}{path}",
                 params=params,
@@ -78,11 +193,19 @@ class VaspUmaClient:
                 return text
 
     async def _make_http_post(
-        self, path: str, access_token: str, data: Optional[str] = None
+        self,
+        path: str,
+        access_token: str,
+        data: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        timeout: Optional[float] = None,
     ) -> str:
         base_url_parts = urlparse(self.base_url)
         base_url_path = base_url_parts.path
-        async with await self._get_http_session() as session:
+        session = await self._get_http_session()
+        async with self._track_request(
+            f"POST {endpoint or path}", timeout or self.timeout
+        ):
             async with session.post(  # pyre-ignore[16]
                 url=f"{base_url_path}{path}",
                 data=data,
@@ -99,6 +222,49 @@ class VaspUmaClient:
                     )
                 return text
 
+    # Only timeouts, connection errors and 5xx or 429 responses count as VASP failures.
+    @asynccontextmanager
+    async def _track_request(
+        self, endpoint: str, timeout: float
+    ) -> AsyncGenerator[None, None]:
+        call = self.circuit_breaker.allow_call()
+        if not call:
+            raise VaspUnavailableException()
+
+        start = time.monotonic()
+        failed = None
+        try:
+            async with asyncio.timeout(timeout):
+                yield
+            failed = False
+        except VaspErrorResponseException as ex:
+            failed = ex.http_status == 429 or ex.http_status // 100 == 5
+            raise
+        except TimeoutError as ex:
+            failed = True
+            raise VaspTimeoutException() from ex
+        except Exception:
+            failed = True
+            raise
+        finally:
+            histogram = self.latency_histograms.get(endpoint)
+            if histogram is None:
+                histogram = self.latency_histograms[endpoint] = LatencyHistogram()
+            histogram.record(time.monotonic() - start)
+
+            if failed is None:
+                self.circuit_breaker.record_cancelled(call)
+            elif failed:
+                self.circuit_breaker.record_failure(call)
+            else:
+                self.circuit_breaker.record_success(call)
+
+    def get_latency_stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            endpoint: histogram.to_dict()
+            for endpoint, histogram in self.latency_histograms.items()
+        }
+
     async def token_exchange(
         self, access_token: str, permissions: list[str], expiration: Optional[int]
     ) -> str:
@@ -124,6 +290,8 @@ class VaspUmaClient:
             path=f"/quote/{payment_hash}",
             access_token=access_token,
             data=request.to_json(),
+            endpoint="/quote/{payment_hash}",
+            timeout=self.payment_timeout,
         )
         return ExecuteQuoteResponse.from_json(result)
 
@@ -147,13 +315,36 @@ class VaspUmaClient:
             path=f"/quote/{receiver_address.type.value}",
             access_token=access_token,
             params=params,
+            endpoint="/quote/{address_type}",
         )
         return Quote.from_json(result)
 
     async def get_balance(
         self, access_token: str, currency_code: Optional[str]
+    ) -> GetBalanceResponse:
+        balances = self._balance_cache.get(access_token)
+        balance = balances.get(currency_code) if balances else None
+        if balance:
+            return balance
+
+        generation = self._balance_generation
+        balance = await self._balance_requests.run(
+            (access_token, currency_code, generation),
+            lambda: self._fetch_balance(access_token, currency_code),
+        )
+        if generation == self._balance_generation and self._balance_cache.enabled:
+            balances = self._balance_cache.get(access_token)
+            if balances is None:
+                balances = TTLCache(max_size=16, ttl=self._balance_cache.ttl)
+                self._balance_cache.set(access_token, balances)
+            balances.set(currency_code, balance)
+        return balance
+
+    async def _fetch_balance(
+        self, access_token: str, currency_code: Optional[str]
     ) -> GetBalanceResponse:
         params = {"currency_code": currency_code} if currency_code else None
+        # Coalesced by get_balance, which doesn't share balances across invalidations.
         result = await self._make_http_get(
             path="/balance",
             access_token=access_token,
@@ -161,12 +352,22 @@ class VaspUmaClient:
         )
         return GetBalanceResponse.from_json(result)
 
+    def invalidate_balance(self, access_token: str) -> None:
+        self._balance_generation += 1
+        self._balance_cache.pop(access_token)
+
     async def get_info(self, access_token: str) -> GetInfoResponse:
+        info = self._info_cache.get(access_token)
+        if info:
+            return info
+
         result = await self._make_http_get(
             path="/info",
             access_token=access_token,
         )
-        return GetInfoResponse.from_json(result)
+        info = GetInfoResponse.from_json(result)
+        self._info_cache.set(access_token, info)
+        return info
 
     async def list_transactions(
         self,
@@ -207,6 +408,8 @@ class VaspUmaClient:
         result = await self._make_http_get(
             path=f"/invoices/{payment_hash}",
             access_token=access_token,
+            coalesce=True,
+            endpoint="/invoices/{payment_hash}",
         )
         return Transaction.from_json(result)
 
@@ -225,6 +428,8 @@ class VaspUmaClient:
             path=f"/receiver/{receiver_address.type.value}/{receiver_address.address}",
             access_token=access_token,
             params=params,
+            coalesce=True,
+            endpoint="/receiver/{address_type}/{address}",
         )
         return LookupUserResponse.from_json(result)
 
@@ -240,7 +445,10 @@ class VaspUmaClient:
         self, access_token: str, request: PayInvoiceRequest
     ) -> PayInvoiceResponse:
         result = await self._make_http_post(
-            path="/payments/bolt11", access_token=access_token, data=request.to_json()
+            path="/payments/bolt11",
+            access_token=access_token,
+            data=request.to_json(),
+            timeout=self.payment_timeout,
         )
         return PayInvoiceResponse.from_json(result)
 
@@ -248,7 +456,10 @@ class VaspUmaClient:
         self, access_token: str, request: PayKeysendRequest
     ) -> PayKeysendResponse:
         result = await self._make_http_post(
-            path="/payments/keysend", access_token=access_token, data=request.to_json()
+            path="/payments/keysend",
+            access_token=access_token,
+            data=request.to_json(),
+            timeout=self.payment_timeout,
         )
         return PayKeysendResponse.from_json(result)
 
@@ -262,6 +473,8 @@ class VaspUmaClient:
             path=f"/payments/{address_type.value}",
             access_token=access_token,
             data=request.to_json(),
+            endpoint="/payments/{address_type}",
+            timeout=self.payment_timeout,
         )
         return PayToAddressResponse.from_json(result)
 
@@ -281,8 +494,18 @@ class VaspUmaClient:
             path="/budget_estimate",
             access_token=access_token,
             params=params,
+            coalesce=True,
         )
         return BudgetEstimateResponse.from_json(result)
 
 
+async def init_vasp_client() -> None:
+    await VaspUmaClient.instance().open_http_session()
+
+
+async def close_vasp_client() -> None:
+    if _vasp_uma_client is not None:
+        await _vasp_uma_client.close_http_session()
+
+
 _vasp_uma_client: Optional[VaspUmaClient] = None